@@ -1,33 +1,44 @@
-import pcbnew
+import sys
 
 __version__ = "0.2.4"
 
-print("Initializing kicad_wiretools version {}".format(__version__))
+# The action plugins need wx, only register them when loaded by Pcbnew,
+# which has imported pcbnew before loading us.  No board may be open yet
+# when the scripting starts up.  Headless users (`python -m
+# kicad_wiretools.batch`, tests) get here without paying for the
+# pcbnew/wx import.
+pcbnew = sys.modules.get('pcbnew')
+if pcbnew is not None and hasattr(pcbnew, 'ActionPlugin'):
 
-#import wiretools
+    print("Initializing kicad_wiretools version {}".format(__version__))
 
-from .shielding import HashShieldGenerator
+    #import wiretools
 
-#import module_loader
+    from .shielding import HashShieldGenerator
 
-#import wiretools_dumper
+    #import module_loader
 
-# -----------------------------------------------------------
-print("Register shielding tools")
-HashShieldGenerator().register()
-print(" HashShieldGenerator registration compeleted.")
-# -----------------------------------------------------------
+    #import wiretools_dumper
 
-#print("Register Wiretools")
-#wiretools.WireTools().register()
+    # -----------------------------------------------------------
+    print("Register shielding tools")
+    HashShieldGenerator().register()
+    print(" HashShieldGenerator registration compeleted.")
+    # -----------------------------------------------------------
 
-#print("done adding kicad_wiretools")
+    #print("Register Wiretools")
+    #wiretools.WireTools().register()
 
-# -----------------------------------------------------------
-print("Register TraceInfo tools")
+    #print("done adding kicad_wiretools")
 
-from .traceinfo import TraceInfoGenerator
-TraceInfoGenerator().register()
+    # -----------------------------------------------------------
+    print("Register TraceInfo tools")
 
-print(" TraceInfoGenerator registration completed.")
-# -----------------------------------------------------------
+    from .traceinfo import TraceInfoGenerator
+    TraceInfoGenerator().register()
+
+    print(" TraceInfoGenerator registration completed.")
+    # -----------------------------------------------------------
+
+    from .diagnostics import DiagnosticsPlugin
+    DiagnosticsPlugin().register()
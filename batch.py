@@ -0,0 +1,185 @@
+# Copyright (c) 2018 Tommi Rintala, New Cable Corporation Ltd
+
+"""Headless trace and shielding metrics for many boards.
+
+    python -m kicad_wiretools.batch [options] board.kicad_pcb ...
+
+Every board is analysed in a worker process of its own, results are
+written as CSV or JSON lines as soon as each board is done.  Boards are
+read with the streaming kicadpcb reader by default, `--backend pcbnew`
+loads them with pcbnew.LoadBoard() instead.  Nothing in here imports wx.
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import csv
+import json
+import math
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    from .tracetable import CU_THICK, extract_tracks, net_geometry, net_parameters
+    from .kicadpcb import read_board
+    from .hashgeom import (DEFAULT_OFFSET_LEFT_MM, DEFAULT_OFFSET_RIGHT_MM, DEFAULT_OFFSET_TOP_MM,
+                           DEFAULT_OFFSET_BOTTOM_MM, DEFAULT_LINE_ANGLE, DEFAULT_LINE_WIDTH_MM,
+                           DEFAULT_PITCH_MM, chain_outline, inset_outline)
+    from .hashcover import shield_coverage
+except (ImportError, ValueError):
+    from tracetable import CU_THICK, extract_tracks, net_geometry, net_parameters
+    from kicadpcb import read_board
+    from hashgeom import (DEFAULT_OFFSET_LEFT_MM, DEFAULT_OFFSET_RIGHT_MM, DEFAULT_OFFSET_TOP_MM,
+                          DEFAULT_OFFSET_BOTTOM_MM, DEFAULT_LINE_ANGLE, DEFAULT_LINE_WIDTH_MM,
+                          DEFAULT_PITCH_MM, chain_outline, inset_outline)
+    from hashcover import shield_coverage
+
+BOARD_COLUMNS = ('file', 'seconds', 'tracks', 'vias', 'nets', 'length_mm',
+                 'max_resistance_ohm', 'min_max_current_a', 'shield_copper_pct', 'error')
+NET_COLUMNS = ('file', 'seconds', 'net', 'name', 'length_mm', 'resistance_ohm',
+               'voltagedrop_v', 'powerloss_w', 'max_current_a', 'error')
+BACKENDS = ('sexpr', 'pcbnew')
+EDGE_CUTS = 44
+NM_PER_MM = 1000000
+
+
+def load_board(path, backend='sexpr'):
+    """(track table, Edge.Cuts line edges) of a board file, read by the kicadpcb reader or by pcbnew.
+
+    Only straight Edge.Cuts lines are read, like the file reader does.
+    """
+    if backend == 'pcbnew':
+        import pcbnew
+        board = pcbnew.LoadBoard(path)
+        edges = [(draw.GetStart().x, draw.GetStart().y, draw.GetEnd().x, draw.GetEnd().y)
+                 for draw in board.DrawingsList()
+                 if draw.GetLayer() == pcbnew.Edge_Cuts and draw.GetClass() == 'DRAWSEGMENT'
+                 and draw.GetShape() == pcbnew.S_SEGMENT]
+        return extract_tracks(board), edges
+    board = read_board(path)
+    lines = board.lines.select(board.lines.layer == EDGE_CUTS)
+    return board.tracks, list(zip(lines.x0, lines.y0, lines.x1, lines.y1))
+
+
+def board_coverage(edges, pitch_mm=DEFAULT_PITCH_MM, width_mm=DEFAULT_LINE_WIDTH_MM, angle=DEFAULT_LINE_ANGLE):
+    """Copper share in percent of the default hash shielding inside the Edge.Cuts outline.
+
+    The outline is inset by the default shielding offsets like the
+    plugin does.  None when the edges do not close into an outline.
+    """
+    loops = chain_outline(edges)[0]
+    if not loops:
+        return None
+    width = width_mm * NM_PER_MM
+    inset = inset_outline(loops, DEFAULT_OFFSET_LEFT_MM * NM_PER_MM, DEFAULT_OFFSET_RIGHT_MM * NM_PER_MM,
+                          DEFAULT_OFFSET_TOP_MM * NM_PER_MM, DEFAULT_OFFSET_BOTTOM_MM * NM_PER_MM,
+                          extra=width / 2)
+    return 100 * shield_coverage(inset, angle, pitch_mm * NM_PER_MM, width).coverage
+
+
+def analyse_board(path, cu_thick=CU_THICK, internal_layer=True,
+                  pitch_mm=DEFAULT_PITCH_MM, width_mm=DEFAULT_LINE_WIDTH_MM, per_net=False,
+                  backend='sexpr'):
+    """Analyse one board file, returns a list of result rows (dicts)"""
+    started = time.time()
+    try:
+        table, edges = load_board(path, backend)
+        totals = net_parameters(net_geometry(table), cu_thick, internal_layer)
+        coverage = board_coverage(edges, pitch_mm, width_mm)
+    except Exception as ouch:
+        row = dict((column, None) for column in (NET_COLUMNS if per_net else BOARD_COLUMNS))
+        row.update(file=path, seconds=time.time() - started, error=str(ouch))
+        return [row]
+
+    seconds = time.time() - started
+    if per_net:
+        return [dict(file=path, seconds=seconds, net=int(totals.netcodes[ind]),
+                     name=totals.names[ind], length_mm=float(totals.length[ind]),
+                     resistance_ohm=float(totals.resistance[ind]),
+                     voltagedrop_v=float(totals.voltagedrop[ind]),
+                     powerloss_w=float(totals.powerloss[ind]),
+                     max_current_a=float(totals.maxcurrent[ind]), error=None)
+                for ind in range(len(totals))]
+
+    return [dict(file=path, seconds=seconds, tracks=int((~table.via).sum()),
+                 vias=int(table.via.sum()), nets=len(totals),
+                 length_mm=float(totals.length.sum()),
+                 max_resistance_ohm=float(totals.resistance.max()),
+                 min_max_current_a=float(totals.maxcurrent.min()),
+                 shield_copper_pct=coverage, error=None)]
+
+
+def finite(value):
+    """None for nan and infinite floats, JSON has no token for them"""
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return None
+    return value
+
+
+class RowWriter(object):
+    """Stream result rows to a file as CSV or JSON lines, non-finite numbers as null"""
+
+    def __init__(self, stream, columns, fmt='csv'):
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == 'csv':
+            self.writer = csv.DictWriter(stream, fieldnames=columns)
+            self.writer.writeheader()
+
+    def write(self, row):
+        if self.fmt == 'csv':
+            self.writer.writerow(row)
+        else:
+            row = dict((key, finite(value)) for key, value in row.items())
+            self.stream.write(json.dumps(row, allow_nan=False) + '\n')
+        self.stream.flush()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m kicad_wiretools.batch',
+                                     description='Trace and shielding metrics for .kicad_pcb files')
+    parser.add_argument('boards', nargs='+', help='.kicad_pcb files to analyse')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='worker processes (default: number of CPUs)')
+    parser.add_argument('-f', '--format', choices=('csv', 'json'), default='csv',
+                        help='output format, json writes one object per line')
+    parser.add_argument('-o', '--output', default='-', help='output file (default: stdout)')
+    parser.add_argument('-b', '--backend', choices=BACKENDS, default='sexpr',
+                        help='board reader: the built-in file reader or pcbnew.LoadBoard')
+    parser.add_argument('--nets', action='store_true', help='write one row per net instead of per board')
+    parser.add_argument('--thickness', type=float, default=CU_THICK * 1e6, help='copper thickness [um]')
+    parser.add_argument('--external', action='store_true', help='use the IPC external layer constant')
+    parser.add_argument('--pitch', type=float, default=DEFAULT_PITCH_MM, help='shielding hash pitch [mm]')
+    parser.add_argument('--width', type=float, default=DEFAULT_LINE_WIDTH_MM, help='shielding line width [mm]')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.output == '-':
+        stream = sys.stdout
+    else:
+        stream = open(args.output, 'w')
+
+    writer = RowWriter(stream, NET_COLUMNS if args.nets else BOARD_COLUMNS, args.format)
+    failed = 0
+    try:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            futures = [executor.submit(analyse_board, path, args.thickness * 1e-6,
+                                       not args.external, args.pitch, args.width, args.nets,
+                                       args.backend)
+                       for path in args.boards]
+            for future in as_completed(futures):
+                for row in future.result():
+                    if row['error']:
+                        failed += 1
+                    writer.write(row)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+
+"""Benchmarks of the plugins on synthetic boards, against a stored baseline.
+
+    python benchmarks/bench.py [--sizes 1000,10000] [--only traceinfo] [--update-baseline]
+
+Run from the repository root.  Boards come from the stand-in pcbnew
+module in tests/, so KiCad is not needed.  Every benchmark runs once
+with pcbnew call counting, then `--repeat` times timed, the fastest time
+is kept.  Results are written as JSON, times more than `--tolerance`
+slower than the baseline (and at least MIN_DELTA seconds) and any growth
+in the pcbnew call count are flagged, the exit status is then 1.  The
+baseline is machine specific, refresh it with --update-baseline after an
+intended change or on a new machine.
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, os.path.join(HERE, '..', 'tests'))
+
+import fakepcbnew
+sys.modules.setdefault('pcbnew', fakepcbnew)
+
+import traceinfo
+from shielding import HashShieldGenerator
+from hashgeom import inset_outline, signed_area
+from hashcover import exact_coverage, raster_coverage
+from instrument import CallCounter
+from tracetable import NetGeometry
+from frequency import frequency_response
+from boardindex import board_index
+from irdrop import ir_drop
+
+SIZES = (1000, 10000, 100000, 1000000)
+REPEAT = 3
+TOLERANCE = 0.25
+MIN_DELTA = 0.005       # seconds, differences below this are noise
+BASELINE = os.path.join(HERE, 'baseline.json')
+RESULTS = os.path.join(HERE, 'results.json')
+
+MM = 1000000
+WIDTH = 200000
+PITCH = MM
+ANGLE = 45.0
+OFFSETS = (2 * MM, 2 * MM, 2 * MM, 2 * MM)
+
+
+def shield_plugin(board):
+    fakepcbnew.set_board(board)
+    plugin = HashShieldGenerator()
+    plugin.find_bounding_box()
+    plugin.line_pitch = fakepcbnew.ToMM(PITCH)
+    plugin.line_angle = ANGLE
+    plugin.offset_left, plugin.offset_right, plugin.offset_top, plugin.offset_bottom = OFFSETS
+    return plugin
+
+
+def bench_traceinfo(size):
+    """traceinfo() of `size` tracks: board scan and per-net totals"""
+    fakepcbnew.set_board(fakepcbnew.synthetic_board(size))
+    return lambda: traceinfo.traceinfo()
+
+
+def bench_bounding_box(size):
+    """Uncached find_bounding_box() of a round outline of `size` segments, no edge below a micron"""
+    scale = max(1.0, size / 100000.0)
+    plugin = shield_plugin(fakepcbnew.synthetic_board(0, outline=size, size=(300.0 * scale, 200.0 * scale),
+                                                      radius=100.0 * scale))
+
+    def run():
+        board_index(plugin._board, fresh=True)
+        plugin.find_bounding_box(fresh=True)
+    return run
+
+
+def bench_hash(size):
+    """Hash around the pads, vias and tracks of a board of `size` tracks, including their scan"""
+    plugin = shield_plugin(fakepcbnew.synthetic_board(size))
+
+    def run():
+        board_index(plugin._board, fresh=True)
+        return plugin.shield_geometries(WIDTH, [fakepcbnew.F_Cu])
+    return run
+
+
+def bench_coverage(size):
+    """Exact hash coverage over `size` lattice cells"""
+    plugin = shield_plugin(fakepcbnew.synthetic_board(0))
+    loops = inset_outline(plugin.outline, *OFFSETS, extra=WIDTH / 2)
+    pitch = np.sqrt(abs(sum(signed_area(loop) for loop in loops)) / size)
+    return lambda: exact_coverage(loops, ANGLE, pitch, min(WIDTH, pitch / 4))
+
+
+def bench_coverage_raster(size):
+    """Sampled coverage of a hash with obstacles, board of `size` tracks"""
+    plugin = shield_plugin(fakepcbnew.synthetic_board(size))
+    segments = plugin.shield_geometries(WIDTH, [fakepcbnew.F_Cu])[0]
+    loops = inset_outline(plugin.outline, *OFFSETS, extra=WIDTH / 2)
+    return lambda: raster_coverage(loops, segments, WIDTH)
+
+
+def bench_sweep(size):
+    """R(f), L and Z0(f) of `size` / 200 nets at 1000 frequencies, 5000 nets at 1M"""
+    nets = max(1, size // 200)
+    rng = np.random.RandomState(1)
+    length = rng.uniform(0.001, 0.3, nets)
+    width = rng.uniform(0.1e-3, 1e-3, nets)
+    geometry = NetGeometry(np.arange(nets), [u'Net-{}'.format(code) for code in range(nets)],
+                           length, length / width, width)
+    return lambda: frequency_response(geometry, np.logspace(0, 10, 1000))
+
+
+def bench_irdrop(size):
+    """IR drop of the net with most through hole pads, fed by a plane on In1.Cu.
+
+    The plane has about `size` cells (0.5 mm at least), 4 load cases.
+    """
+    board = fakepcbnew.synthetic_board(size)
+    through = [pad for pad in board.GetPads() if pad.GetNetCode() > 0 and pad.GetDrillSize().x > 0]
+    nets = np.bincount([pad.GetNetCode() for pad in through])
+    names = [u'U1-{}'.format(pad.GetName()) for pad in through if pad.GetNetCode() == nets.argmax()]
+    box = board.GetBoundingBox()
+    left, top, right, bottom = box.GetLeft(), box.GetTop(), box.GetRight(), box.GetBottom()
+    board.Add(fakepcbnew.ZONE_CONTAINER(board, ((left, top), (right, top), (right, bottom), (left, bottom)),
+                                        fakepcbnew.In1_Cu, net=int(nets.argmax()), filled=True))
+    pitch = max(np.sqrt((right - left) * (bottom - top) / size), MM // 2)
+    rng = np.random.RandomState(1)
+    loads = [dict(zip(names[1:], rng.uniform(0.1, 1.0, len(names) - 1))) for _ in range(4)]
+    return lambda: ir_drop(board, names[:1], loads, 3.3, int(pitch))
+
+
+BENCHMARKS = (('traceinfo', bench_traceinfo),
+              ('bounding_box', bench_bounding_box),
+              ('hash', bench_hash),
+              ('coverage', bench_coverage),
+              ('coverage_raster', bench_coverage_raster),
+              ('sweep', bench_sweep),
+              ('irdrop', bench_irdrop))
+
+
+def measure(setup, size, repeat):
+    function = setup(size)
+    with CallCounter(fakepcbnew) as counter:
+        function()
+    times = []
+    for _ in range(repeat):
+        started = time.time()
+        function()
+        times.append(time.time() - started)
+    return {'seconds': min(times), 'calls': counter.total}
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Keys of the results slower than the baseline or making more pcbnew calls"""
+    flagged = []
+    for key, result in sorted(results.items()):
+        base = baseline.get(key)
+        if base is None:
+            continue
+        slower = result['seconds'] > base['seconds'] * (1 + tolerance) \
+            and result['seconds'] - base['seconds'] > MIN_DELTA
+        if slower or result['calls'] > base['calls']:
+            flagged.append(key)
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default=','.join(str(size) for size in SIZES))
+    parser.add_argument('--only', default='', help="comma separated benchmark names")
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--output', default=RESULTS)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    only = [name for name in args.only.split(',') if name]
+    results = {}
+    for name, setup in BENCHMARKS:
+        if only and name not in only:
+            continue
+        for size in sizes:
+            results['{}/{}'.format(name, size)] = measure(setup, size, args.repeat)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as stream:
+            baseline = json.load(stream)['results']
+    flagged = compare(results, baseline, args.tolerance)
+
+    print('{:<28} {:>10} {:>10} {:>7} {:>10}'.format('benchmark', 'seconds', 'baseline', 'ratio', 'calls'))
+    for key, result in sorted(results.items(), key=lambda item: (item[0].split('/')[0], int(item[0].split('/')[1]))):
+        base = baseline.get(key)
+        print('{:<28} {:>10.4f} {:>10} {:>7} {:>10} {}'.format(
+            key, result['seconds'], '{:.4f}'.format(base['seconds']) if base else '-',
+            '{:.2f}'.format(result['seconds'] / base['seconds']) if base and base['seconds'] else '-',
+            result['calls'], 'REGRESSION' if key in flagged else ''))
+
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+              'numpy': np.__version__, 'machine': platform.machine(), 'results': results}
+    with open(args.output, 'w') as stream:
+        json.dump(report, stream, indent=1, sort_keys=True)
+    if args.update_baseline:
+        baseline.update(results)
+        report['results'] = baseline
+        with open(args.baseline, 'w') as stream:
+            json.dump(report, stream, indent=1, sort_keys=True)
+    return 1 if flagged and not args.update_baseline else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
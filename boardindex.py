@@ -0,0 +1,180 @@
+# Copyright (c) 2018 Tommi Rintala, New Cable Corporation Ltd
+
+"""One pass over a pcbnew board, indexed for the plugins.
+
+Tracks and vias become a TrackTable, pads a PadTable, both with the
+pcbnew items kept in row order and grouped by net.  Drawings are grouped
+by (layer, class).  Every lookup after the pass is a dict access or a
+binary search instead of a walk over a SWIG collection.  Each kind of
+item is read on first use, so a plugin only pays for what it looks at.
+
+The index remembers the item counts of the board (read without walking
+the lists where pcbnew allows) and rereads the kind of items whose count
+changed, so items added or removed during a run are seen.  KiCad 5 has
+no board modification counter: an item moved in place keeps the counts,
+so every plugin run starts from a fresh index (board_index(board,
+fresh=True)) and shares it until the counts change.  Removing and adding
+as many items keeps the counts too, plugins editing the board call
+changed().
+"""
+
+from __future__ import division
+
+try:
+    from .tracetable import NetOrder, extract_pads, extract_tracks
+except (ImportError, ValueError):
+    from tracetable import NetOrder, extract_pads, extract_tracks
+
+TRACKS = 'tracks'
+PADS = 'pads'
+DRAWINGS = 'drawings'
+ZONES = 'zones'
+
+
+def _size(collection):
+    """Length of a pcbnew list, DLIST (KiCad 5) or std::deque (KiCad 6+)"""
+    count = getattr(collection, 'GetCount', None)
+    return count() if count is not None else len(collection)
+
+
+def item_count(board, kind):
+    """Number of items of one kind on the board"""
+    if kind == TRACKS:
+        if hasattr(board, 'GetNumSegmTrack'):
+            return board.GetNumSegmTrack()
+        return _size(board.GetTracks())
+    if kind == PADS:
+        return board.GetPadCount() if hasattr(board, 'GetPadCount') else _size(board.GetPads())
+    if kind == DRAWINGS:
+        return _size(board.DrawingsList())
+    return board.GetAreaCount()
+
+
+def board_key(board):
+    """Identity of the board behind a SWIG proxy, which is new on every GetBoard()"""
+    return getattr(board, 'this', None) or id(board)
+
+
+def _read_tracks(board):
+    items = []
+    table = extract_tracks(board, items)
+    return table, items, NetOrder(table.net)
+
+
+def _read_pads(board):
+    items = []
+    return extract_pads(board, items), items
+
+
+def _read_drawings(board):
+    groups = {}
+    for draw in board.DrawingsList():
+        groups.setdefault((draw.GetLayer(), draw.GetClass()), []).append(draw)
+    return groups
+
+
+def _read_zones(board):
+    return [board.GetArea(ind) for ind in range(board.GetAreaCount())]
+
+
+READERS = {TRACKS: _read_tracks, PADS: _read_pads, DRAWINGS: _read_drawings, ZONES: _read_zones}
+
+
+class BoardIndex(object):
+    """Tracks, vias, pads, drawings and zones of a board, each kind read in one pass"""
+
+    def __init__(self, board):
+        self.board = board
+        self.key = board_key(board)
+        self.counts = {}
+        self._parts = {}
+
+    def _part(self, kind):
+        if kind not in self._parts:
+            self.counts[kind] = item_count(self.board, kind)
+            self._parts[kind] = READERS[kind](self.board)
+        return self._parts[kind]
+
+    def refresh(self):
+        """Forget the kinds of items whose count changed, they are reread on use"""
+        stale = [kind for kind in self._parts if item_count(self.board, kind) != self.counts[kind]]
+        for kind in stale:
+            del self._parts[kind]
+        return stale
+
+    def changed(self, drawings=False, zones=False):
+        """Reread drawings or zones on next use, for callers that removed and added them"""
+        for kind, flag in ((DRAWINGS, drawings), (ZONES, zones)):
+            if flag:
+                self._parts.pop(kind, None)
+
+    @property
+    def tracks(self):
+        """TrackTable of the tracks and vias"""
+        return self._part(TRACKS)[0]
+
+    @property
+    def track_items(self):
+        return self._part(TRACKS)[1]
+
+    @property
+    def pads(self):
+        """PadTable of the pads"""
+        return self._part(PADS)[0]
+
+    @property
+    def pad_items(self):
+        return self._part(PADS)[1]
+
+    def tracks_for_net(self, net):
+        """Row indexes of the tracks and vias of a net"""
+        return self._part(TRACKS)[2].rows(net)
+
+    def pads_for_net(self, net):
+        """Row indexes of the pads of a net"""
+        return self.pads.pads_for_net(net)
+
+    def track_items_for_net(self, net):
+        items = self.track_items
+        return [items[ind] for ind in self.tracks_for_net(net)]
+
+    def pad_items_for_net(self, net):
+        items = self.pad_items
+        return [items[ind] for ind in self.pads_for_net(net)]
+
+    def drawings(self, layer=None, cls=None):
+        """Drawings on `layer` of class `cls` (GetClass() name), None matches any"""
+        groups = self._part(DRAWINGS)
+        if layer is not None and cls is not None:
+            return list(groups.get((layer, cls), ()))
+        return [draw for (draw_layer, draw_cls), items in groups.items()
+                if (layer is None or draw_layer == layer) and (cls is None or draw_cls == cls)
+                for draw in items]
+
+    def zones(self, layer=None):
+        """Zones on `layer` (keep-outs may span several layers), or all"""
+        return [zone for zone in self._part(ZONES) if layer is None or zone.IsOnLayer(layer)]
+
+
+_index = [None]
+
+
+def board_index(board, fresh=False):
+    """Shared index of `board`, rebuilt when `fresh` is set or for another board"""
+    index = _index[0]
+    if fresh or index is None or board_key(board) != index.key:
+        index = _index[0] = BoardIndex(board)
+    else:
+        index.refresh()
+    return index
+
+
+def invalidate():
+    """Drop the shared index, the next board_index() scans again"""
+    _index[0] = None
+
+
+def changed(drawings=False, zones=False):
+    """Tell the shared index that drawings or zones were removed or added"""
+    if _index[0] is not None:
+        _index[0].changed(drawings, zones)
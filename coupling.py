@@ -0,0 +1,161 @@
+# Copyright (c) 2018 Tommi Rintala, New Cable Corporation Ltd
+
+"""Trace to trace coupling capacitance.
+
+Candidate segment pairs come from the spatial grid, pairs on the same
+layer and on different nets that run parallel within `max_spacing` are
+kept.  For those the overlapping length and the edge to edge spacing
+are computed with numpy, the capacitance per length is the closed form
+of two coplanar strips (conformal mapping, complete elliptic integrals),
+reduced for a ground plane at `height` below the traces.  The result is
+summed into a sparse net x net matrix.
+"""
+
+from __future__ import division
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.special import ellipk
+
+try:
+    from .tracetable import NM, group_nets
+    from .spatial import SpatialGrid
+except (ImportError, ValueError):
+    from tracetable import NM, group_nets
+    from spatial import SpatialGrid
+
+EPSILON_0 = 8.8541878128e-12
+ER_FR4 = 4.5
+MAX_SPACING = 1000000        # nm
+MAX_ANGLE = 5.0              # degrees between "parallel" segments
+DIELECTRIC_HEIGHT = 0.2e-3   # trace to reference plane, metres
+
+
+def effective_permittivity(er, internal_layer):
+    """Stripline traces see the full dielectric, outer ones half air"""
+    return er if internal_layer else (er + 1) / 2.0
+
+
+def strip_capacitance(width, spacing, eps_eff=1.0, height=None):
+    """Capacitance per metre between two coplanar strips.
+
+    `width` is the (mean) strip width and `spacing` the gap, in metres.
+    With a reference plane at `height` the coupling falls off as
+    1 / (1 + (s / h)^2), the usual crosstalk approximation.
+    """
+    k = spacing / (spacing + 2.0 * width)
+    # ellipk() takes the parameter m = k^2
+    capacitance = EPSILON_0 * eps_eff * ellipk(1.0 - k * k) / ellipk(k * k)
+    if height is not None:
+        capacitance = capacitance / (1.0 + (spacing / height) ** 2)
+    return capacitance
+
+
+class SegmentPairs(object):
+    """Parallel segment pairs of different nets, all lengths in metres"""
+
+    def __init__(self, first, second, overlap, spacing, capacitance):
+        self.first = first
+        self.second = second
+        self.overlap = overlap
+        self.spacing = spacing
+        self.capacitance = capacitance
+
+    def __len__(self):
+        return len(self.first)
+
+
+def parallel_pairs(table, max_spacing=MAX_SPACING, max_angle=MAX_ANGLE):
+    """Row pairs of `table` tracks running side by side.
+
+    Returns (first, second, overlap, spacing) with the overlap length and
+    edge to edge spacing in nm.  Vias, zero length tracks and tracks
+    without a net are ignored.
+    """
+    dx = (table.x1 - table.x0).astype(np.float64)
+    dy = (table.y1 - table.y0).astype(np.float64)
+    length = np.hypot(dx, dy)
+    usable = np.flatnonzero(~table.via & (length > 0) & (table.net != 0))
+    grid = SpatialGrid(table.x0[usable], table.y0[usable], table.x1[usable], table.y1[usable],
+                       table.width[usable] / 2.0)
+    first, second = grid.pairs(max_spacing)
+    first = usable[first]
+    second = usable[second]
+    keep = (table.layer[first] == table.layer[second]) & (table.net[first] != table.net[second])
+    first = first[keep]
+    second = second[keep]
+
+    ux = dx[first] / length[first]
+    uy = dy[first] / length[first]
+    cross = (ux * dy[second] - uy * dx[second]) / length[second]
+    keep = np.abs(cross) <= np.sin(np.radians(max_angle))
+    first, second, ux, uy = first[keep], second[keep], ux[keep], uy[keep]
+
+    # second segment's end points along and across the first one
+    ex0 = table.x0[second] - table.x0[first]
+    ey0 = table.y0[second] - table.y0[first]
+    ex1 = table.x1[second] - table.x0[first]
+    ey1 = table.y1[second] - table.y0[first]
+    along0 = ex0 * ux + ey0 * uy
+    along1 = ex1 * ux + ey1 * uy
+    start = np.maximum(np.minimum(along0, along1), 0.0)
+    end = np.minimum(np.maximum(along0, along1), length[first])
+    overlap = end - start
+    centre = (np.abs(ux * ey0 - uy * ex0) + np.abs(ux * ey1 - uy * ex1)) / 2.0
+    spacing = centre - (table.width[first] + table.width[second]) / 2.0
+    keep = (overlap > 0) & (spacing > 0) & (spacing <= max_spacing)
+    return first[keep], second[keep], overlap[keep], spacing[keep]
+
+
+class CouplingMatrix(object):
+    """Coupling capacitance between nets.
+
+    `matrix` is a symmetric scipy CSR matrix in farads indexed like
+    `netcodes`, `pairs` the contributing SegmentPairs.
+    """
+
+    def __init__(self, netcodes, names, matrix, pairs):
+        self.netcodes = netcodes
+        self.names = names
+        self.matrix = matrix
+        self.pairs = pairs
+
+    def index(self, net):
+        return int(np.searchsorted(self.netcodes, net))
+
+    def between(self, net_a, net_b):
+        """Coupling capacitance between two net codes"""
+        if net_a not in self.netcodes or net_b not in self.netcodes:
+            return 0.0
+        return float(self.matrix[self.index(net_a), self.index(net_b)])
+
+    def total(self):
+        """Total coupling capacitance of every net to all other nets"""
+        return np.asarray(self.matrix.sum(axis=1)).ravel()
+
+    def strongest(self, count=10):
+        """The `count` largest couplings as (name, name, farads) tuples"""
+        upper = self.matrix.tocoo()
+        keep = upper.row < upper.col
+        row, col, value = upper.row[keep], upper.col[keep], upper.data[keep]
+        order = np.argsort(-value, kind='mergesort')[:count]
+        return [(self.names[row[ind]], self.names[col[ind]], float(value[ind])) for ind in order]
+
+
+def coupling_matrix(table, max_spacing=MAX_SPACING, er=ER_FR4, internal_layer=False,
+                    height=DIELECTRIC_HEIGHT, max_angle=MAX_ANGLE):
+    """Net x net coupling capacitance of the tracks in a TrackTable"""
+    netcodes, inverse = group_nets(table.net)
+    names = [table.netnames.get(int(code), u'') for code in netcodes]
+    first, second, overlap, spacing = parallel_pairs(table, max_spacing, max_angle)
+    overlap = overlap * NM
+    spacing = spacing * NM
+    width = (table.width[first] + table.width[second]) / 2.0 * NM
+    capacitance = strip_capacitance(width, spacing, effective_permittivity(er, internal_layer),
+                                    height) * overlap
+    size = len(netcodes)
+    rows = np.concatenate((inverse[first], inverse[second]))
+    cols = np.concatenate((inverse[second], inverse[first]))
+    matrix = coo_matrix((np.tile(capacitance, 2), (rows, cols)), shape=(size, size)).tocsr()
+    return CouplingMatrix(netcodes, names, matrix,
+                          SegmentPairs(first, second, overlap, spacing, capacitance))
@@ -0,0 +1,88 @@
+# Copyright (c) 2018 Tommi Rintala, New Cable Corporation Ltd
+
+"""Wiretools diagnostics: the last run report of every plugin.
+
+The report lists the stage timings, the pcbnew call counts and the
+results logged by the last run.  The dialog also sets the log level and
+turns pcbnew call counting on for the following runs.
+"""
+
+import logging
+
+import pcbnew
+
+try:
+    from . import instrument
+except (ImportError, ValueError):
+    import instrument
+
+LOG_LEVELS = (("Warnings", logging.WARNING), ("Info", logging.INFO), ("Debug", logging.DEBUG))
+
+
+class DiagnosticsPlugin(pcbnew.ActionPlugin):
+    def defaults(self):
+        self.name = "Wiretools diagnostics"
+        self.category = "Info PCB"
+        self.description = "Timings and pcbnew call counts of the last Wiretools runs"
+
+    def Run(self):
+        import wx
+
+        log = instrument.setup_logging()
+
+        class DiagnosticsDialog(wx.Dialog):
+            def __init__(self, parent):
+                wx.Dialog.__init__(self, parent, id=wx.ID_ANY, title="Wiretools diagnostics",
+                                   style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
+                panel = wx.Panel(self)
+
+                self.report = wx.TextCtrl(panel, value=instrument.format_report(),
+                                          style=wx.TE_MULTILINE | wx.TE_READONLY | wx.HSCROLL)
+                self.report.SetFont(wx.Font(9, wx.FONTFAMILY_TELETYPE, wx.FONTSTYLE_NORMAL,
+                                            wx.FONTWEIGHT_NORMAL))
+                self.report.SetMinSize((640, 420))
+
+                bottom = wx.BoxSizer(wx.HORIZONTAL)
+                self.level = wx.RadioBox(panel, label="Console log", choices=[name for name, _ in LOG_LEVELS])
+                levels = [level for _, level in LOG_LEVELS]
+                self.level.SetSelection(levels.index(log.level) if log.level in levels else 1)
+                self.level.Bind(wx.EVT_RADIOBOX, self.on_level)
+                bottom.Add(self.level, 0, wx.RIGHT, 4)
+                self.count_calls = wx.CheckBox(panel, label="Count pcbnew calls (slower runs)")
+                self.count_calls.SetValue(instrument.COUNT_CALLS)
+                self.count_calls.Bind(wx.EVT_CHECKBOX, self.on_count_calls)
+                bottom.Add(self.count_calls, 0, wx.ALL | wx.ALIGN_CENTER_VERTICAL, 4)
+                copy_button = wx.Button(panel, label="Copy")
+                copy_button.Bind(wx.EVT_BUTTON, self.on_button_copy)
+                bottom.Add(copy_button, 0, wx.LEFT | wx.ALIGN_CENTER_VERTICAL, 4)
+                close_button = wx.Button(panel, label="Close")
+                close_button.Bind(wx.EVT_BUTTON, self.on_button_close)
+                bottom.Add(close_button, 0, wx.LEFT | wx.ALIGN_CENTER_VERTICAL, 4)
+
+                border = wx.BoxSizer(wx.VERTICAL)
+                border.Add(self.report, 1, wx.ALL | wx.EXPAND, 5)
+                border.Add(bottom, 0, wx.ALL | wx.EXPAND, 5)
+                panel.SetSizerAndFit(border)
+                window_sizer = wx.BoxSizer()
+                window_sizer.Add(panel, 1, wx.ALL | wx.EXPAND)
+                self.SetSizerAndFit(window_sizer)
+
+            def on_level(self, event):
+                log.setLevel(LOG_LEVELS[self.level.GetSelection()][1])
+
+            def on_count_calls(self, event):
+                instrument.COUNT_CALLS = self.count_calls.GetValue()
+
+            def on_button_copy(self, event):
+                if wx.TheClipboard.Open():
+                    wx.TheClipboard.SetData(wx.TextDataObject(self.report.GetValue()))
+                    wx.TheClipboard.Close()
+
+            def on_button_close(self, event):
+                event.Skip()
+                self.Close()
+
+        frame = DiagnosticsDialog(None)
+        frame.Center()
+        frame.ShowModal()
+        frame.Destroy()
@@ -0,0 +1,171 @@
+# Copyright (c) 2018 Tommi Rintala, New Cable Corporation Ltd
+
+"""Per-net resistance, inductance and impedance over frequency.
+
+Every net is taken as one line of its total length and of the width
+that gives its DC resistance, from the cached NetGeometry sums.  The
+closed forms are evaluated on a nets x frequencies grid with numpy
+broadcasting, the frequencies are only cut into blocks to keep the
+temporaries small.  Nets mixing very different widths get the skin
+effect onset of their mean width.
+
+R(f) takes the current as decaying exponentially from the conducting
+surface with the skin depth, the conducting surface narrowing towards the
+side facing the reference plane as the plane comes closer (proximity).
+At DC it is the same series resistance as net_parameters() gives.  The
+line constants are Hammerstad-Jensen microstrip for outer layers and
+Cohn's stripline for inner ones, the impedance includes the conductor
+and dielectric losses.  Nets are treated as unbranched lines and the
+ground return is not included in R.
+"""
+
+from __future__ import division
+
+import numpy as np
+
+try:
+    from .tracetable import CU_THICK, RHO_CU
+    from .coupling import DIELECTRIC_HEIGHT, ER_FR4
+except (ImportError, ValueError):
+    from tracetable import CU_THICK, RHO_CU
+    from coupling import DIELECTRIC_HEIGHT, ER_FR4
+
+MU_0 = 4e-7 * np.pi
+C_0 = 299792458.0
+TAN_DELTA_FR4 = 0.02
+BLOCK_SIZE = 1 << 20        # nets x frequencies evaluated at a time
+
+
+def skin_depth(frequency, rho_cu=RHO_CU):
+    """Skin depth in metres, infinite at DC"""
+    frequency = np.asarray(frequency, dtype=np.float64)
+    with np.errstate(divide='ignore'):
+        return np.sqrt(rho_cu / (np.pi * frequency * MU_0))
+
+
+def microstrip(width, height, er=ER_FR4):
+    """Hammerstad-Jensen (Z0, effective permittivity) of a thin microstrip"""
+    u = np.asarray(width, dtype=np.float64) / height
+    a = (1 + np.log((u ** 4 + (u / 52) ** 2) / (u ** 4 + 0.432)) / 49
+         + np.log(1 + (u / 18.1) ** 3) / 18.7)
+    b = 0.564 * ((er - 0.9) / (er + 3)) ** 0.053
+    eps_eff = (er + 1) / 2 + (er - 1) / 2 * (1 + 10 / u) ** (-a * b)
+    shape = 6 + (2 * np.pi - 6) * np.exp(-(30.666 / u) ** 0.7528)
+    z0 = 60 / np.sqrt(eps_eff) * np.log(shape / u + np.sqrt(1 + (2 / u) ** 2))
+    return z0, eps_eff
+
+
+def stripline(width, height, thickness=CU_THICK, er=ER_FR4):
+    """Cohn (Z0, effective permittivity) of a centred stripline, `height` to either plane"""
+    width = np.asarray(width, dtype=np.float64)
+    spacing = 2 * height + thickness
+    ratio = width / spacing
+    width_eff = np.where(ratio < 0.35, width - (0.35 - ratio) ** 2 * spacing, width)
+    z0 = 30 * np.pi / np.sqrt(er) * spacing / (width_eff + 0.441 * spacing)
+    return z0, np.full_like(z0, er)
+
+
+def conducting_perimeter(width, thickness, height, internal_layer):
+    """Surface the AC current flows on, the faces turned away from the plane drop out.
+
+    Far from a plane the whole perimeter conducts.  Over a plane closer
+    than the width the current crowds onto the facing side, both broad
+    sides for a stripline.
+    """
+    spread = 2 * np.pi * height
+    facing = spread / (width + spread)
+    if internal_layer:
+        return 2 * (width + thickness * facing)
+    return width + (width + 2 * thickness) * facing
+
+
+def ac_resistance(length, width, thickness, depth, perimeter, rho_cu=RHO_CU):
+    """Resistance with the current decaying from the surface over the skin depth.
+
+    The conducting area is area * (1 - exp(-perimeter * depth / area)),
+    the full cross section at DC and perimeter * depth at high frequency.
+    Broadcasts the net columns against the depths.
+    """
+    area = width * thickness
+    return rho_cu * length / (area * -np.expm1(-perimeter * depth / area))
+
+
+class FrequencyResponse(object):
+    """Per-net results over frequency.
+
+    `resistance` (Ohm) and `impedance` (complex characteristic impedance,
+    Ohm) are nets x frequencies arrays indexed like `netcodes` and
+    `frequencies` (Hz), `inductance` is the inductance of each net with
+    its return in the reference plane, in henries.  Nets without tracks
+    are all zero.
+    """
+
+    def __init__(self, netcodes, names, frequencies, resistance, inductance, impedance):
+        self.netcodes = netcodes
+        self.names = names
+        self.frequencies = frequencies
+        self.resistance = resistance
+        self.inductance = inductance
+        self.impedance = impedance
+
+    def __len__(self):
+        return len(self.netcodes)
+
+    def index(self, net):
+        return int(np.searchsorted(self.netcodes, net))
+
+    def reactance(self):
+        """Series reactance 2 pi f L, nets x frequencies"""
+        return 2 * np.pi * np.outer(self.inductance, self.frequencies)
+
+    def samples(self):
+        """One row per net and frequency for plotting or np.savetxt():
+        net code, frequency, resistance, reactance, Re Z0, Im Z0"""
+        nets, count = len(self.netcodes), len(self.frequencies)
+        return np.column_stack((np.repeat(self.netcodes, count), np.tile(self.frequencies, nets),
+                                self.resistance.ravel(), self.reactance().ravel(),
+                                self.impedance.real.ravel(), self.impedance.imag.ravel()))
+
+
+def frequency_response(geometry, frequencies, cu_thick=CU_THICK, internal_layer=False, er=ER_FR4,
+                       height=DIELECTRIC_HEIGHT, tan_delta=TAN_DELTA_FR4, rho_cu=RHO_CU):
+    """R(f), L and Z0(f) of every net of a NetGeometry at `frequencies` (Hz).
+
+    `height` is the dielectric between the traces and the reference
+    plane.  The impedance is not defined at DC and comes out as nan.
+    """
+    frequencies = np.atleast_1d(np.asarray(frequencies, dtype=np.float64))
+    nets, count = len(geometry), len(frequencies)
+    present = np.flatnonzero(geometry.length_per_width > 0)
+    length = geometry.length[present]
+    width = length / geometry.length_per_width[present]
+    if internal_layer:
+        z0, eps_eff = stripline(width, height, cu_thick, er)
+    else:
+        z0, eps_eff = microstrip(width, height, er)
+    line_inductance = z0 * np.sqrt(eps_eff) / C_0 * length
+    perimeter = conducting_perimeter(width, cu_thick, height, internal_layer)
+
+    inductance = np.zeros(nets)
+    inductance[present] = line_inductance
+    resistance = np.zeros((nets, count))
+    impedance = np.zeros((nets, count), dtype=np.complex128)
+    omega = 2 * np.pi * frequencies
+    depth = skin_depth(frequencies, rho_cu)
+    scale = z0 / np.sqrt(1 - 1j * tan_delta)
+    column = (slice(None), np.newaxis)
+    step = max(1, BLOCK_SIZE // max(1, len(present)))
+    for block in range(0, count, step):
+        cols = slice(block, block + step)
+        block_r = ac_resistance(length[column], width[column], cu_thick, depth[cols], perimeter[column], rho_cu)
+        resistance[present, cols] = block_r
+        # Z0 sqrt((R + jwL) / (G + jwC)) = Z0 sqrt((1 - j R / wL) / (1 - j tan d)),
+        # the square root in real arithmetic, numpy's complex one is several times slower
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = block_r / (omega[cols] * line_inductance[column])
+            real = np.sqrt((np.hypot(1.0, ratio) + 1) / 2)
+            imag = ratio / (2 * real)
+        impedance.real[present, cols] = real * scale.real[column] + imag * scale.imag[column]
+        impedance.imag[present, cols] = real * scale.imag[column] - imag * scale.real[column]
+    impedance[:, frequencies <= 0] = np.nan
+    return FrequencyResponse(geometry.netcodes, geometry.names, frequencies, resistance, inductance, impedance)
@@ -0,0 +1,247 @@
+# Copyright (c) 2018 Tommi Rintala, New Cable Corporation Ltd
+
+"""Copper coverage of hash shielding.
+
+The exact engine works in the frame of the hash lattice, where the
+openings of the hash are axis aligned squares.  The area of a polygon
+inside a row of such windows is summed edge by edge with Green's
+theorem (area = -loop integral of F(v) du, F the height of the edge
+clipped to the window), so every outline edge only visits the lattice
+columns it crosses.  Rows below an edge get the full window height and
+are handled with a running sum.  Copper is the shield region minus the
+openings inside the border band, per lattice cell.
+
+The raster engine samples the segments that were actually generated on
+a square grid.  It is slower and approximate, but it sees the cuts
+around obstacles and keep-outs as well.  Both return a CoverageMap of
+tiles, so thin spots of the shielding can be found.
+"""
+
+from __future__ import division
+
+import numpy as np
+
+try:
+    from .spatial import expand_ranges
+    from .hashgeom import LineFamily, Obstacles, hash_segments, inset_outline, loop_edges, signed_area
+except (ImportError, ValueError):
+    from spatial import expand_ranges
+    from hashgeom import LineFamily, Obstacles, hash_segments, inset_outline, loop_edges, signed_area
+
+TILE_NM = 5000000               # side of a coverage map tile
+THIN_FRACTION = 0.5             # tiles below this share of the mean coverage are thin
+MAX_LATTICE_CELLS = 4000000     # larger lattices go to the raster engine
+MAX_SAMPLES = 2000000           # raster samples, the cell grows beyond this
+
+
+class CoverageMap(object):
+    """Copper coverage per tile.
+
+    `x`, `y` are the tile centres on the board, `area` the shield region
+    and `copper` the copper inside each tile, both in square board
+    units.  Tiles are `size` wide squares turned by `angle` degrees.
+    """
+
+    def __init__(self, x, y, area, copper, size, angle=0.0, method='exact'):
+        self.x = x
+        self.y = y
+        self.area = area
+        self.copper = copper
+        self.size = size
+        self.angle = angle
+        self.method = method
+
+    def __len__(self):
+        return len(self.x)
+
+    @property
+    def coverage(self):
+        """Copper share of the whole shield region, 0 .. 1"""
+        total = self.area.sum()
+        return float(self.copper.sum() / total) if total > 0 else 0.0
+
+    def tile_coverage(self):
+        return self.copper / self.area
+
+    def thin(self, fraction=THIN_FRACTION):
+        """Tiles at least half inside the region with less than `fraction` of the mean coverage"""
+        full = self.area >= self.size * self.size / 2.0
+        return np.flatnonzero(full & (self.tile_coverage() < fraction * self.coverage))
+
+
+def _window_mean(a, b, height):
+    """Mean of clip(t, 0, height) for t running linearly from a to b"""
+    def antiderivative(t):
+        return np.where(t <= 0, 0.0, np.where(t >= height, height * (t - height / 2.0), t * t / 2.0))
+
+    span = b - a
+    flat = np.abs(span) <= 1e-9 * height
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = (antiderivative(b) - antiderivative(a)) / span
+    return np.where(flat, np.clip((a + b) / 2.0, 0.0, height), mean)
+
+
+def lattice_range(loops, family):
+    """(first column, first row), (columns, rows) of the lattice cells around the polygons"""
+    points = np.concatenate(loops)
+    u, v = family.frame(points[:, 0], points[:, 1])
+    first = np.floor(np.array([u.min(), v.min()]) / family.pitch).astype(np.int64) - 1
+    last = np.floor(np.array([u.max(), v.max()]) / family.pitch).astype(np.int64) + 1
+    return (int(first[0]), int(first[1])), (int(last[0] - first[0] + 1), int(last[1] - first[1] + 1))
+
+
+def lattice_areas(loops, family, low, high, first, shape):
+    """Area of oriented polygons inside the windows of a square lattice.
+
+    Window (i, k) runs from `low` to `high` along u and v from the
+    lattice point (i, k) * pitch of the family frame.  `first` is the
+    (i, k) of the result's [0, 0] and `shape` its (columns, rows).
+    Holes (negative polygons) are subtracted, outside windows get 0.
+    """
+    pitch = family.pitch
+    cols, rows = shape
+    height = high - low
+    x0, y0, x1, y1 = loop_edges(loops)
+    ua, va = family.frame(x0, y0)
+    ub, vb = family.frame(x1, y1)
+    moving = ua != ub
+    ua, va, ub, vb = ua[moving], va[moving], ub[moving], vb[moving]
+
+    # edge pieces inside the window of every column they cross
+    left = np.minimum(ua, ub)
+    right = np.maximum(ua, ub)
+    col_first = np.ceil((left - high) / pitch).astype(np.int64)
+    counts = np.maximum(np.floor((right - low) / pitch).astype(np.int64) - col_first + 1, 0)
+    edge = np.repeat(np.arange(len(ua)), counts)
+    col = col_first[edge] + expand_ranges(np.zeros(len(counts), dtype=np.int64), counts)
+    start = np.maximum(left[edge], col * pitch + low)
+    end = np.minimum(right[edge], col * pitch + high)
+    keep = end > start
+    edge, col, start, end = edge[keep], col[keep], start[keep], end[keep]
+    slope = (vb - va)[edge] / (ub - ua)[edge]
+    v_start = va[edge] + (start - ua[edge]) * slope
+    v_end = va[edge] + (end - ua[edge]) * slope
+    weight = np.sign(ub - ua)[edge] * (end - start)
+    bottom = np.minimum(v_start, v_end)
+    top = np.maximum(v_start, v_end)
+
+    # windows below the whole piece see the full height, as a running sum over the rows
+    full_last = np.floor((bottom - high) / pitch).astype(np.int64)
+    stop = np.clip(full_last - first[1] + 1, 0, rows)
+    column = col - first[0]
+    below = np.bincount(column * (rows + 1), weight * height, cols * (rows + 1))
+    below -= np.bincount(column * (rows + 1) + stop, weight * height, cols * (rows + 1))
+    below = np.cumsum(below.reshape(cols, rows + 1), axis=1)[:, :rows]
+
+    # windows the piece passes through
+    counts = np.maximum(np.ceil((top - low) / pitch).astype(np.int64) - full_last - 1, 0)
+    piece = np.repeat(np.arange(len(col)), counts)
+    row = full_last[piece] + 1 + expand_ranges(np.zeros(len(counts), dtype=np.int64), counts)
+    base = row * pitch + low
+    value = weight[piece] * _window_mean(v_start[piece] - base, v_end[piece] - base, height)
+    crossed = np.bincount(column[piece] * rows + row - first[1], value, cols * rows).reshape(cols, rows)
+    return -(below + crossed)
+
+
+def _tiles(family, first, grid_area, grid_copper, block, method):
+    """Sum lattice cells into `block` x `block` tiles"""
+    cols, rows = grid_area.shape
+    pad = ((0, -cols % block), (0, -rows % block))
+    shape = ((cols + pad[0][1]) // block, block, (rows + pad[1][1]) // block, block)
+    area = np.pad(grid_area, pad, 'constant').reshape(shape).sum(axis=(1, 3))
+    copper = np.pad(grid_copper, pad, 'constant').reshape(shape).sum(axis=(1, 3))
+    tile_u, tile_v = np.meshgrid(np.arange(shape[0]), np.arange(shape[2]), indexing='ij')
+    x, y = family.board((first[0] + (tile_u + 0.5) * block) * family.pitch,
+                        (first[1] + (tile_v + 0.5) * block) * family.pitch)
+    # tiny slivers left by rounding are not tiles
+    keep = area > 1e-9 * (block * family.pitch) ** 2
+    angle = np.degrees(np.arctan2(family.dy, family.dx))
+    return CoverageMap(x[keep], y[keep], area[keep], copper[keep], block * family.pitch, angle, method)
+
+
+def exact_coverage(loops, angle, pitch, width, tile=TILE_NM):
+    """Coverage of hash_segments(loops, angle, pitch) and the outline drawn `width` wide.
+
+    `loops` is the outline the hash lines are clipped to, the centre
+    line of the border.  The shield region reaches half a width beyond
+    it, corners mitred.  Obstacle cuts are not seen, see
+    raster_coverage().
+    """
+    points = np.concatenate(loops)
+    family = LineFamily(-angle, pitch, (points[:, 0].min(), points[:, 1].min()))
+    region = inset_outline(loops, 0, 0, 0, 0, extra=-width / 2.0)
+    first, shape = lattice_range(region, family)
+    grid_area = lattice_areas(region, family, 0.0, pitch, first, shape)
+    if pitch > width:
+        inner = inset_outline(loops, 0, 0, 0, 0, extra=width / 2.0)
+        grid_open = lattice_areas(inner, family, width / 2.0, pitch - width / 2.0, first, shape)
+    else:
+        grid_open = np.zeros(shape)
+    # an inset outline turning inside out is no opening
+    grid_copper = grid_area - np.clip(grid_open, 0.0, grid_area)
+    block = max(1, int(round(tile / pitch)))
+    return _tiles(family, first, grid_area, grid_copper, block, 'exact')
+
+
+def _paint(line, start, end, cell, cols, rows):
+    """Samples (row, column) at the cell centres covered by the row intervals"""
+    keep = (line >= 0) & (line < rows)
+    line, start, end = line[keep], start[keep], end[keep]
+    first = np.clip(np.ceil(start / cell - 0.5), 0, cols).astype(np.int64)
+    last = np.clip(np.ceil(end / cell - 0.5), 0, cols).astype(np.int64)
+    marks = np.bincount(line * (cols + 1) + first, minlength=rows * (cols + 1))
+    marks -= np.bincount(line * (cols + 1) + last, minlength=rows * (cols + 1))
+    return np.cumsum(marks.reshape(rows, cols + 1), axis=1)[:, :cols] > 0
+
+
+def raster_coverage(loops, segments, width, cell=None, tile=TILE_NM, max_samples=MAX_SAMPLES):
+    """Coverage of `segments` (x0, y0, x1, y1 arrays) drawn `width` wide, sampled.
+
+    `loops` is the border centre line as for exact_coverage().  Samples
+    are `cell` apart, by default a third of the width but no more than
+    `max_samples` over the region.
+    """
+    region = inset_outline(loops, 0, 0, 0, 0, extra=-width / 2.0)
+    points = np.concatenate(region)
+    left, top = points.min(axis=0)
+    right, bottom = points.max(axis=0)
+    if cell is None:
+        cell = max(width / 3.0, np.sqrt((right - left) * (bottom - top) / max_samples))
+    cols = int(np.ceil((right - left) / cell)) + 1
+    rows = int(np.ceil((bottom - top) / cell)) + 1
+
+    # horizontal sample rows through the cell centres
+    family = LineFamily(0.0, cell, (left, top + cell / 2.0))
+    inside = _paint(*(family.spans(region) + (cell, cols, rows)))
+    x0, y0, x1, y1 = [np.asarray(value, dtype=np.float64) for value in segments]
+    drawn = Obstacles.capsules(x0, y0, x1, y1, np.full(len(x0), width / 2.0))
+    copper = _paint(*(family.obstacle_cuts(drawn) + (cell, cols, rows))) & inside
+
+    block = max(1, int(round(tile / cell)))
+    pad = ((0, -rows % block), (0, -cols % block))
+    shape = ((rows + pad[0][1]) // block, block, (cols + pad[1][1]) // block, block)
+    area = np.pad(inside, pad, 'constant').reshape(shape).sum(axis=(1, 3)) * cell * cell
+    covered = np.pad(copper, pad, 'constant').reshape(shape).sum(axis=(1, 3)) * cell * cell
+    tile_y, tile_x = np.meshgrid(np.arange(shape[0]), np.arange(shape[2]), indexing='ij')
+    keep = area > 0
+    return CoverageMap((left + (tile_x[keep] + 0.5) * block * cell),
+                       (top + (tile_y[keep] + 0.5) * block * cell),
+                       area[keep], covered[keep], block * cell, 0.0, 'raster')
+
+
+def shield_coverage(loops, angle, pitch, width, segments=None, tile=TILE_NM):
+    """Coverage map of hash shielding, exact where possible.
+
+    Without `segments` the hash of `loops` is measured exactly, with them
+    (or for lattices over MAX_LATTICE_CELLS) the drawn segments are
+    sampled by raster_coverage().
+    """
+    if not loops:
+        return CoverageMap(*([np.empty(0)] * 4 + [tile]))
+    if segments is None:
+        area = abs(sum(signed_area(loop) for loop in loops))
+        if area / (pitch * pitch) <= MAX_LATTICE_CELLS:
+            return exact_coverage(loops, angle, pitch, width, tile)
+        hashes = hash_segments(loops, angle, pitch)
+        segments = tuple(np.concatenate(pair) for pair in zip(loop_edges(loops), hashes))
+    return raster_coverage(loops, segments, width, tile=tile)
@@ -0,0 +1,748 @@
+# Copyright (c) 2018 Tommi Rintala, New Cable Corporation Ltd.
+
+"""Hash shielding geometry without pcbnew or wx.
+
+Everything here works on plain numbers and numpy arrays so that the
+shielding calculations can be used from the dialog, from batch runs and
+from tests alike.  Outlines are lists of closed polygons, (n, 2) vertex
+arrays in board units.
+"""
+
+from __future__ import division
+
+import numpy as np
+
+try:
+    from .spatial import SpatialGrid, expand_ranges
+    from .tracetable import PAD_CIRCLE, PAD_OVAL, _GOLDEN
+except (ImportError, ValueError):
+    from spatial import SpatialGrid, expand_ranges
+    from tracetable import PAD_CIRCLE, PAD_OVAL, _GOLDEN
+
+DEFAULT_OFFSET_LEFT_MM = 5
+DEFAULT_OFFSET_RIGHT_MM = 5
+DEFAULT_OFFSET_TOP_MM = 1
+DEFAULT_OFFSET_BOTTOM_MM = 1
+DEFAULT_LINE_WIDTH_MM = 0.3
+DEFAULT_LINE_ANGLE = 45
+DEFAULT_PITCH_MM = 10 * DEFAULT_LINE_WIDTH_MM
+DEFAULT_CLEARANCE_MM = 0.2
+
+
+ARC_ERROR_NM = 10000        # chord error allowed when arcs are turned into polygons
+CHAIN_TOLERANCE_NM = 1000   # outline end points closer than this are joined
+
+
+def arc_points(cx, cy, sx, sy, angle, max_error=ARC_ERROR_NM):
+    """Polyline of an arc from (sx, sy) around (cx, cy) by `angle` degrees.
+
+    Angles follow pcbnew, positive turns from +x towards +y.  Both end
+    points are included.
+    """
+    radius = np.hypot(sx - cx, sy - cy)
+    sweep = np.radians(angle)
+    if radius > max_error:
+        step = 2 * np.arccos(1 - max_error / radius)
+        count = max(1, int(np.ceil(abs(sweep) / step)))
+    else:
+        count = 1
+    turn = np.arctan2(sy - cy, sx - cx) + np.linspace(0, sweep, count + 1)
+    points = np.column_stack((cx + radius * np.cos(turn), cy + radius * np.sin(turn)))
+    points[0] = (sx, sy)
+    return points
+
+
+def circle_points(cx, cy, radius, max_error=ARC_ERROR_NM):
+    """Closed polygon of a circle, the first point is not repeated"""
+    return arc_points(cx, cy, cx + radius, cy, 360, max_error)[:-1]
+
+
+def arc_extents(cx, cy, sx, sy, angle):
+    """Exact (min x, min y, max x, max y) of the arc drawn by arc_points"""
+    radius = np.hypot(sx - cx, sy - cy)
+    start = np.degrees(np.arctan2(sy - cy, sx - cx))
+    low, high = sorted((start, start + angle))
+    # the arc reaches its extremes at the ends and where it crosses an axis
+    turn = np.radians(np.concatenate(((start, start + angle),
+                                      90.0 * np.arange(np.ceil(low / 90.0), np.floor(high / 90.0) + 1))))
+    xs = cx + radius * np.cos(turn)
+    ys = cy + radius * np.sin(turn)
+    xs[0], ys[0] = sx, sy
+    return xs.min(), ys.min(), xs.max(), ys.max()
+
+
+def signed_area(loop):
+    """Shoelace area of a closed polygon"""
+    x = loop[:, 0]
+    y = loop[:, 1]
+    return (np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2.0
+
+
+def chain_outline(edges, tolerance=CHAIN_TOLERANCE_NM):
+    """Chain outline edges (x0, y0, x1, y1 rows) into closed polygons.
+
+    Returns (loops, open_edges): a list of (n, 2) vertex arrays without
+    the closing point, and the number of edges left in open chains.
+    """
+    edges = np.asarray(edges, dtype=np.float64).reshape(-1, 4)
+    keys = np.round(edges.reshape(-1, 2) / tolerance).astype(np.int64)
+    ends = {}
+    for ind, key in enumerate(map(tuple, keys)):
+        ends.setdefault(key, []).append(ind)
+
+    used = np.zeros(len(edges), dtype=bool)
+    loops = []
+    open_edges = 0
+    for first in range(len(edges)):
+        if used[first]:
+            continue
+        used[first] = True
+        points = [edges[first, 0:2]]
+        start = tuple(keys[2 * first])
+        current = 2 * first + 1
+        count = 1
+        while tuple(keys[current]) != start:
+            following = [end for end in ends[tuple(keys[current])]
+                         if not used[end // 2]]
+            if not following:
+                break
+            end = following[0]
+            used[end // 2] = True
+            count += 1
+            points.append(edges.reshape(-1, 2)[current])
+            # continue from the other end of the edge
+            current = end ^ 1
+        if tuple(keys[current]) == start and count > 2:
+            loops.append(np.array(points))
+        else:
+            open_edges += count
+    return loops, open_edges
+
+
+def orient_outline(loops):
+    """Largest polygon counter clockwise (positive area), the others as holes.
+
+    With this orientation the board material is always on the left hand
+    side of every edge.
+    """
+    if not loops:
+        return []
+    areas = [signed_area(loop) for loop in loops]
+    outer = int(np.argmax(np.abs(areas)))
+    oriented = []
+    for ind, loop in enumerate(loops):
+        if (areas[ind] > 0) != (ind == outer):
+            loop = loop[::-1]
+        oriented.append(loop)
+    return oriented
+
+
+def inset_outline(loops, left, right, top, bottom, extra=0.0):
+    """Move every outline edge towards the board material.
+
+    The distance of an edge is picked by its outward normal from the
+    left/right/top/bottom offsets (y grows down), plus `extra`, so an
+    axis aligned rectangle gets exactly the old box offsets.  Corners are
+    mitred; features thinner than the offsets are not removed.
+    """
+    result = []
+    for loop in orient_outline(loops):
+        keep = np.any(loop != np.roll(loop, 1, axis=0), axis=1)
+        loop = loop[keep]
+        edge = np.roll(loop, -1, axis=0) - loop
+        length = np.hypot(edge[:, 0], edge[:, 1])
+        normal_x = edge[:, 1] / length
+        normal_y = -edge[:, 0] / length
+        distance = (np.maximum(normal_x, 0) * right + np.maximum(-normal_x, 0) * left
+                    + np.maximum(normal_y, 0) * bottom + np.maximum(-normal_y, 0) * top + extra)
+        base = loop - np.column_stack((normal_x, normal_y)) * distance[:, None]
+
+        # vertex i joins shifted edges i - 1 and i
+        prev_base = np.roll(base, 1, axis=0)
+        prev_edge = np.roll(edge, 1, axis=0)
+        cross = prev_edge[:, 0] * edge[:, 1] - prev_edge[:, 1] * edge[:, 0]
+        gap = base - prev_base
+        with np.errstate(divide='ignore', invalid='ignore'):
+            along = (gap[:, 0] * edge[:, 1] - gap[:, 1] * edge[:, 0]) / cross
+        corner = prev_base + prev_edge * along[:, None]
+        straight = np.abs(cross) <= 1e-9 * length * np.roll(length, 1)
+        corner[straight] = base[straight]
+        result.append(corner)
+    return result
+
+
+def loop_edges(loops):
+    """Edges of closed polygons as x0, y0, x1, y1 arrays"""
+    if not loops:
+        empty = np.empty(0)
+        return empty, empty, empty, empty
+    start = np.concatenate(loops)
+    end = np.concatenate([np.roll(loop, -1, axis=0) for loop in loops])
+    return start[:, 0], start[:, 1], end[:, 0], end[:, 1]
+
+
+class LineFamily(object):
+    """Parallel lines `pitch` apart at `angle` degrees, one through `origin`.
+
+    Angles follow pcbnew (y down).  In the family frame u runs along the
+    lines and v across them, line k lies at v = k * pitch.
+    """
+
+    def __init__(self, angle, pitch, origin=(0.0, 0.0)):
+        theta = np.radians(angle)
+        self.dx = np.cos(theta)
+        self.dy = np.sin(theta)
+        self.pitch = pitch
+        self.origin = origin
+
+    def frame(self, x, y):
+        """Board coordinates to (u, v)"""
+        x = np.asarray(x, dtype=np.float64) - self.origin[0]
+        y = np.asarray(y, dtype=np.float64) - self.origin[1]
+        return x * self.dx + y * self.dy, y * self.dx - x * self.dy
+
+    def board(self, u, v):
+        """(u, v) back to board coordinates"""
+        return self.origin[0] + u * self.dx - v * self.dy, self.origin[1] + u * self.dy + v * self.dx
+
+    def spans(self, loops):
+        """Clip the lines against polygons (even-odd), all at once.
+
+        Returns (line, start, end) arrays, sorted by line and start.  A
+        line crossing a cut-out or a concave part gives several spans.
+        """
+        x0, y0, x1, y1 = loop_edges(loops)
+        u0, v0 = self.frame(x0, y0)
+        u1, v1 = self.frame(x1, y1)
+
+        # an edge crosses the lines low <= v < high, so shared vertices count once
+        first = np.ceil(np.minimum(v0, v1) / self.pitch).astype(np.int64)
+        counts = np.maximum(np.ceil(np.maximum(v0, v1) / self.pitch).astype(np.int64) - first, 0)
+        edge = np.repeat(np.arange(len(u0)), counts)
+        line = first[edge] + expand_ranges(np.zeros(len(counts), dtype=np.int64), counts)
+        u = u0[edge] + (line * self.pitch - v0[edge]) * (u1[edge] - u0[edge]) / (v1[edge] - v0[edge])
+
+        order = np.lexsort((u, line))
+        u = u[order]
+        line = line[order]
+        start, end, line = u[0::2], u[1::2], line[0::2]
+        keep = end > start
+        return line[keep], start[keep], end[keep]
+
+    def segments(self, line, start, end):
+        """Spans as board x0, y0, x1, y1 arrays"""
+        v = line * self.pitch
+        x0, y0 = self.board(start, v)
+        x1, y1 = self.board(end, v)
+        return x0, y0, x1, y1
+
+    def obstacle_cuts(self, obstacles):
+        """(line, start, end) parts of the lines covered by obstacles"""
+        cx, cy = obstacles.centres()
+        _, v = self.frame(cx, cy)
+        reach = obstacles.reach()
+        first = np.ceil((v - reach) / self.pitch).astype(np.int64)
+        counts = np.maximum(np.floor((v + reach) / self.pitch).astype(np.int64) - first + 1, 0)
+        index = np.repeat(np.arange(len(obstacles)), counts)
+        line = first[index] + expand_ranges(np.zeros(len(counts), dtype=np.int64), counts)
+        px, py = self.board(np.zeros(len(line)), line * self.pitch)
+        start, end = obstacles.intervals(index, px, py, self.dx, self.dy)
+        keep = end > start
+        return line[keep], start[keep], end[keep]
+
+
+def subtract_intervals(owner, start, end, cut_owner, cut_start, cut_end, min_length=0.0):
+    """Remove the cut intervals from the intervals of the same owner.
+
+    The intervals of an owner must not overlap, cuts may.  Returns the
+    remaining (owner, start, end) pieces longer than `min_length`.
+    """
+    owner = np.asarray(owner, dtype=np.int64)
+    if not len(cut_owner) or not len(owner):
+        keep = end - start > min_length
+        return owner[keep], start[keep], end[keep]
+    low = min(start.min(), cut_start.min())
+    stride = 2 * (max(end.max(), cut_end.max()) - low) + 1
+
+    # merge overlapping cuts, owners are kept apart by the stride
+    order = np.lexsort((cut_start, cut_owner))
+    cut_owner = cut_owner[order]
+    cut_start = cut_start[order]
+    cut_end = cut_end[order]
+    key_start = cut_owner * stride + (cut_start - low)
+    key_end = cut_owner * stride + (cut_end - low)
+    reach = np.maximum.accumulate(key_end)
+    new = np.r_[True, key_start[1:] > reach[:-1]]
+    heads = np.flatnonzero(new)
+    merged_start = cut_start[heads]
+    merged_end = np.maximum.reduceat(cut_end, heads)
+    key_start = key_start[heads]
+    key_end = np.maximum.reduceat(key_end, heads)
+
+    # piece m of an interval runs from the end of cut m - 1 to the start of cut m
+    first = np.searchsorted(key_end, owner * stride + (start - low), 'right')
+    last = np.searchsorted(key_start, owner * stride + (end - low), 'left')
+    counts = np.maximum(last - first, 0) + 1
+    piece = np.repeat(np.arange(len(owner)), counts)
+    cut = expand_ranges(first, counts)
+    opening = cut == first[piece]
+    closing = cut == first[piece] + counts[piece] - 1
+    piece_start = np.where(opening, start[piece], merged_end[np.maximum(cut - 1, 0)])
+    piece_end = np.where(closing, end[piece], merged_start[np.minimum(cut, len(heads) - 1)])
+    keep = piece_end - piece_start > min_length
+    return owner[piece][keep], piece_start[keep], piece_end[keep]
+
+
+def line_polygon_intervals(px, py, ux, uy, loops):
+    """(line, start, end) parts of lines p + t * u inside polygons (even-odd).
+
+    Every line is tested against every polygon edge, meant for a few
+    small polygons like keep-out areas.
+    """
+    x0, y0, x1, y1 = loop_edges(loops)
+    line = np.repeat(np.arange(len(px)), len(x0))
+    edge = np.tile(np.arange(len(x0)), len(px))
+    side0 = ux[line] * (y0[edge] - py[line]) - uy[line] * (x0[edge] - px[line])
+    side1 = ux[line] * (y1[edge] - py[line]) - uy[line] * (x1[edge] - px[line])
+    cross = (side0 > 0) != (side1 > 0)
+    line, edge, side0, side1 = line[cross], edge[cross], side0[cross], side1[cross]
+    share = side0 / (side0 - side1)
+    hit_x = x0[edge] + share * (x1[edge] - x0[edge])
+    hit_y = y0[edge] + share * (y1[edge] - y0[edge])
+    t = (hit_x - px[line]) * ux[line] + (hit_y - py[line]) * uy[line]
+    order = np.lexsort((t, line))
+    t = t[order]
+    line = line[order]
+    return line[0::2], t[0::2], t[1::2]
+
+
+class Obstacles(object):
+    """Circles and oriented rectangles the shielding must keep away from.
+
+    Rectangle angles are radians in the pcbnew direction (y down) of the
+    rectangle's x axis.  Indexes run over the circles first, then the
+    rectangles.
+    """
+
+    def __init__(self, cx=(), cy=(), radius=(), rx=(), ry=(), half_x=(), half_y=(), angle=()):
+        self.cx = np.asarray(cx, dtype=np.float64)
+        self.cy = np.asarray(cy, dtype=np.float64)
+        self.radius = np.asarray(radius, dtype=np.float64)
+        self.rx = np.asarray(rx, dtype=np.float64)
+        self.ry = np.asarray(ry, dtype=np.float64)
+        self.half_x = np.asarray(half_x, dtype=np.float64)
+        self.half_y = np.asarray(half_y, dtype=np.float64)
+        self.angle = np.asarray(angle, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.cx) + len(self.rx)
+
+    def __add__(self, other):
+        return Obstacles(*[np.concatenate((getattr(self, name), getattr(other, name)))
+                           for name in ('cx', 'cy', 'radius', 'rx', 'ry', 'half_x', 'half_y', 'angle')])
+
+    @classmethod
+    def capsules(cls, x0, y0, x1, y1, radius):
+        """Segments with round ends, as a rectangle and two circles each"""
+        length = np.hypot(x1 - x0, y1 - y0)
+        return cls(np.concatenate((x0, x1)), np.concatenate((y0, y1)), np.tile(radius, 2),
+                   (x0 + x1) / 2.0, (y0 + y1) / 2.0, length / 2.0, radius,
+                   np.arctan2(y1 - y0, x1 - x0))
+
+    @classmethod
+    def from_tracks(cls, table, margin=0):
+        """Tracks as capsules and vias as circles, grown by `margin`"""
+        tracks = table.tracks
+        vias = table.vias
+        return (cls.capsules(tracks.x0, tracks.y0, tracks.x1, tracks.y1, tracks.width / 2.0 + margin)
+                + cls(vias.x0, vias.y0, vias.width / 2.0 + margin))
+
+    @classmethod
+    def from_pads(cls, pads, margin=0):
+        """Round pads as circles, ovals as capsules, other shapes by their rectangle"""
+        angle = -np.radians(pads.orient)
+        sx = pads.sx.astype(np.float64)
+        sy = pads.sy.astype(np.float64)
+        circle = pads.shape == PAD_CIRCLE
+        oval = (pads.shape == PAD_OVAL) & ~circle
+        rect = ~circle & ~oval
+        # oval: a capsule along its longer side
+        along = np.where(sx >= sy, angle, angle + np.pi / 2)
+        straight = np.abs(sx - sy)[oval] / 2.0
+        ox = pads.x[oval] + np.cos(along[oval]) * straight
+        oy = pads.y[oval] + np.sin(along[oval]) * straight
+        return (cls(pads.x[circle], pads.y[circle], sx[circle] / 2.0 + margin)
+                + cls.capsules(2 * pads.x[oval] - ox, 2 * pads.y[oval] - oy, ox, oy,
+                               np.minimum(sx, sy)[oval] / 2.0 + margin)
+                + cls(rx=pads.x[rect], ry=pads.y[rect], half_x=sx[rect] / 2.0 + margin,
+                      half_y=sy[rect] / 2.0 + margin, angle=angle[rect]))
+
+    def polygons(self, max_error=ARC_ERROR_NM):
+        """Outline of every obstacle as a list of (n, 2) vertex arrays.
+
+        Circles become polygons around them, never inside.
+        """
+        result = [circle_points(cx, cy, radius + max_error, max_error)
+                  for cx, cy, radius in zip(self.cx, self.cy, self.radius)]
+        corner_x = np.array([-1, 1, 1, -1])
+        corner_y = np.array([-1, -1, 1, 1])
+        for rx, ry, half_x, half_y, angle in zip(self.rx, self.ry, self.half_x, self.half_y, self.angle):
+            local_x = corner_x * half_x
+            local_y = corner_y * half_y
+            result.append(np.column_stack((rx + local_x * np.cos(angle) - local_y * np.sin(angle),
+                                           ry + local_x * np.sin(angle) + local_y * np.cos(angle))))
+        return result
+
+    def centres(self):
+        return np.concatenate((self.cx, self.rx)), np.concatenate((self.cy, self.ry))
+
+    def reach(self):
+        """Radius of a circle enclosing each obstacle"""
+        return np.concatenate((self.radius, np.hypot(self.half_x, self.half_y)))
+
+    def boxes(self):
+        """left, top, right, bottom of the enclosing circles"""
+        cx, cy = self.centres()
+        reach = self.reach()
+        return cx - reach, cy - reach, cx + reach, cy + reach
+
+    def intervals(self, index, px, py, ux, uy):
+        """Interval of t where p + t * u (u unit length) is inside obstacle `index`.
+
+        Returns (start, end), start >= end for lines missing the obstacle.
+        """
+        count = len(index)
+        px, py, ux, uy = [np.broadcast_to(np.asarray(value, dtype=np.float64), (count,))
+                          for value in (px, py, ux, uy)]
+        start = np.zeros(count)
+        end = np.zeros(count)
+
+        circle = index < len(self.cx)
+        ind = index[circle]
+        dx = px[circle] - self.cx[ind]
+        dy = py[circle] - self.cy[ind]
+        half = dx * ux[circle] + dy * uy[circle]
+        disc = half * half - (dx * dx + dy * dy - self.radius[ind] ** 2)
+        root = np.sqrt(np.maximum(disc, 0.0))
+        start[circle] = np.where(disc > 0, -half - root, 0.0)
+        end[circle] = np.where(disc > 0, -half + root, 0.0)
+
+        rect = ~circle
+        ind = index[rect] - len(self.cx)
+        cos_a = np.cos(self.angle[ind])
+        sin_a = np.sin(self.angle[ind])
+        dx = px[rect] - self.rx[ind]
+        dy = py[rect] - self.ry[ind]
+        low = np.full(len(ind), -np.inf)
+        high = np.full(len(ind), np.inf)
+        # slabs |offset + t * rate| <= half along both rectangle axes
+        for offset, rate, size in ((dx * cos_a + dy * sin_a, ux[rect] * cos_a + uy[rect] * sin_a, self.half_x[ind]),
+                                   (dy * cos_a - dx * sin_a, uy[rect] * cos_a - ux[rect] * sin_a, self.half_y[ind])):
+            flat = np.abs(rate) < 1e-12
+            with np.errstate(divide='ignore', invalid='ignore'):
+                first = (-size - offset) / rate
+                second = (size - offset) / rate
+            low = np.maximum(low, np.where(flat, np.where(np.abs(offset) <= size, -np.inf, np.inf),
+                                           np.minimum(first, second)))
+            high = np.minimum(high, np.where(flat, np.where(np.abs(offset) <= size, np.inf, -np.inf),
+                                             np.maximum(first, second)))
+        start[rect] = low
+        end[rect] = high
+        return start, end
+
+
+def segment_cuts(x0, y0, x1, y1, obstacles=None, keepouts=(), min_length=0.0):
+    """Cut obstacles and keep-out polygons out of arbitrary segments.
+
+    Candidate (segment, obstacle) pairs come from a SpatialGrid over the
+    obstacles.  Returns x0, y0, x1, y1 of the remaining pieces.
+    """
+    x0, y0, x1, y1 = [np.asarray(value, dtype=np.float64) for value in (x0, y0, x1, y1)]
+    length = np.hypot(x1 - x0, y1 - y0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ux = np.nan_to_num((x1 - x0) / length)
+        uy = np.nan_to_num((y1 - y0) / length)
+    cut_owner = [np.empty(0, dtype=np.int64)]
+    cut_start = [np.empty(0)]
+    cut_end = [np.empty(0)]
+    if obstacles is not None and len(obstacles) and len(x0):
+        left, top, right, bottom = obstacles.boxes()
+        grid = SpatialGrid(left, top, right, bottom, 0.0)
+        owner, index = grid.query_boxes(np.minimum(x0, x1), np.minimum(y0, y1),
+                                        np.maximum(x0, x1), np.maximum(y0, y1))
+        start, end = obstacles.intervals(index, x0[owner], y0[owner], ux[owner], uy[owner])
+        cut_owner.append(owner)
+        cut_start.append(start)
+        cut_end.append(end)
+    if keepouts and len(x0):
+        owner, start, end = line_polygon_intervals(x0, y0, ux, uy, keepouts)
+        cut_owner.append(owner)
+        cut_start.append(start)
+        cut_end.append(end)
+    cut_owner = np.concatenate(cut_owner)
+    cut_start = np.concatenate(cut_start)
+    cut_end = np.concatenate(cut_end)
+    keep = cut_end > cut_start
+    owner, start, end = subtract_intervals(np.arange(len(x0)), np.zeros(len(x0)), length,
+                                           cut_owner[keep], cut_start[keep], cut_end[keep], min_length)
+    return (x0[owner] + start * ux[owner], y0[owner] + start * uy[owner],
+            x0[owner] + end * ux[owner], y0[owner] + end * uy[owner])
+
+
+def scanline_spans(loops, angle, pitch, origin=(0.0, 0.0)):
+    """Parallel lines clipped against polygons, see LineFamily.spans().
+
+    Returns x0, y0, x1, y1 arrays.
+    """
+    family = LineFamily(angle, pitch, origin)
+    return family.segments(*family.spans(loops))
+
+
+PATTERN_HASH = 'hash'      # two perpendicular families, the first rising at the angle
+PATTERN_GRID = 'grid'      # the hash at 0 / 90 degrees
+PATTERN_CROSS = 'cross'    # two families at independent angles
+PATTERN_HEX = 'hex'        # honeycomb, pitch across the flats of a cell
+PATTERNS = (PATTERN_HASH, PATTERN_GRID, PATTERN_CROSS, PATTERN_HEX)
+
+
+def square_angle(pattern, angle):
+    """Angle of the square lattice of a pattern, None for the other patterns"""
+    if pattern == PATTERN_HASH:
+        return angle
+    if pattern == PATTERN_GRID:
+        return 0.0
+    return None
+
+
+def lattice_origin(loops, first, second, pitch, stagger=0.0):
+    """Pattern origin: the top left corner of the outline, moved by `stagger` pitches.
+
+    The move is across both the `first` and `second` angle families, so
+    a stagger of 0.5 puts the lines of one layer in the middle of the
+    openings of another.
+    """
+    points = np.concatenate(loops)
+    origin = np.array([points[:, 0].min(), points[:, 1].min()])
+    if stagger:
+        normals = [np.array([-np.sin(np.radians(angle)), np.cos(np.radians(angle))]) for angle in (first, second)]
+        origin = origin + stagger * pitch * (normals[0] + normals[1]) / (1.0 + np.dot(*normals))
+    return origin[0], origin[1]
+
+
+def pattern_families(pattern, angle, pitch, angle2=None):
+    """(angle, line pitch, dash) of every line family of a pattern.
+
+    `dash` is None for full lines, or (period, length, even start, odd
+    start): pieces of `length` every `period` along the lines, starting
+    at the given offset on even and odd lines.
+    """
+    if pattern == PATTERN_HASH:
+        return [(-angle, pitch, None), (90 - angle, pitch, None)]
+    if pattern == PATTERN_GRID:
+        return [(0.0, pitch, None), (90.0, pitch, None)]
+    if pattern == PATTERN_CROSS:
+        return [(-angle, pitch, None), (-(angle + 90 if angle2 is None else angle2), pitch, None)]
+    if pattern == PATTERN_HEX:
+        # cell side a, edges on lines half a pitch apart, the origin in a cell centre
+        side = pitch / np.sqrt(3.0)
+        dash = (3 * side, side, side, -side / 2.0)
+        return [(90 - angle + turn, pitch / 2.0, dash) for turn in (0, 60, 120)]
+    raise ValueError("Unknown shield pattern {}".format(pattern))
+
+
+def dash_spans(line, start, end, period, length, even_start, odd_start):
+    """Cut (line, start, end) spans down to the dashes along the lines"""
+    phase = np.where(line % 2 == 0, even_start, odd_start)
+    first = np.floor((start - phase - length) / period).astype(np.int64) + 1
+    counts = np.maximum(np.ceil((end - phase) / period).astype(np.int64) - first, 0)
+    span = np.repeat(np.arange(len(line)), counts)
+    dash = phase[span] + (first[span] + expand_ranges(np.zeros(len(counts), dtype=np.int64), counts)) * period
+    piece_start = np.maximum(dash, start[span])
+    piece_end = np.minimum(dash + length, end[span])
+    keep = piece_end > piece_start
+    return line[span][keep], piece_start[keep], piece_end[keep]
+
+
+def pattern_segments(loops, pattern, angle, pitch, obstacles=None, keepouts=(), min_length=0.0,
+                     angle2=None, stagger=0.0):
+    """Line families of a shield pattern clipped to `loops`, x0, y0, x1, y1 arrays.
+
+    See PATTERNS, `angle2` is the second angle of the cross pattern and
+    `stagger` moves the pattern by that many pitches (lattice_origin()).
+    Obstacles (already grown by the clearance) and keep-out polygons are
+    cut out of every line, pieces shorter than `min_length` are dropped.
+    """
+    if not loops:
+        return loop_edges(loops)
+    families = pattern_families(pattern, angle, pitch, angle2)
+    origin = lattice_origin(loops, families[0][0], families[1][0], pitch, stagger)
+    result = []
+    for family_angle, line_pitch, dash in families:
+        family = LineFamily(family_angle, line_pitch, origin)
+        line, start, end = family.spans(loops)
+        if dash is not None:
+            line, start, end = dash_spans(line, start, end, *dash)
+        cuts = [family.obstacle_cuts(obstacles)] if obstacles is not None and len(obstacles) else []
+        if keepouts:
+            cuts.append(family.spans(keepouts))
+        if cuts:
+            cut_line, cut_start, cut_end = [np.concatenate(part) for part in zip(*cuts)]
+            line, start, end = subtract_intervals(line, start, end, cut_line, cut_start, cut_end, min_length)
+        result.append(family.segments(line, start, end))
+    return tuple(np.concatenate(pair) for pair in zip(*result))
+
+
+def hash_segments(loops, angle, pitch, obstacles=None, keepouts=(), min_length=0.0):
+    """Both line families of the hash clipped to `loops`, x0, y0, x1, y1 arrays.
+
+    The families are perpendicular, the first one rising at `angle`
+    degrees.  Lines are anchored at the top left corner of the outline.
+    Obstacles (already grown by the clearance) and keep-out polygons are
+    cut out of every line, pieces shorter than `min_length` are dropped.
+    """
+    return pattern_segments(loops, PATTERN_HASH, angle, pitch, obstacles, keepouts, min_length)
+
+
+def shield_lines(outline, offsets, width, pattern, angle, pitch, obstacles=None, keepouts=(),
+                 angle2=None, stagger=0.0):
+    """Border and pattern segments of one shield layer, no board access.
+
+    `offsets` are (left, right, top, bottom) from the board outline to
+    the edge of the border line.
+    """
+    inset = inset_outline(outline, *offsets, extra=width / 2.0)
+    border = segment_cuts(*loop_edges(inset), obstacles=obstacles, keepouts=keepouts)
+    lines = pattern_segments(inset, pattern, angle, pitch, obstacles, keepouts, angle2=angle2, stagger=stagger)
+    return border, lines
+
+
+def hash_openings(loops, angle, pitch, width, stagger=0.0):
+    """Openings of the hash over the outline, an (n, 4, 2) array of squares.
+
+    Both hash families share one lattice: in the frame of the rising
+    family the lines lie at u = i * pitch and v = k * pitch, the openings
+    are the squares between them shrunk by half the line width.  Every
+    square the outline reaches into is returned, the copper of the hash
+    is the outline minus these.  `stagger` moves the lattice as in
+    pattern_segments().
+    """
+    if not loops or pitch <= width:
+        return np.empty((0, 4, 2))
+    family = LineFamily(-angle, pitch, lattice_origin(loops, -angle, 90 - angle, pitch, stagger))
+    # rows are scanned through the middle of the openings
+    middle = LineFamily(-angle, pitch, family.board(0.0, pitch / 2.0))
+    row, start, end = middle.spans(loops)
+    first = np.floor(start / pitch).astype(np.int64) - 1
+    counts = np.floor(end / pitch).astype(np.int64) + 1 - first + 1
+    span = np.repeat(np.arange(len(row)), counts)
+    column = first[span] + expand_ranges(np.zeros(len(counts), dtype=np.int64), counts)
+
+    # the middle lines miss rows the outline ends in short of their middle: add
+    # the cells around points at most a pitch apart along the outline edges
+    x0, y0, x1, y1 = loop_edges(loops)
+    u0, v0 = family.frame(x0, y0)
+    u1, v1 = family.frame(x1, y1)
+    steps = np.maximum(np.ceil(np.hypot(u1 - u0, v1 - v0) / pitch).astype(np.int64), 1)
+    edge = np.repeat(np.arange(len(steps)), steps)
+    along = expand_ranges(np.zeros(len(steps), dtype=np.int64), steps) / steps[edge]
+    edge_column = np.floor((u0[edge] + (u1 - u0)[edge] * along) / pitch).astype(np.int64)
+    edge_row = np.floor((v0[edge] + (v1 - v0)[edge] * along) / pitch).astype(np.int64)
+    around = np.array([(du, dv) for du in (-1, 0, 1) for dv in (-1, 0, 1)])
+    edge_cells = (np.column_stack((edge_column, edge_row))[:, None, :] + around[None, :, :]).reshape(-1, 2)
+    cells = np.unique(np.concatenate((np.column_stack((column, row[span])), edge_cells)), axis=0)
+
+    half = width / 2.0
+    low_u = cells[:, 0] * pitch + half
+    high_u = (cells[:, 0] + 1) * pitch - half
+    low_v = cells[:, 1] * pitch + half
+    high_v = (cells[:, 1] + 1) * pitch - half
+    corner_u = np.column_stack((low_u, high_u, high_u, low_u))
+    corner_v = np.column_stack((low_v, low_v, high_v, high_v))
+    x, y = family.board(corner_u, corner_v)
+    return np.stack((x, y), axis=-1)
+
+
+def fit_view(loops, width, height, margin=4):
+    """Scale and offset that fit the outline into a width x height pixel view.
+
+    Returns (scale, offset_x, offset_y), a board point p maps to
+    p * scale + offset.  The outline is centred, aspect ratio kept.
+    """
+    if not loops:
+        return 1.0, 0.0, 0.0
+    points = np.concatenate(loops)
+    low = points.min(axis=0)
+    size = np.maximum(points.max(axis=0) - low, 1.0)
+    scale = min((width - 2 * margin) / size[0], (height - 2 * margin) / size[1])
+    offset = (np.array([width, height]) - size * scale) / 2.0 - low * scale
+    return scale, offset[0], offset[1]
+
+
+def to_pixels(segments, view):
+    """Segments (x0, y0, x1, y1 arrays) as rows of integer pixel coordinates"""
+    scale, offset_x, offset_y = view
+    x0, y0, x1, y1 = segments
+    return np.round(np.column_stack((x0 * scale + offset_x, y0 * scale + offset_y,
+                                     x1 * scale + offset_x, y1 * scale + offset_y))).astype(int)
+
+
+DIFF_QUANTUM_NM = 100       # end points closer than this are the same when updating shielding
+
+
+def segment_keys(x0, y0, x1, y1, quantum=DIFF_QUANTUM_NM):
+    """64-bit keys of segments by their quantized, direction free end points.
+
+    Identical segments get distinct keys by their occurrence count, like
+    tracetable.row_keys().
+    """
+    ends = [np.round(np.asarray(value, dtype=np.float64) / quantum).astype(np.int64)
+            for value in (x0, y0, x1, y1)]
+    swap = (ends[0] > ends[2]) | ((ends[0] == ends[2]) & (ends[1] > ends[3]))
+    columns = (np.where(swap, ends[2], ends[0]), np.where(swap, ends[3], ends[1]),
+               np.where(swap, ends[0], ends[2]), np.where(swap, ends[1], ends[3]))
+    keys = np.zeros(len(ends[0]), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for column in columns:
+            keys = (keys ^ column.view(np.uint64)) * _GOLDEN
+            keys ^= keys >> np.uint64(29)
+        order = np.argsort(keys, kind='mergesort')
+        ordered = keys[order]
+        first = np.concatenate(([True], ordered[1:] != ordered[:-1]))
+        starts = np.flatnonzero(first)
+        rank = np.arange(len(keys)) - np.repeat(starts, np.diff(np.append(starts, len(keys))))
+        keys[order] = ordered + rank.astype(np.uint64) * _GOLDEN
+    return keys
+
+
+class SegmentDiff(object):
+    """How to turn existing segments into new ones with the fewest changes.
+
+    `keep_old`/`keep_new` are matching pairs (only the width may need a
+    change), `move_old`/`move_new` pairs of existing items to be moved to
+    new end points, `remove` the existing items left over and `add` the
+    new segments without an item.
+    """
+
+    def __init__(self, keep_old, keep_new, move_old, move_new, remove, add):
+        self.keep_old = keep_old
+        self.keep_new = keep_new
+        self.move_old = move_old
+        self.move_new = move_new
+        self.remove = remove
+        self.add = add
+
+    def summary(self):
+        return "{} kept, {} moved, {} removed, {} added".format(
+            len(self.keep_old), len(self.move_old), len(self.remove), len(self.add))
+
+
+def diff_segments(old, new, quantum=DIFF_QUANTUM_NM):
+    """Match existing segments `old` against `new`, both x0, y0, x1, y1 arrays"""
+    old_keys = segment_keys(*old, quantum=quantum)
+    new_keys = segment_keys(*new, quantum=quantum)
+    _, keep_old, keep_new = np.intersect1d(old_keys, new_keys, assume_unique=True, return_indices=True)
+    spare_old = np.setdiff1d(np.arange(len(old_keys)), keep_old)
+    spare_new = np.setdiff1d(np.arange(len(new_keys)), keep_new)
+    moved = min(len(spare_old), len(spare_new))
+    return SegmentDiff(keep_old, keep_new, spare_old[:moved], spare_new[:moved],
+                       spare_old[moved:], spare_new[moved:])
@@ -0,0 +1,143 @@
+# Copyright (c) 2018 Tommi Rintala, New Cable Corporation Ltd
+
+"""Search hash parameters for a shielding target.
+
+The target is a minimum copper coverage and, optionally, a largest
+aperture (the diagonal of a hash opening, usually a fraction of the
+wavelength to be shielded).  For every line width (never below the
+manufacturing minimum) and angle the widest pitch meeting the target is
+found by bisection, starting from the pitch an infinite hash would need.
+Candidates are measured exactly over the real outline with hashcover,
+the searches run in a thread pool.  Candidates meeting the target rank
+first, the ones with the widest pitch (the fewest segments) leading.
+"""
+
+from __future__ import division
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    from .tracetable import NM
+    from .hashgeom import inset_outline
+    from .hashcover import exact_coverage
+except (ImportError, ValueError):
+    from tracetable import NM
+    from hashgeom import inset_outline
+    from hashcover import exact_coverage
+
+SPEED_OF_LIGHT = 299792458.0
+APERTURE_FRACTION = 20          # largest aperture as a fraction of the wavelength
+MIN_WIDTH_NM = 150000           # used when the board has no minimum track width
+WIDTH_STEPS = (1.0, 1.5, 2.0, 3.0, 4.0)     # line widths tried, times the minimum width
+PITCH_STEPS = 8                 # bisection steps of the pitch search
+ANGLES = (0.0, 22.5, 45.0, 67.5)
+WORKERS = 4
+
+
+def aperture(pitch, width):
+    """Longest straight line through a hash opening, its diagonal"""
+    return np.sqrt(2.0) * np.maximum(np.asarray(pitch) - width, 0.0)
+
+
+def aperture_limit(frequency, fraction=APERTURE_FRACTION, er=1.0):
+    """Largest aperture in board units for a frequency in Hz, wavelength / fraction"""
+    return SPEED_OF_LIGHT / (frequency * np.sqrt(er)) / fraction / NM
+
+
+def infinite_pitch(width, coverage):
+    """Pitch of an infinite hash of `width` lines covering `coverage` (0 .. 1)"""
+    return width / (1.0 - np.sqrt(1.0 - min(coverage, 0.999999)))
+
+
+class Candidate(object):
+    """One set of hash parameters and how it measured against the target"""
+
+    def __init__(self, pitch, width, angle):
+        self.pitch = pitch
+        self.width = width
+        self.angle = angle
+        self.coverage = None
+        self.aperture = float(aperture(pitch, width))
+        self.shortfall = None
+
+    @property
+    def feasible(self):
+        return self.shortfall == 0
+
+    def rank_key(self):
+        return (not self.feasible, self.shortfall, -self.pitch, -self.coverage, self.width)
+
+
+def pitch_range(width, target, max_aperture=None):
+    """Pitches worth trying for a width: around the infinite hash pitch, within the aperture limit"""
+    guess = infinite_pitch(width, target)
+    low = max(0.6 * guess, 1.05 * width)
+    high = 2.0 * guess
+    if max_aperture is not None:
+        high = min(high, width + max_aperture / np.sqrt(2.0))
+    return low, max(high, low)
+
+
+def evaluate(outline, offsets, candidate, target, max_aperture=None):
+    """Measure one candidate over the outline, `offsets` are (left, right, top, bottom)"""
+    loops = inset_outline(outline, *offsets, extra=candidate.width / 2.0)
+    candidate.coverage = exact_coverage(loops, candidate.angle, candidate.pitch,
+                                        candidate.width).coverage if loops else 0.0
+    shortfall = max(0.0, target - candidate.coverage) / target
+    if max_aperture is not None:
+        shortfall += max(0.0, candidate.aperture - max_aperture) / max_aperture
+    candidate.shortfall = shortfall
+    return candidate
+
+
+def widest_pitch(outline, offsets, width, angle, target, max_aperture=None, steps=PITCH_STEPS):
+    """Widest pitch meeting the target for one width and angle, by bisection.
+
+    Coverage falls and the aperture grows with the pitch.  When even the
+    narrowest pitch misses the target that candidate is returned.
+    """
+    low, high = pitch_range(width, target, max_aperture)
+    best = evaluate(outline, offsets, Candidate(low, width, angle), target, max_aperture)
+    if not best.feasible:
+        return best
+    top = evaluate(outline, offsets, Candidate(high, width, angle), target, max_aperture)
+    if top.feasible:
+        return top
+    for _ in range(steps):
+        middle = evaluate(outline, offsets, Candidate((low + high) / 2.0, width, angle), target, max_aperture)
+        if middle.feasible:
+            best = middle
+            low = middle.pitch
+        else:
+            high = middle.pitch
+    return best
+
+
+def tune(outline, offsets, target, max_aperture=None, min_width=MIN_WIDTH_NM, width_steps=WIDTH_STEPS,
+         angles=ANGLES, steps=PITCH_STEPS, workers=WORKERS):
+    """Ranked candidates for a coverage target (0 .. 1) and aperture limit.
+
+    Every width (never below `min_width`) and angle gets its widest
+    pitch meeting the target, the searches run in parallel.  Nothing is
+    drawn, pick one of the returned candidates and generate the shielding
+    with its pitch, width and angle.
+    """
+    jobs = [(float(width), float(angle)) for width in min_width * np.asarray(width_steps, dtype=np.float64)
+            for angle in angles]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        found = list(pool.map(lambda job: widest_pitch(outline, offsets, job[0], job[1], target,
+                                                        max_aperture, steps), jobs))
+    return sorted(found, key=Candidate.rank_key)
+
+
+def format_table(ranked, count=10):
+    """Text table of the first `count` candidates, lengths in mm"""
+    lines = [u'{:>4} {:>9} {:>9} {:>6} {:>10} {:>13}  {}'.format(
+        '#', 'width mm', 'pitch mm', 'angle', 'coverage %', 'aperture mm', 'target')]
+    for rank, candidate in enumerate(ranked[:count]):
+        lines.append(u'{:>4} {:>9.3f} {:>9.3f} {:>6.1f} {:>10.1f} {:>13.3f}  {}'.format(
+            rank + 1, candidate.width * NM * 1e3, candidate.pitch * NM * 1e3, candidate.angle,
+            100 * candidate.coverage, candidate.aperture * NM * 1e3, 'met' if candidate.feasible else '-'))
+    return u'\n'.join(lines)
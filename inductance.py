@@ -0,0 +1,250 @@
+# Copyright (c) 2018 Tommi Rintala, New Cable Corporation Ltd
+
+"""Partial and loop inductance of the nets from the track geometry.
+
+Every straight track is a filament with the geometric mean distance of
+its rectangular cross section.  The self term is the closed form of a
+straight bar, the mutual terms come from the Neumann integral between
+track pairs of the same net and layer: closed form for parallel tracks
+(the usual 0/45/90 degree routing), Gauss-Legendre quadrature for the
+others, perpendicular ones couple not at all.  The loop inductance takes
+the return current in a reference plane at `height`, as an image of
+every track mirrored 2 * height away with opposite current.
+
+The current is assumed to flow along every unbranched run of a net, the
+runs meeting at a branch keep their drawn direction.  Only pairs whose
+boxes come within `cutoff` are counted.  The loop terms fall off fast
+with distance so the loop inductance converges at a few heights, the
+partial self inductance is a truncated sum.  Vias and pairs on
+different layers are left out, the layer stack is not known.
+
+Candidate pairs come from one spatial grid per batch of nets, the nets
+of a batch laid side by side so that no box of one reaches another net.
+Pairs are evaluated in bounded chunks, memory does not grow with the
+size of a net.
+"""
+
+from __future__ import division
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+try:
+    from .tracetable import CU_THICK, NM, group_nets
+    from .spatial import SpatialGrid
+    from .coupling import DIELECTRIC_HEIGHT
+    from .frequency import MU_0
+except (ImportError, ValueError):
+    from tracetable import CU_THICK, NM, group_nets
+    from spatial import SpatialGrid
+    from coupling import DIELECTRIC_HEIGHT
+    from frequency import MU_0
+
+CUTOFF = 1000000            # nm, pairs further apart are not counted
+GMD_RECT = 0.2235           # geometric mean distance of a rectangle per (width + thickness)
+GAUSS_POINTS = 16           # quadrature points per track of non-parallel pairs
+PARALLEL_SIN = 1e-9         # sine of the angle below which tracks are parallel
+ROWS_CHUNK = 1 << 16        # tracks per spatial grid and per query round
+PAIRS_CHUNK = 1 << 12       # pairs per quadrature round, GAUSS_POINTS ** 2 terms each
+
+_NODES, _WEIGHTS = np.polynomial.legendre.leggauss(GAUSS_POINTS)
+_NODES = (_NODES + 1) / 2
+_WEIGHTS = _WEIGHTS / 2
+
+
+def mean_distance(width, thickness=CU_THICK):
+    """Geometric mean distance of a rectangular cross section from itself"""
+    return GMD_RECT * (width + thickness)
+
+
+def parallel_mutual(offset, length_a, length_b, distance):
+    """Mutual inductance of parallel filaments `distance` apart.
+
+    The first runs from 0 to `length_a` along an axis, the second from
+    `offset` to `offset + length_b` in the same direction.
+    """
+    def second_integral(u):
+        return u * np.arcsinh(u / distance) - np.hypot(u, distance)
+
+    return MU_0 / (4 * np.pi) * (second_integral(offset + length_b) - second_integral(offset + length_b - length_a)
+                                 - second_integral(offset) + second_integral(offset - length_a))
+
+
+def bar_inductance(length, width, thickness=CU_THICK):
+    """Partial self inductance of a straight bar, all in metres"""
+    return parallel_mutual(0.0, length, length, mean_distance(width, thickness))
+
+
+def mutual_inductance(ax0, ay0, ax1, ay1, bx0, by0, bx1, by1, distance, elevation=0.0):
+    """Mutual inductance of filament pairs (a, b) in metres, element wise.
+
+    `distance` is added to every point to point distance in quadrature,
+    the mean distance of the cross sections, and `elevation` is the
+    vertical separation of the filaments.
+    """
+    adx, ady = ax1 - ax0, ay1 - ay0
+    bdx, bdy = bx1 - bx0, by1 - by0
+    length_a = np.hypot(adx, ady)
+    length_b = np.hypot(bdx, bdy)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ux, uy = adx / length_a, ady / length_a
+        cos_ab = (ux * bdx + uy * bdy) / length_b
+        sin_ab = (ux * bdy - uy * bdx) / length_b
+    spread = distance * distance + elevation * elevation
+    result = np.zeros(len(ax0))
+
+    parallel = np.flatnonzero(np.abs(sin_ab) <= PARALLEL_SIN)
+    if len(parallel):
+        sign = np.sign(cos_ab[parallel])
+        # b's ends along and across a's axis, b turned to run along a
+        along0 = (bx0 - ax0)[parallel] * ux[parallel] + (by0 - ay0)[parallel] * uy[parallel]
+        across = (by0 - ay0)[parallel] * ux[parallel] - (bx0 - ax0)[parallel] * uy[parallel]
+        start = np.where(sign > 0, along0, along0 - length_b[parallel])
+        result[parallel] = sign * parallel_mutual(start, length_a[parallel], length_b[parallel],
+                                                  np.sqrt(across * across + spread[parallel]))
+
+    skew = np.flatnonzero((np.abs(sin_ab) > PARALLEL_SIN) & (np.abs(cos_ab) > PARALLEL_SIN))
+    for first in range(0, len(skew), PAIRS_CHUNK):
+        rows = skew[first:first + PAIRS_CHUNK]
+        # points x quadrature nodes of a, against the nodes of b on the last axis
+        pax = ax0[rows, None, None] + adx[rows, None, None] * _NODES[None, :, None]
+        pay = ay0[rows, None, None] + ady[rows, None, None] * _NODES[None, :, None]
+        pbx = bx0[rows, None, None] + bdx[rows, None, None] * _NODES[None, None, :]
+        pby = by0[rows, None, None] + bdy[rows, None, None] * _NODES[None, None, :]
+        inverse = 1.0 / np.sqrt((pax - pbx) ** 2 + (pay - pby) ** 2 + spread[rows, None, None])
+        integral = np.einsum('pij,i,j->p', inverse, _WEIGHTS, _WEIGHTS)
+        result[rows] = MU_0 / (4 * np.pi) * (adx[rows] * bdx[rows] + ady[rows] * bdy[rows]) * integral
+    return result
+
+
+def run_directions(tracks):
+    """Which tracks to reverse so that every unbranched run points one way.
+
+    Two track ends of a net meeting at a point (on any layer, a via joins
+    them) and no other end there continue each other.  The two
+    orientations of every track are nodes of a graph, continuing ends
+    link the orientations that agree, the components then give one
+    consistent direction per run.
+    """
+    count = len(tracks)
+    if not count:
+        return np.zeros(0, dtype=bool)
+    # end points as one integer each, boards are well below 2**31 nm across
+    x = np.concatenate((tracks.x0, tracks.x1))
+    y = np.concatenate((tracks.y0, tracks.y1))
+    key = ((x - x.min()) << 32) | (y - y.min())
+    order = np.argsort(key)
+    key = key[order]
+    node = np.cumsum(np.r_[True, key[1:] != key[:-1]]) - 1
+    joint = np.bincount(node)[node] == 2
+    first = order[joint][0::2]
+    second = order[joint][1::2]
+    net = np.tile(tracks.net, 2)
+    same = net[first] == net[second]
+    first, second = first[same], second[same]
+    # end index < count is a start point, two starts or two ends meet reversed
+    track_a, track_b = first % count, second % count
+    flip = (first < count) == (second < count)
+    link_a = np.concatenate((track_a, track_a + count))
+    link_b = np.concatenate((np.where(flip, track_b + count, track_b), np.where(flip, track_b, track_b + count)))
+    graph = coo_matrix((np.ones(len(link_a)), (link_a, link_b)), shape=(2 * count, 2 * count))
+    _, label = connected_components(graph, directed=False)
+    # a closed run with an odd number of reversals has no consistent direction, kept as drawn
+    return label[:count] > label[count:]
+
+
+def net_pairs(tracks, cutoff=CUTOFF):
+    """(first, second) track pairs of a net and layer whose boxes come within `cutoff`.
+
+    A generator, every round yields the pairs of at most ROWS_CHUNK
+    query tracks, first < second.
+    """
+    if not len(tracks):
+        return
+    order = np.argsort(tracks.net.astype(np.int64) << 32 | tracks.layer, kind='mergesort')
+    net = tracks.net[order]
+    layer = tracks.layer[order]
+    starts = np.flatnonzero(np.r_[True, (net[1:] != net[:-1]) | (layer[1:] != layer[:-1])])
+    ends = np.r_[starts[1:], len(order)]
+    left = np.minimum(tracks.x0, tracks.x1)[order] - tracks.width[order] / 2.0
+    right = np.maximum(tracks.x0, tracks.x1)[order] + tracks.width[order] / 2.0
+
+    batch = 0
+    while batch < len(starts):
+        # whole groups up to ROWS_CHUNK tracks, a bigger group on its own
+        last = max(batch + 1, np.searchsorted(ends, starts[batch] + ROWS_CHUNK, side='right'))
+        rows = slice(starts[batch], ends[last - 1])
+        sizes = ends[batch:last] - starts[batch:last]
+        group_left = np.minimum.reduceat(left[rows], starts[batch:last] - starts[batch])
+        group_right = np.maximum.reduceat(right[rows], starts[batch:last] - starts[batch])
+        # groups side by side along x, more than the cutoff apart
+        span = group_right - group_left + 2 * cutoff + 1
+        shift = np.repeat(np.cumsum(span) - span - group_left, sizes)
+        picked = order[rows]
+        grid = SpatialGrid(tracks.x0[picked] + shift, tracks.y0[picked], tracks.x1[picked] + shift,
+                           tracks.y1[picked], tracks.width[picked] / 2.0)
+        for query_first in range(0, len(picked), ROWS_CHUNK):
+            part = slice(query_first, query_first + ROWS_CHUNK)
+            query, item = grid.query_boxes(grid.left[part] - cutoff, grid.top[part] - cutoff,
+                                           grid.right[part] + cutoff, grid.bottom[part] + cutoff)
+            query += query_first
+            keep = query < item
+            yield picked[query[keep]], picked[item[keep]]
+        batch = last
+
+
+class NetInductance(object):
+    """Inductance of the nets in henries, arrays indexed like `netcodes`.
+
+    `loop` is with the return current in the reference plane, `partial`
+    the partial self inductance of the tracks alone and `pairs` the
+    number of track pairs counted.
+    """
+
+    def __init__(self, netcodes, loop, partial, pairs):
+        self.netcodes = netcodes
+        self.loop = loop
+        self.partial = partial
+        self.pairs = pairs
+
+    def __len__(self):
+        return len(self.netcodes)
+
+
+def net_inductance(table, height=DIELECTRIC_HEIGHT, cu_thick=CU_THICK, cutoff=CUTOFF):
+    """Loop and partial inductance of every net of a TrackTable, `height` in metres"""
+    tracks = table.tracks
+    codes, inverse = group_nets(tracks.net)
+    if not len(tracks):
+        zeros = np.zeros(len(codes))
+        return NetInductance(codes, zeros, zeros.copy(), 0)
+    x0 = tracks.x0 * NM
+    y0 = tracks.y0 * NM
+    x1 = tracks.x1 * NM
+    y1 = tracks.y1 * NM
+    reverse = run_directions(tracks)
+    x0, x1 = np.where(reverse, x1, x0), np.where(reverse, x0, x1)
+    y0, y1 = np.where(reverse, y1, y0), np.where(reverse, y0, y1)
+    gmd = mean_distance(tracks.width * NM, cu_thick)
+    length = np.hypot(x1 - x0, y1 - y0)
+
+    own = parallel_mutual(0.0, length, length, gmd)
+    image = parallel_mutual(0.0, length, length, 2.0 * height)
+    partial = np.bincount(inverse, weights=own, minlength=len(codes))
+    loop = np.bincount(inverse, weights=own - image, minlength=len(codes))
+    pairs = 0
+    for first, second in net_pairs(tracks, cutoff):
+        distance = (gmd[first] + gmd[second]) / 2
+        args = (x0[first], y0[first], x1[first], y1[first], x0[second], y0[second], x1[second], y1[second])
+        mutual = mutual_inductance(*(args + (distance,)))
+        mirrored = mutual_inductance(*(args + (distance, 2 * height)))
+        partial += 2 * np.bincount(inverse[first], weights=mutual, minlength=len(codes))
+        loop += 2 * np.bincount(inverse[first], weights=mutual - mirrored, minlength=len(codes))
+        pairs += len(first)
+    return NetInductance(codes, loop, partial, pairs)
+
+
+def loop_inductance(tracks):
+    """Loop inductance per net of group_nets(tracks.net), the GeometryCache hook"""
+    return net_inductance(tracks).loop
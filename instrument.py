@@ -0,0 +1,279 @@
+# Copyright (c) 2018 Tommi Rintala, New Cable Corporation Ltd
+
+"""Logging, stage timers and pcbnew call counting shared by the plugins.
+
+Every plugin run is wrapped in `run()`, its parts in `stage()` using the
+stage names below.  Stages of the same name are summed, nested stages
+are kept apart, so a dialog redrawing its preview fifty times is one
+line.  The report of the last run of every plugin is kept in LAST_RUNS
+for the Wiretools diagnostics action.
+
+Counting pcbnew calls replaces the methods of the SWIG proxy classes
+with counting wrappers for the duration of a run.  That costs one Python
+call per pcbnew call, so it is off unless COUNT_CALLS is set (from the
+diagnostics dialog or with WIRETOOLS_COUNT_CALLS=1).
+"""
+
+from __future__ import division
+
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+log = logging.getLogger('wiretools')
+
+# stage names used by every plugin
+SCAN = 'board scan'
+COMPUTE = 'compute'
+UI = 'ui build'
+COMMIT = 'commit'
+
+LOG_FORMAT = '%(name)s %(levelname)s: %(message)s'
+LOG_LEVEL = os.environ.get('WIRETOOLS_LOG', 'INFO').upper()
+COUNT_CALLS = os.environ.get('WIRETOOLS_COUNT_CALLS', '') not in ('', '0')
+
+# SWIG proxy classes counted, KiCad 5 and 6 names, missing ones are skipped
+COUNTED_CLASSES = ('BOARD', 'BOARD_DESIGN_SETTINGS', 'TRACK', 'PCB_TRACK', 'VIA', 'PCB_VIA',
+                   'D_PAD', 'PAD', 'MODULE', 'FOOTPRINT', 'DRAWSEGMENT', 'PCB_SHAPE', 'TEXTE_PCB',
+                   'PCB_TEXT', 'ZONE_CONTAINER', 'ZONE', 'ZONE_FILLER', 'NETINFO_ITEM',
+                   'SHAPE_POLY_SET', 'SHAPE_LINE_CHAIN', 'wxPoint', 'VECTOR2I')
+COUNTED_FUNCTIONS = ('GetBoard', 'Refresh', 'FromMM', 'ToMM', 'IsCopperLayer')
+TOP_CALLS = 15
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class ConsoleHandler(logging.Handler):
+    """Writes to the current sys.stdout, which pcbnew points at its scripting console"""
+
+    def emit(self, record):
+        try:
+            sys.stdout.write(self.format(record) + '\n')
+        except Exception:
+            self.handleError(record)
+
+
+def setup_logging(level=None):
+    """Send the wiretools log to the console once, `level` is a name or number"""
+    if not any(isinstance(handler, ConsoleHandler) for handler in log.handlers):
+        handler = ConsoleHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        log.addHandler(handler)
+        log.propagate = False
+        if level is None:
+            level = LOG_LEVEL
+    if level is not None:
+        log.setLevel(level)
+    return log
+
+
+def _counting(function, key, calls):
+    @functools.wraps(function)
+    def counted(*args, **kwargs):
+        calls[key] += 1
+        return function(*args, **kwargs)
+    counted._wiretools_counted = function
+    return counted
+
+
+class CallCounter(object):
+    """Counts calls of pcbnew functions and SWIG proxy methods while entered.
+
+    Plain functions of the listed classes (their methods and __init__)
+    and module functions are replaced, and restored on exit.  Keys are
+    "CLASS.method" or the function name.
+    """
+
+    def __init__(self, module, classes=COUNTED_CLASSES, functions=COUNTED_FUNCTIONS):
+        self.module = module
+        self.classes = classes
+        self.functions = functions
+        self.calls = Counter()
+        self._patched = []
+
+    def _patch(self, owner, name, function, key):
+        try:
+            setattr(owner, name, _counting(function, key, self.calls))
+        except (AttributeError, TypeError):
+            return
+        self._patched.append((owner, name, function))
+
+    def __enter__(self):
+        for class_name in self.classes:
+            cls = getattr(self.module, class_name, None)
+            if not isinstance(cls, type):
+                continue
+            for name, function in list(vars(cls).items()):
+                if (name.startswith('_') and name != '__init__') or not callable(function) \
+                        or isinstance(function, (type, staticmethod, classmethod)) \
+                        or hasattr(function, '_wiretools_counted'):
+                    continue
+                self._patch(cls, name, function, class_name + '.' + name)
+        for name in self.functions:
+            function = getattr(self.module, name, None)
+            if callable(function) and not hasattr(function, '_wiretools_counted'):
+                self._patch(self.module, name, function, name)
+        return self
+
+    def __exit__(self, *exc):
+        for owner, name, function in reversed(self._patched):
+            setattr(owner, name, function)
+        self._patched = []
+        return False
+
+    @property
+    def total(self):
+        return sum(self.calls.values())
+
+
+class RunReport(object):
+    """Stage timings, pcbnew call counts and notes of one plugin run"""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.seconds = None
+        self.stages = OrderedDict()     # stage path -> [count, seconds, pcbnew calls]
+        self.calls = None               # Counter of pcbnew calls when counted
+        self.notes = []
+        self.error = None
+        self._path = []
+
+    def _count(self):
+        return sum(self.calls.values()) if self.calls is not None else 0
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage, nested stages are reported under their parent"""
+        self._path.append(name)
+        path = tuple(self._path)
+        # entered here, so parents are listed before their nested stages
+        entry = self.stages.setdefault(path, [0, 0.0, 0])
+        calls = self._count()
+        started = _clock()
+        try:
+            yield self
+        finally:
+            seconds = _clock() - started
+            self._path.pop()
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += self._count() - calls
+            log.debug('%s: %s %.3f s', self.name, ' / '.join(path), seconds)
+
+    def note(self, message, *args):
+        """Log a result at info level and keep it in the report"""
+        self.notes.append(message % args if args else message)
+        log.info(message, *args)
+
+    def stage_seconds(self, name):
+        """Total seconds of the top level stage `name`"""
+        return sum(entry[1] for path, entry in self.stages.items() if path == (name,))
+
+    def summary(self):
+        """One line: total time and the top level stages"""
+        parts = ['{} {:.3f} s'.format(path[0], entry[1]) for path, entry in self.stages.items()
+                 if len(path) == 1]
+        if self.calls is not None:
+            parts.append('{} pcbnew calls'.format(self._count()))
+        return '{}: {:.2f} s ({})'.format(self.name, self.seconds or 0.0, ', '.join(parts))
+
+    def format(self, top=TOP_CALLS):
+        """Multi-line text of the whole report"""
+        lines = ['{}, {}'.format(self.name, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started))),
+                 'total {:.3f} s, including dialogs'.format(self.seconds or 0.0)]
+        if self.error:
+            lines.append('failed: ' + self.error)
+        lines.append('')
+        lines.append(u'{:<36} {:>5} {:>9} {:>9}'.format('stage', 'runs', 'seconds', 'calls'))
+        for path, (count, seconds, calls) in self.stages.items():
+            lines.append(u'{:<36} {:>5} {:>9.3f} {:>9}'.format(
+                '  ' * (len(path) - 1) + path[-1], count, seconds,
+                calls if self.calls is not None else '-'))
+        lines.append('')
+        if self.calls is None:
+            lines.append('pcbnew calls not counted')
+        else:
+            lines.append('{} pcbnew calls, most frequent:'.format(self._count()))
+            for key, count in self.calls.most_common(top):
+                lines.append(u'  {:<40} {:>9}'.format(key, count))
+        if self.notes:
+            lines.append('')
+            lines.extend(self.notes)
+        return u'\n'.join(lines)
+
+
+class _Active(threading.local):
+    def __init__(self):
+        self.reports = []
+
+
+LAST_RUNS = OrderedDict()       # plugin name -> RunReport of its last run
+_active = _Active()
+
+
+def current():
+    """Report of the run in progress on this thread, or None"""
+    return _active.reports[-1] if _active.reports else None
+
+
+@contextmanager
+def run(name, module=None, count_calls=None):
+    """Instrument one plugin run, pcbnew calls are counted on `module` when enabled"""
+    setup_logging()
+    report = RunReport(name)
+    if count_calls is None:
+        count_calls = COUNT_CALLS
+    counter = CallCounter(module) if count_calls and module is not None else None
+    if counter is not None:
+        report.calls = counter.calls
+        counter.__enter__()
+    _active.reports.append(report)
+    started = _clock()
+    try:
+        yield report
+    except Exception as error:
+        report.error = '{}: {}'.format(type(error).__name__, error)
+        raise
+    finally:
+        report.seconds = _clock() - started
+        _active.reports.pop()
+        if counter is not None:
+            counter.__exit__()
+        LAST_RUNS.pop(name, None)
+        LAST_RUNS[name] = report
+        log.info(report.summary())
+
+
+@contextmanager
+def stage(name):
+    """Time a stage of the current run, a no-op outside of run()"""
+    report = current()
+    if report is None:
+        yield None
+    else:
+        with report.stage(name):
+            yield report
+
+
+def note(message, *args):
+    """Log at info level, and keep the line in the current run report"""
+    report = current()
+    if report is None:
+        log.info(message, *args)
+    else:
+        report.note(message, *args)
+
+
+def format_report(reports=None):
+    """Text of the given reports, by default the last run of every plugin"""
+    if reports is None:
+        reports = list(LAST_RUNS.values())
+    if not reports:
+        return 'No plugin has run yet.'
+    return (u'\n\n' + u'-' * 60 + u'\n\n').join(report.format() for report in reversed(reports))
@@ -0,0 +1,201 @@
+# Copyright (c) 2018 Tommi Rintala, New Cable Corporation Ltd
+
+"""DC voltage drop of power nets over tracks, vias and copper zones.
+
+A net is fed at one or more source pads held at the supply voltage and
+loaded by currents drawn at sink pads.  Its BoardNetwork part (tracks,
+via barrels and the zone mesh) is reduced to the nodes of the copper
+pieces a source reaches, the Laplacian without the source nodes is LU
+factorized once and every load case is one more right hand side of the
+same factorization.
+
+Results are the node voltages, the worst drop of every load case and
+the current and current density of every edge: tracks, via barrels and
+the squares of the zone mesh.
+"""
+
+from __future__ import division
+
+import numpy as np
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import splu
+
+try:
+    from .tracetable import CU_THICK, RHO_CU
+    from .netgraph import BoardNetwork, conductance_matrix
+    from .zonemesh import ZONE_PITCH, mesh_zones, zone_polygons
+    from .boardindex import board_index
+except (ImportError, ValueError):
+    from tracetable import CU_THICK, RHO_CU
+    from netgraph import BoardNetwork, conductance_matrix
+    from zonemesh import ZONE_PITCH, mesh_zones, zone_polygons
+    from boardindex import board_index
+
+
+class IRDrop(object):
+    """Solution of a power net for a number of load cases.
+
+    `voltage` is nodes x cases (V), `nodes` the BoardNetwork nodes a
+    source reaches, sorted.  `current` (A, from edge_a to edge_b) and
+    `density` (A/m^2, unsigned) are edges x cases, `edges` the
+    BoardNetwork edge of every row.
+    """
+
+    def __init__(self, network, net, supply, nodes, voltage, edges, current):
+        self.network = network
+        self.net = net
+        self.supply = supply
+        self.nodes = nodes
+        self.voltage = voltage
+        self.edges = edges
+        self.current = current
+        self.density = np.abs(current) / network.area[edges][:, np.newaxis]
+
+    def __len__(self):
+        return self.voltage.shape[1]
+
+    @property
+    def drop(self):
+        """Supply voltage minus the node voltages, nodes x cases"""
+        return self.supply - self.voltage
+
+    def worst_drop(self):
+        """(drop, node) of the lowest voltage of every load case"""
+        drop = self.drop
+        worst = np.argmax(drop, axis=0)
+        return drop[worst, np.arange(len(self))], self.nodes[worst]
+
+    def pad_voltage(self, pad):
+        """Voltage of a pad by index or "REF-PAD" name, one per load case"""
+        node = self.network.pad_node[self.network.pad_index(pad)]
+        row = np.searchsorted(self.nodes, node)
+        if node < 0 or row >= len(self.nodes) or self.nodes[row] != node:
+            return np.full(len(self), np.nan)
+        return self.voltage[row]
+
+    def summary(self):
+        """One dict per load case: worst drop, where it is and the highest current density"""
+        drop, node = self.worst_drop()
+        densest = np.argmax(self.density, axis=0) if len(self.edges) else np.zeros(len(self), dtype=np.int64)
+        rows = []
+        for case in range(len(self)):
+            edge = self.edges[densest[case]] if len(self.edges) else -1
+            rows.append(dict(case=case, net=self.net, worst_drop=float(drop[case]), node=int(node[case]),
+                             x=int(self.network.node_x[node[case]]), y=int(self.network.node_y[node[case]]),
+                             layer=int(self.network.node_layer[node[case]]),
+                             max_density=float(self.density[densest[case], case]) if edge >= 0 else 0.0,
+                             edge=int(edge)))
+        return rows
+
+
+class PowerNet(object):
+    """A net of a BoardNetwork fed at source pads, factorized once.
+
+    `sources` are pads by index or "REF-PAD" name, all on one net and
+    held at `supply` volts.  Copper pieces of the net without a source
+    are left floating and out of the solution.
+    """
+
+    def __init__(self, network, sources, supply=0.0):
+        self.network = network
+        self.supply = supply
+        sources = [network.pad_index(pad) for pad in sources]
+        if not sources:
+            raise ValueError("A power net needs at least one source pad")
+        self.net = self._common_net(sources)
+        for pad in sources:
+            if network.pad_node[pad] < 0:
+                raise ValueError("Source pad {} has no copper".format(network.pads.names[pad]))
+
+        nodes, edges = network.net_edges(self.net)
+        local_a = np.searchsorted(nodes, network.edge_a[edges])
+        local_b = np.searchsorted(nodes, network.edge_b[edges])
+        weights, laplacian = conductance_matrix(len(nodes), local_a, local_b, network.conductance[edges])
+        _, piece = connected_components(weights, directed=False)
+        fixed = np.unique(np.searchsorted(nodes, network.pad_node[sources]))
+        fed = np.isin(piece, piece[fixed])
+        fed[fixed] = False
+        free = np.flatnonzero(fed)
+
+        # keep the fed copper only, the sources first
+        keep = np.concatenate((fixed, free))
+        self.nodes = nodes[keep]
+        self._order = np.argsort(self.nodes)
+        self.fixed = len(fixed)
+        position = np.full(len(nodes), -1, dtype=np.int64)
+        position[keep] = np.arange(len(keep))
+        inside = (position[local_a] >= 0) & (position[local_b] >= 0)
+        self.edges = edges[inside]
+        self.local_a = position[local_a[inside]]
+        self.local_b = position[local_b[inside]]
+        if len(free):
+            # the minimum degree ordering of A + A^T suits the symmetric Laplacian of a mesh
+            self.lu = splu(laplacian[free][:, free].tocsc(), permc_spec='MMD_AT_PLUS_A')
+        else:
+            self.lu = None
+
+    def _common_net(self, pads):
+        nets = self.network.pads.net[pads]
+        if np.any(nets != nets[0]):
+            raise ValueError("Pads {} are on different nets".format(
+                ", ".join(self.network.pads.names[pad] for pad in pads)))
+        return int(nets[0])
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def solve(self, loads):
+        """IRDrop of load cases, each a {pad: amperes} dict of the sink currents.
+
+        A single dict is one load case.  Pads are given by index or
+        "REF-PAD" name, a sink must be on the net and reached by a source.
+        """
+        if isinstance(loads, dict):
+            loads = [loads]
+        network = self.network
+        inject = np.zeros((len(self.nodes), len(loads)))
+        for case, sinks in enumerate(loads):
+            for pad, amperes in sinks.items():
+                pad = network.pad_index(pad)
+                if int(network.pads.net[pad]) != self.net:
+                    raise ValueError("Sink pad {} is not on net {}".format(network.pads.names[pad], self.net))
+                row = self._row(network.pad_node[pad])
+                if row < 0:
+                    raise ValueError("Sink pad {} is not connected to a source".format(network.pads.names[pad]))
+                inject[row, case] -= amperes
+
+        voltage = np.full(inject.shape, float(self.supply))
+        if self.lu is not None:
+            voltage[self.fixed:] += self.lu.solve(inject[self.fixed:])
+        current = (network.conductance[self.edges][:, np.newaxis]
+                   * (voltage[self.local_a] - voltage[self.local_b]))
+        return IRDrop(network, self.net, self.supply, self.nodes[self._order], voltage[self._order],
+                      self.edges, current)
+
+    def _row(self, node):
+        """Row of a BoardNetwork node in the solver, -1 when no source reaches it"""
+        row = np.searchsorted(self.nodes, node, sorter=self._order)
+        if node < 0 or row >= len(self.nodes) or self.nodes[self._order[row]] != node:
+            return -1
+        return int(self._order[row])
+
+
+def ir_drop(board, sources, loads, supply=0.0, pitch=ZONE_PITCH, cu_thick=CU_THICK, rho_cu=RHO_CU):
+    """IRDrop of a power net of a pcbnew board, see PowerNet.solve() for `loads`.
+
+    The network is built from the shared board index with the tracks and
+    vias of the net only, the edge_item of a track is a row of
+    board_index(board).tracks_for_net(net).  The filled zones of the net
+    are meshed `pitch` nm fine.
+    """
+    sources = list(sources)
+    if not sources:
+        raise ValueError("A power net needs at least one source pad")
+    index = board_index(board, fresh=True)
+    pads = index.pads
+    first = sources[0]
+    net = int(pads.net[int(first) if isinstance(first, (int, np.integer)) else pads.find(first)])
+    tracks = index.tracks.select(index.tracks_for_net(net))
+    zones = mesh_zones(zone_polygons(index.zones(), nets=(net,)), pitch)
+    network = BoardNetwork(tracks, pads, cu_thick=cu_thick, rho_cu=rho_cu, zones=zones)
+    return PowerNet(network, sources, supply).solve(loads)
@@ -0,0 +1,223 @@
+# Copyright (c) 2018 Tommi Rintala, New Cable Corporation Ltd
+
+"""Streaming .kicad_pcb reader, no pcbnew needed.
+
+The board file is memory mapped and tokenized incrementally.  Only the
+top level records we are interested in (segments, vias, graphic lines,
+footprints for their pads, net declarations and the layer table) are
+turned into small lists, the rest of the file (zones, texts, ...) is
+skipped token by token without building a tree.  The result goes into
+the same TrackTable and PadTable columns that extract_tracks() and
+extract_pads() produce from pcbnew.
+"""
+
+from __future__ import division
+
+import mmap
+import re
+from math import cos, sin, radians
+
+try:
+    from .tracetable import TrackTable, PadTable, pad_layers, uid_from_text
+except (ImportError, ValueError):
+    from tracetable import TrackTable, PadTable, pad_layers, uid_from_text
+
+_TOKEN = re.compile(br'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+
+# layer numbers used by the KiCad 5 file format, for files without a layer table
+LAYER_IDS = {
+    'F.Cu': 0, 'B.Cu': 31,
+    'B.Adhes': 32, 'F.Adhes': 33, 'B.Paste': 34, 'F.Paste': 35,
+    'B.SilkS': 36, 'F.SilkS': 37, 'B.Mask': 38, 'F.Mask': 39,
+    'Dwgs.User': 40, 'Cmts.User': 41, 'Eco1.User': 42, 'Eco2.User': 43,
+    'Edge.Cuts': 44, 'Margin': 45, 'B.CrtYd': 46, 'F.CrtYd': 47,
+    'B.Fab': 48, 'F.Fab': 49,
+}
+LAYER_IDS.update(('In{}.Cu'.format(ind), ind) for ind in range(1, 31))
+
+# file pad shape names to pcbnew PAD_SHAPE_T, anything else is handled as a rectangle
+PAD_SHAPES = {b'circle': 0, b'rect': 1, b'oval': 2, b'trapezoid': 3, b'roundrect': 4}
+
+RECORDS = (b'layers', b'net', b'segment', b'via', b'gr_line', b'module', b'footprint')
+
+
+def iter_records(buf, heads=RECORDS):
+    """Yield the top level records whose head is in `heads` as nested lists.
+
+    Atoms are returned as bytes, quoted strings without their quotes.
+    """
+    heads = frozenset(heads)
+    depth = 0
+    want_head = False
+    stack = None
+    for match in _TOKEN.finditer(buf):
+        group = match.lastindex
+        if group == 1:
+            depth += 1
+            if stack is not None:
+                child = []
+                stack[-1].append(child)
+                stack.append(child)
+            elif depth == 2:
+                want_head = True
+        elif group == 2:
+            depth -= 1
+            if stack is not None:
+                record = stack.pop()
+                if not stack:
+                    stack = None
+                    yield record
+        else:
+            token = match.group(group)
+            if want_head:
+                want_head = False
+                if token in heads:
+                    stack = [[token]]
+            elif stack is not None:
+                stack[-1].append(token)
+
+
+def _fields(record):
+    """Map the sub-lists of a record by their head"""
+    return dict((item[0], item[1:]) for item in record[1:] if isinstance(item, list) and item)
+
+
+def _nm(value):
+    return int(round(float(value) * 1e6))
+
+
+def _text(value):
+    return value.decode('utf-8')
+
+
+def _uid(fields):
+    stamp = fields.get(b'uuid') or fields.get(b'tstamp')
+    if not stamp:
+        return 0
+    return uid_from_text(_text(stamp[0]))
+
+
+def _reference(record):
+    """Reference designator of a footprint record"""
+    for item in record[1:]:
+        if not isinstance(item, list) or len(item) < 3:
+            continue
+        if item[0] == b'fp_text' and item[1] == b'reference':
+            return _text(item[2])
+        if item[0] == b'property' and item[1] == b'Reference':
+            return _text(item[2])
+    return u''
+
+
+def _footprint_pads(record):
+    """Pad rows and names of a footprint record, positions on the board"""
+    fields = _fields(record)
+    at = fields.get(b'at', [0, 0])
+    rotation = radians(float(at[2])) if len(at) > 2 else 0.0
+    reference = _reference(record)
+    rows = []
+    names = []
+    for item in record[1:]:
+        if not isinstance(item, list) or len(item) < 4 or item[0] != b'pad':
+            continue
+        pad = _fields(item)
+        pos = pad.get(b'at', [0, 0])
+        dx = float(pos[0])
+        dy = float(pos[1])
+        # pcbnew RotatePoint() convention, y axis pointing down
+        x = float(at[0]) + dy * sin(rotation) + dx * cos(rotation)
+        y = float(at[1]) + dy * cos(rotation) - dx * sin(rotation)
+        size = pad.get(b'size', [0, 0])
+        drill = [value for value in pad.get(b'drill', [0]) if not isinstance(value, list) and value != b'oval']
+        copper = set(pad.get(b'layers', []))
+        both = bool(copper & set([b'*.Cu', b'F&B.Cu']))
+        layer, layer2 = pad_layers(both or b'F.Cu' in copper, both or b'B.Cu' in copper)
+        rows.append((_nm(x), _nm(y), _nm(size[0]), _nm(size[1]),
+                     float(pos[2]) if len(pos) > 2 else 0.0, PAD_SHAPES.get(item[3], 1),
+                     _nm(drill[0]) if drill else 0, layer, layer2,
+                     int(pad.get(b'net', [0])[0])))
+        names.append(u'{}-{}'.format(reference, _text(item[1])))
+    return rows, names
+
+
+class BoardData(object):
+    """Board contents read from a file.
+
+    `tracks` holds segments and vias, `lines` the graphic lines (net 0,
+    no vias), both as TrackTables.  `pads` is a PadTable.
+    """
+
+    def __init__(self, tracks, lines, netnames, layers, pads=None):
+        self.tracks = tracks
+        self.lines = lines
+        self.netnames = netnames
+        self.layers = layers
+        self.pads = pads
+
+
+def read_records(records):
+    """Convert a record stream from iter_records() to BoardData"""
+    layers = dict(LAYER_IDS)
+    netnames = {0: u'default'}
+    tracks = []
+    lines = []
+    pads = []
+    padnames = []
+
+    def layer_id(name):
+        return layers.get(_text(name), -1)
+
+    for record in records:
+        head = record[0]
+        if head == b'segment':
+            fields = _fields(record)
+            start = fields[b'start']
+            end = fields[b'end']
+            layer = layer_id(fields[b'layer'][0])
+            tracks.append((_nm(start[0]), _nm(start[1]), _nm(end[0]), _nm(end[1]),
+                           _nm(fields[b'width'][0]), layer, layer,
+                           int(fields.get(b'net', [0])[0]), 0, 0, _uid(fields)))
+        elif head == b'via':
+            fields = _fields(record)
+            pos = fields[b'at']
+            via_layers = fields.get(b'layers', [b'F.Cu', b'B.Cu'])
+            tracks.append((_nm(pos[0]), _nm(pos[1]), _nm(pos[0]), _nm(pos[1]),
+                           _nm(fields[b'size'][0]), layer_id(via_layers[0]),
+                           layer_id(via_layers[-1]), int(fields.get(b'net', [0])[0]),
+                           _nm(fields.get(b'drill', [0])[0]), 1, _uid(fields)))
+        elif head == b'gr_line':
+            fields = _fields(record)
+            start = fields[b'start']
+            end = fields[b'end']
+            if b'width' in fields:
+                width = fields[b'width'][0]
+            else:
+                width = _fields([b'stroke'] + fields.get(b'stroke', [])).get(b'width', [0])[0]
+            layer = layer_id(fields[b'layer'][0])
+            lines.append((_nm(start[0]), _nm(start[1]), _nm(end[0]), _nm(end[1]),
+                          _nm(width), layer, layer, 0, 0, 0, _uid(fields)))
+        elif head in (b'module', b'footprint'):
+            rows, names = _footprint_pads(record)
+            pads.extend(rows)
+            padnames.extend(names)
+        elif head == b'net':
+            if len(record) > 2:
+                netnames[int(record[1])] = _text(record[2]) or netnames.get(int(record[1]), u'')
+        elif head == b'layers':
+            for item in record[1:]:
+                if isinstance(item, list) and len(item) > 1:
+                    layers[_text(item[1])] = int(item[0])
+
+    return BoardData(TrackTable.from_rows(tracks, netnames),
+                     TrackTable.from_rows(lines), netnames, layers,
+                     PadTable.from_rows(pads, padnames))
+
+
+def read_board(path):
+    """Read tracks, vias, pads, graphic lines and nets of a .kicad_pcb file"""
+    with open(path, 'rb') as stream:
+        buf = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return read_records(iter_records(buf))
+        finally:
+            buf.close()
@@ -0,0 +1,309 @@
+# Copyright (c) 2018 Tommi Rintala, New Cable Corporation Ltd
+
+"""Connectivity-aware net resistance.
+
+Every net is turned into a resistor network: track endpoints, vias and
+pads are the nodes, tracks and plated via/pad barrels the conductances.
+Track ends that touch each other, a via or a pad are merged into one
+node.  The effective resistance between two pads is solved from the
+conductance Laplacian of the net, which is factorized once per net and
+kept for further queries.
+
+Filled zones come in as a ZoneMesh, a grid of cells joined by squares of
+copper sheet.  Track ends, vias and pads on a cell of their net and layer
+are merged into it, a via through an inner plane gets a node on that
+layer.
+
+Tracks are only connected at their end points, a track ending in the
+middle of another one (which pcbnew normally splits) is not joined.
+"""
+
+from __future__ import division
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import splu
+
+try:
+    from .tracetable import CU_THICK, NM, PAD_CIRCLE, RHO_CU, segment_lengths
+    from .spatial import SpatialGrid
+    from .zonemesh import mesh_zones
+except (ImportError, ValueError):
+    from tracetable import CU_THICK, NM, PAD_CIRCLE, RHO_CU, segment_lengths
+    from spatial import SpatialGrid
+    from zonemesh import mesh_zones
+
+BOARD_THICK = 1.6e-3     # board thickness, length of a through barrel
+PLATING_THICK = 25e-6    # copper plating of via and pad barrels
+COPPER_SPAN = 31         # layer hops from F.Cu to B.Cu
+
+# what an edge of a BoardNetwork is made of
+EDGE_TRACK = 0
+EDGE_BARREL = 1
+EDGE_ZONE = 2
+
+
+def barrel_resistance(drill, plating=PLATING_THICK, length=BOARD_THICK, rho_cu=RHO_CU):
+    """Resistance of a plated hole, drill in metres"""
+    area = np.pi * plating * (drill + plating)
+    return rho_cu * length / area
+
+
+def conductance_matrix(size, node_a, node_b, conductance):
+    """Symmetric weights (CSR) and Laplacian (CSC) of a conductance network"""
+    weights = coo_matrix((conductance, (node_a, node_b)), shape=(size, size)).tocsr()
+    weights = weights + weights.T
+    degree = np.asarray(weights.sum(axis=1)).ravel()
+    laplacian = (coo_matrix((degree, (np.arange(size), np.arange(size))), shape=(size, size))
+                 - weights).tocsc()
+    return weights, laplacian
+
+
+class NetNetwork(object):
+    """Conductance network of one net and its factorized Laplacian.
+
+    One node of every connected piece of the net is grounded, the rest
+    of the Laplacian is LU factorized on construction.
+    """
+
+    def __init__(self, net, nodes, edge_a, edge_b, conductance):
+        self.net = net
+        self.nodes = nodes
+        size = len(nodes)
+        weights, laplacian = conductance_matrix(size, np.searchsorted(nodes, edge_a),
+                                                np.searchsorted(nodes, edge_b), conductance)
+        self.pieces, self.piece = connected_components(weights, directed=False)
+
+        ground = np.zeros(size, dtype=bool)
+        ground[np.unique(self.piece, return_index=True)[1]] = True
+        self.free = np.flatnonzero(~ground)
+        if len(self.free):
+            self.lu = splu(laplacian[self.free][:, self.free].tocsc())
+        else:
+            self.lu = None
+
+    def local(self, node):
+        return int(np.searchsorted(self.nodes, node))
+
+    def resistances(self, node_a, node_b):
+        """Effective resistance between node pairs, inf when not connected"""
+        node_a = np.atleast_1d(np.searchsorted(self.nodes, node_a))
+        node_b = np.atleast_1d(np.searchsorted(self.nodes, node_b))
+        result = np.full(len(node_a), np.inf)
+        connected = self.piece[node_a] == self.piece[node_b]
+        result[connected & (node_a == node_b)] = 0.0
+
+        solve = np.flatnonzero(connected & (node_a != node_b))
+        if len(solve):
+            rhs = np.zeros((len(self.nodes), len(solve)))
+            rhs[node_a[solve], np.arange(len(solve))] += 1.0
+            rhs[node_b[solve], np.arange(len(solve))] -= 1.0
+            potential = np.zeros_like(rhs)
+            potential[self.free] = self.lu.solve(rhs[self.free])
+            result[solve] = (potential[node_a[solve], np.arange(len(solve))]
+                             - potential[node_b[solve], np.arange(len(solve))])
+        return result
+
+    def resistance(self, node_a, node_b):
+        return float(self.resistances([node_a], [node_b])[0])
+
+
+class BoardNetwork(object):
+    """Resistor networks of all nets of a board.
+
+    `tracks` is a TrackTable (tracks and vias), `pads` a PadTable and
+    `zones` a ZoneMesh of the filled zones, if any.  The node graph is
+    built for the whole board at once, the per-net factorizations are
+    made on first use and cached.
+
+    Every edge has its conductance, the copper cross section the current
+    flows through (`area`, m^2) and what it is made of: `edge_kind`
+    EDGE_TRACK with the TrackTable row in `edge_item`, EDGE_BARREL with
+    the row of the via, EDGE_ZONE with its first cell.  Nodes are placed
+    at (`node_x`, `node_y`) on `node_layer`.
+    """
+
+    def __init__(self, tracks, pads, cu_thick=CU_THICK, rho_cu=RHO_CU,
+                 board_thick=BOARD_THICK, plating=PLATING_THICK, zones=None):
+        self.pads = pads
+        self.zones = zones = mesh_zones(()) if zones is None else zones
+        self._networks = {}
+        segments = tracks.tracks
+        vias = tracks.vias
+        via_rows = np.flatnonzero(tracks.via)
+
+        # track end points, coincident ends of a net on a layer are one node
+        count = len(segments)
+        ends = np.empty((2 * count, 4), dtype=np.int64)
+        ends[:, 0] = np.concatenate((segments.x0, segments.x1))
+        ends[:, 1] = np.concatenate((segments.y0, segments.y1))
+        ends[:, 2] = np.tile(segments.layer, 2)
+        ends[:, 3] = np.tile(segments.net, 2)
+        end_keys, end_node = np.unique(ends, axis=0, return_inverse=True)
+        end_node = end_node.ravel()
+        ends_count = len(end_keys)
+
+        # anchors: vias first, then pads
+        ax = np.concatenate((vias.x0, pads.x)).astype(np.float64)
+        ay = np.concatenate((vias.y0, pads.y)).astype(np.float64)
+        anet = np.concatenate((vias.net, pads.net))
+        top = np.concatenate((np.minimum(vias.layer, vias.layer2), pads.layer))
+        bottom = np.concatenate((np.maximum(vias.layer, vias.layer2), pads.layer2))
+        drill = np.concatenate((vias.drill, pads.drill)) * NM
+        half_x = np.concatenate((vias.width / 2.0, pads.sx / 2.0))
+        half_y = np.concatenate((vias.width / 2.0, pads.sy / 2.0))
+        round_shape = np.concatenate((np.ones(len(vias), dtype=bool), pads.shape == PAD_CIRCLE))
+        angle = np.radians(np.concatenate((np.zeros(len(vias)), pads.orient)))
+        self.pad_anchor = len(vias) + np.arange(len(pads))
+
+        # attach end points lying on a via or pad of the same net and layer
+        reach = np.hypot(half_x, half_y)
+        grid = SpatialGrid(ax, ay, ax, ay, reach)
+        point, anchor = grid.query_points(end_keys[:, 0], end_keys[:, 1])
+        dx = end_keys[point, 0] - ax[anchor]
+        dy = end_keys[point, 1] - ay[anchor]
+        # into the pad frame, pcbnew RotatePoint() by -orientation
+        cos_a = np.cos(angle[anchor])
+        sin_a = np.sin(angle[anchor])
+        local_x = dx * cos_a - dy * sin_a
+        local_y = dy * cos_a + dx * sin_a
+        inside = np.where(round_shape[anchor],
+                          np.hypot(dx, dy) <= half_x[anchor],
+                          (np.abs(local_x) <= half_x[anchor]) & (np.abs(local_y) <= half_y[anchor]))
+        layer = end_keys[point, 2]
+        attached = (inside & (end_keys[point, 3] == anet[anchor])
+                    & (layer >= top[anchor]) & (layer <= bottom[anchor]))
+        point = point[attached]
+        anchor = anchor[attached]
+
+        # vias and pads standing on a zone of their net, on every layer they span
+        zone_anchor = [np.zeros(0, dtype=np.int64)]
+        zone_layer = [np.zeros(0, dtype=np.int64)]
+        zone_cell = [np.zeros(0, dtype=np.int64)]
+        for layer in zones.layers.tolist():
+            spans = np.flatnonzero((top >= 0) & (top <= layer) & (bottom >= layer))
+            cell = zones.find(ax[spans], ay[spans], layer, anet[spans])
+            hit = cell >= 0
+            zone_anchor.append(spans[hit])
+            zone_layer.append(np.full(int(hit.sum()), layer, dtype=np.int64))
+            zone_cell.append(cell[hit])
+        zone_anchor = np.concatenate(zone_anchor)
+        zone_cell = np.concatenate(zone_cell)
+
+        # one node per anchor and layer: its outer layers, the attached and the zone ones
+        has_copper = top >= 0
+        anchor_layers = np.concatenate((
+            np.column_stack((anchor, end_keys[point, 2])),
+            np.column_stack((zone_anchor, np.concatenate(zone_layer))),
+            np.column_stack((np.flatnonzero(has_copper), top[has_copper])),
+            np.column_stack((np.flatnonzero(has_copper), bottom[has_copper]))))
+        anchor_keys, anchor_node = np.unique(anchor_layers, axis=0, return_inverse=True)
+        anchor_node = anchor_node.ravel() + ends_count
+        attach_node = anchor_node[:len(point)]
+        zone_node = anchor_node[len(point):len(point) + len(zone_anchor)]
+        cell_base = ends_count + len(anchor_keys)
+        total = cell_base + len(zones)
+
+        # barrels between the layers of an anchor, in layer order
+        same = anchor_keys[1:, 0] == anchor_keys[:-1, 0]
+        first = np.flatnonzero(same)
+        owner = anchor_keys[first, 0]
+        hops = (anchor_keys[first + 1, 1] - anchor_keys[first, 1]) / float(COPPER_SPAN)
+        # a soldered lead joins the layers of a through hole pad
+        plated = (drill[owner] > 0) & (owner < len(vias))
+        with np.errstate(divide='ignore'):
+            barrel = 1.0 / (barrel_resistance(drill[owner], plating, board_thick, rho_cu) * hops)
+
+        # track ends on a zone cell of their net and layer
+        end_cell = zones.find(end_keys[:, 0], end_keys[:, 1], end_keys[:, 2], end_keys[:, 3])
+        on_zone = np.flatnonzero(end_cell >= 0)
+
+        # zero resistance joins: attachments, pad or unplated anchor layers and zone cells
+        merge_a = np.concatenate((point, first[~plated] + ends_count, zone_node, on_zone))
+        merge_b = np.concatenate((attach_node, first[~plated] + 1 + ends_count,
+                                  zone_cell + cell_base, end_cell[on_zone] + cell_base))
+        merge = coo_matrix((np.ones(len(merge_a)), (merge_a, merge_b)), shape=(total, total))
+        _, label = connected_components(merge, directed=False)
+
+        length = segment_lengths(segments)
+        width = segments.width * NM
+        with np.errstate(divide='ignore'):
+            track_g = cu_thick * width / (rho_cu * length)
+        barrels = owner[plated]
+        sheets = len(zones.edge_a)
+        edge_a = np.concatenate((label[end_node[:count]], label[first[plated] + ends_count],
+                                 label[zones.edge_a + cell_base]))
+        edge_b = np.concatenate((label[end_node[count:]], label[first[plated] + 1 + ends_count],
+                                 label[zones.edge_b + cell_base]))
+        conductance = np.concatenate((track_g, barrel[plated], np.full(sheets, cu_thick / rho_cu)))
+        area = np.concatenate((width * cu_thick, np.pi * plating * (drill[barrels] + plating),
+                               np.full(sheets, zones.pitch * NM * cu_thick)))
+        kind = np.repeat((EDGE_TRACK, EDGE_BARREL, EDGE_ZONE), (count, len(barrels), sheets))
+        item = np.concatenate((np.flatnonzero(~tracks.via), via_rows[barrels], zones.edge_a))
+        # zero length tracks are joins as well, drop them together with self loops
+        keep = np.isfinite(conductance) & (edge_a != edge_b)
+        self.edge_a = edge_a[keep]
+        self.edge_b = edge_b[keep]
+        self.conductance = conductance[keep]
+        self.area = area[keep]
+        self.edge_kind = kind[keep]
+        self.edge_item = item[keep]
+
+        nodes = label.max() + 1 if total else 0
+        self.node_net = np.zeros(nodes, dtype=np.int32)
+        self.node_net[label[:ends_count]] = end_keys[:, 3]
+        self.node_net[label[ends_count:cell_base]] = anet[anchor_keys[:, 0]]
+        self.node_net[label[cell_base:]] = zones.net
+        self.node_x = np.zeros(nodes, dtype=np.int64)
+        self.node_y = np.zeros(nodes, dtype=np.int64)
+        self.node_layer = np.zeros(nodes, dtype=np.int32)
+        for part, x, y, layer in ((label[:ends_count], end_keys[:, 0], end_keys[:, 1], end_keys[:, 2]),
+                                  (label[ends_count:cell_base], ax[anchor_keys[:, 0]], ay[anchor_keys[:, 0]],
+                                   anchor_keys[:, 1]),
+                                  (label[cell_base:], zones.x, zones.y, zones.layer)):
+            self.node_x[part] = x
+            self.node_y[part] = y
+            self.node_layer[part] = layer
+
+        # pad query node: the anchor node on the pad's first copper layer
+        pad_node = np.full(len(pads), -1, dtype=np.int64)
+        pad_rows = anchor_keys[:, 0] >= len(vias)
+        first_layer = np.unique(anchor_keys[pad_rows, 0], return_index=True)
+        pad_node[first_layer[0] - len(vias)] = label[np.flatnonzero(pad_rows)[first_layer[1]] + ends_count]
+        self.pad_node = pad_node
+
+    def net_edges(self, net):
+        """Nodes of a net code and the indexes of its edges"""
+        nodes = np.flatnonzero(self.node_net == net)
+        edges = np.flatnonzero(self.node_net[self.edge_a] == net)
+        return nodes, edges
+
+    def network(self, net):
+        """NetNetwork of a net code, factorized on first use"""
+        if net not in self._networks:
+            nodes, edges = self.net_edges(net)
+            self._networks[net] = NetNetwork(net, nodes, self.edge_a[edges], self.edge_b[edges],
+                                             self.conductance[edges])
+        return self._networks[net]
+
+    def pad_index(self, pad):
+        """Row of a pad given by index or "REF-PAD" name"""
+        if isinstance(pad, (int, np.integer)):
+            return int(pad)
+        return self.pads.find(pad)
+
+    def effective_resistance(self, pad_a, pad_b):
+        """Resistance between two pads of a net, by index or "REF-PAD" name.
+
+        Returns inf when the pads are not connected through copper.
+        """
+        pad_a = self.pad_index(pad_a)
+        pad_b = self.pad_index(pad_b)
+        net = int(self.pads.net[pad_a])
+        if net != int(self.pads.net[pad_b]):
+            raise ValueError("Pads {} and {} are on different nets".format(
+                self.pads.names[pad_a], self.pads.names[pad_b]))
+        if self.pad_node[pad_a] < 0 or self.pad_node[pad_b] < 0:
+            return np.inf
+        return self.network(net).resistance(self.pad_node[pad_a], self.pad_node[pad_b])
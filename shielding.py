@@ -2,117 +2,251 @@
 
 import re
 import datetime
+import time
 import traceback
-import wx
-import wx.aui
 import base64
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from math import cos, sin, sqrt, pow, pi, tan
-from wx.lib.embeddedimage import PyEmbeddedImage
 
 import pcbnew
 
+try:
+    from .hashgeom import (DEFAULT_OFFSET_LEFT_MM, DEFAULT_OFFSET_RIGHT_MM, DEFAULT_OFFSET_TOP_MM,
+                           DEFAULT_OFFSET_BOTTOM_MM, DEFAULT_LINE_WIDTH_MM, DEFAULT_LINE_ANGLE,
+                           DEFAULT_CLEARANCE_MM, arc_extents, arc_points, circle_points,
+                           chain_outline, inset_outline, loop_edges, Obstacles,
+                           diff_segments, hash_openings, signed_area, fit_view, to_pixels,
+                           PATTERN_HASH, PATTERNS, shield_lines, square_angle)
+    from .boardindex import DRAWINGS, board_index, board_key, changed, item_count
+    from .hashcover import shield_coverage
+    from .hashtune import MIN_WIDTH_NM, format_table, tune
+    from .instrument import SCAN, COMPUTE, UI, COMMIT, log, note, run, stage
+except (ImportError, ValueError):
+    from hashgeom import (DEFAULT_OFFSET_LEFT_MM, DEFAULT_OFFSET_RIGHT_MM, DEFAULT_OFFSET_TOP_MM,
+                          DEFAULT_OFFSET_BOTTOM_MM, DEFAULT_LINE_WIDTH_MM, DEFAULT_LINE_ANGLE,
+                          DEFAULT_CLEARANCE_MM, arc_extents, arc_points, circle_points,
+                          chain_outline, inset_outline, loop_edges, Obstacles,
+                          diff_segments, hash_openings, signed_area, fit_view, to_pixels,
+                          PATTERN_HASH, PATTERNS, shield_lines, square_angle)
+    from boardindex import DRAWINGS, board_index, board_key, changed, item_count
+    from hashcover import shield_coverage
+    from hashtune import MIN_WIDTH_NM, format_table, tune
+    from instrument import SCAN, COMPUTE, UI, COMMIT, log, note, run, stage
 
 
-DEFAULT_OFFSET_LEFT_MM = 5
-DEFAULT_OFFSET_RIGHT_MM = 5
-DEFAULT_OFFSET_TOP_MM = 1
-DEFAULT_OFFSET_BOTTOM_MM = 1
 DEFAULT_LAYER_SOURCE = pcbnew.Edge_Cuts
 DEFAULT_LAYER_TARGET = pcbnew.F_Fab
-DEFAULT_LINE_WIDTH_MM = 0.3
-DEFAULT_LINE_ANGLE = 45
 
-def between(value, low_limit, high_limit):
-    return value >= low_limit and value <= high_limit
+# Generated shielding is tagged with this time stamp, regeneration removes
+# exactly the items carrying it.  Hand drawn segments keep their own stamps.
+SHIELD_TIMESTAMP = 0x5348D100
+
+# shielding output: line segments, filled polygons, or a hatched zone on copper layers
+OUTPUT_SEGMENTS = 0
+OUTPUT_POLYGONS = 1
+OUTPUT_ZONE = 2
+OUTPUT_MODES = ("Segments", "Polygons", "Hatched zone")
+SHIELD_ZONE_NAME = "wiretools-shield"
+
+# shield patterns in the order of hashgeom.PATTERNS
+PATTERN_NAMES = ("Hash", "Grid 0/90", "Cross, two angles", "Hexagonal")
+# layers computed in parallel by a multi-layer run
+LAYER_WORKERS = 4
+
+# dialog preview size in pixels and the pause before it is redrawn
+PREVIEW_SIZE = (360, 260)
+PREVIEW_DELAY_MS = 150
+
+# parameter search: default coverage target and rows offered from the ranked table
+DEFAULT_TARGET_COVERAGE = 85
+TUNE_ROWS = 12
 
 def debug_dialog(msg, exception=None):
+    import wx
+
     if exception:
         msg = '\n'.join((msg, str(exception), traceback.format_exc()))
         dlg = wx.MessageDialog(None, msg, '', wx.OK)
         dlg.ShowModal()
         dlg.Destroy()
 
+def poly_set(loops):
+    """SHAPE_POLY_SET with one outline per (n, 2) vertex array"""
+    polys = pcbnew.SHAPE_POLY_SET()
+    for loop in loops:
+        polys.NewOutline()
+        for pos_x, pos_y in np.round(loop).astype(np.int64).tolist():
+            polys.Append(pos_x, pos_y)
+    return polys
+
+class LayerOutline(object):
+    """Lines, arcs, circles, rectangles and polygons of one drawing layer.
+
+    Only numbers are kept, no pcbnew items, so the outline can be reused
+    after the items it was read from are gone.  The extents are exact,
+    arcs and circles are not limited to their polyline points.
+    """
+
+    def __init__(self, drawings=()):
+        self.edges = []
+        self.loops = []
+        self.extents = None
+        self._polygons = None
+        for draw in drawings:
+            self.add(draw)
+
+    def grow(self, minx, miny, maxx, maxy):
+        if self.extents is not None:
+            minx, miny = min(minx, self.extents[0]), min(miny, self.extents[1])
+            maxx, maxy = max(maxx, self.extents[2]), max(maxy, self.extents[3])
+        self.extents = (minx, miny, maxx, maxy)
+
+    def add(self, draw):
+        shape = draw.GetShape()
+        start = draw.GetStart()
+        end = draw.GetEnd()
+        if shape == pcbnew.S_SEGMENT:
+            self.edges.append((start.x, start.y, end.x, end.y))
+            self.grow(min(start.x, end.x), min(start.y, end.y), max(start.x, end.x), max(start.y, end.y))
+        elif shape == pcbnew.S_ARC:
+            center = draw.GetCenter()
+            arc_start = draw.GetArcStart()
+            points = arc_points(center.x, center.y, arc_start.x, arc_start.y, draw.GetAngle() / 10.0)
+            self.edges.extend(np.hstack((points[:-1], points[1:])))
+            self.grow(*arc_extents(center.x, center.y, arc_start.x, arc_start.y, draw.GetAngle() / 10.0))
+        elif shape == pcbnew.S_CIRCLE:
+            radius = draw.GetRadius()
+            self.loops.append(circle_points(start.x, start.y, radius))
+            self.grow(start.x - radius, start.y - radius, start.x + radius, start.y + radius)
+        elif shape == pcbnew.S_RECT:
+            self.add_loop(np.array(((start.x, start.y), (end.x, start.y),
+                                    (end.x, end.y), (start.x, end.y)), dtype=np.float64))
+        elif shape == pcbnew.S_POLYGON:
+            chain = draw.GetPolyShape().COutline(0)
+            self.add_loop(np.array([(chain.CPoint(ind).x, chain.CPoint(ind).y)
+                                    for ind in range(chain.PointCount())], dtype=np.float64))
+        else:
+            log.debug("Skipping outline element shape %s", shape)
+
+    def add_loop(self, loop):
+        self.loops.append(loop)
+        if len(loop):
+            self.grow(*np.concatenate((loop.min(axis=0), loop.max(axis=0))))
+
+    def polygons(self):
+        """Lines and arcs chained into closed polygons, followed by the closed shapes"""
+        if self._polygons is None:
+            chained, open_edges = chain_outline(self.edges)
+            if open_edges:
+                log.warning("Outline has %d edges that do not form a closed polygon", open_edges)
+            self._polygons = chained + self.loops
+        return self._polygons
+
+
+class DrawingScan(object):
+    """Outlines of the drawing layers read so far, valid while `key` matches the board"""
+
+    def __init__(self, key):
+        self.key = key
+        self.layers = {}
+
+
 class HashShieldGenerator(pcbnew.ActionPlugin):
     def defaults(self):
         self.name = "Generate Hash Shielding"
         self.category = "Modify PCB"
         self.description = "Generate hash shielding for PCB"
 
+        # registered at scripting start up, maybe before a board is open
         self._board = pcbnew.GetBoard()
-        bbox = pcbnew.GetBoard().GetBoundingBox()
 
         self.flag_delete_old = True
 
-        self.minx = bbox.GetRight()
-        self.maxx = bbox.GetLeft()
-        self.miny = bbox.GetBottom()
-        self.maxy = bbox.GetTop()
+        self.minx = self.maxx = self.miny = self.maxy = 0
+        if self._board is not None:
+            bbox = self._board.GetBoundingBox()
+            self.minx = bbox.GetRight()
+            self.maxx = bbox.GetLeft()
+            self.miny = bbox.GetBottom()
+            self.maxy = bbox.GetTop()
 
         self.offset_top = pcbnew.FromMM(DEFAULT_OFFSET_TOP_MM)
         self.offset_bottom = pcbnew.FromMM(DEFAULT_OFFSET_BOTTOM_MM)
         self.offset_left = pcbnew.FromMM(DEFAULT_OFFSET_LEFT_MM)
         self.offset_right = pcbnew.FromMM(DEFAULT_OFFSET_RIGHT_MM)
+        self.clearance = pcbnew.FromMM(DEFAULT_CLEARANCE_MM)
+        self.output_mode = OUTPUT_SEGMENTS
 
         self.layer_source = DEFAULT_LAYER_SOURCE
         self.layer_target = DEFAULT_LAYER_TARGET
-
-    def find_bounding_box(self, layerid=-1):
-        """Find bounding box, defaults to EdgeCuts -layer"""
+        self.layers_target = [DEFAULT_LAYER_TARGET]
+        self.pattern = PATTERN_HASH
+        self.line_angle2 = None
+        self.stagger = False
+        self.outline = []
+        self._scan = None
+
+    def find_bounding_box(self, layerid=-1, fresh=False):
+        """Find the board outline and its bounding box, defaults to EdgeCuts -layer
+
+        The polygons go to self.outline, the exact extents of the drawings
+        to minx, miny, maxx and maxy.  The layer is read once per board
+        and drawing count, `fresh` reads it again.
+        """
         if layerid == -1:
-            print "Fail back to default layer: {}".format(DEFAULT_LAYER_SOURCE)
+            log.debug("Fall back to default layer %s", DEFAULT_LAYER_SOURCE)
             layerid = DEFAULT_LAYER_SOURCE
         else:
-            print "Finding limits from layer {}".format(layerid)
+            log.debug("Finding limits from layer %s", layerid)
 
         if not self._board:
             raise Exception("Board missing!")
 
-        print "find_bounding_box( {} )".format(layerid)
-
-        for draw in self._board.DrawingsList():
-            # Handle the board outline segments
-            if draw.GetClass() == 'DRAWSEGMENT' and draw.GetLayer() == layerid:
-                if draw.GetType() == 0:
-                    if draw.GetStart().x < self.minx:
-                        self.minx = draw.GetStart().x
-                    if draw.GetStart().y < self.miny:
-                        self.miny = draw.GetStart().y
-                    if draw.GetEnd().x > self.maxx:
-                        self.maxx = draw.GetEnd().x
-                    if draw.GetEnd().y > self.maxy:
-                        self.maxy = draw.GetEnd().y
-                else:
-                    try:
-                        bbox = draw.GetBoundingBox()
-                        msg = "Found element type " + str(draw.GetType()) + " with boundingbox: (" + bbox.GetLeft() + ", " + bbox.GetTop() + " -> " + bbox.GetRight() + ", " + bbox.GetBottom() + ")"
-                    except Exception as ouch:
-                        print "Got exception: {}".format(ouch)
+        key = (board_key(self._board), item_count(self._board, DRAWINGS))
+        if fresh or self._scan is None or self._scan.key != key:
+            self._scan = DrawingScan(key)
+        outline = self._scan.layers.get(layerid)
+        if outline is None:
+            outline = self._scan.layers[layerid] = LayerOutline(self.board_index().drawings(layerid, 'DRAWSEGMENT'))
 
+        self.outline = outline.polygons()
+        if outline.extents is not None:
+            self.minx, self.miny, self.maxx, self.maxy = outline.extents
+
+    def stamp_dates(self):
+        """Replace the $date$ texts with $date$ and today, from the same drawing walk as the outline"""
+        for draw in self.board_index().drawings(cls='PTEXT'):
+            txt = re.sub(r"\$date\$ [0-9]{4}-[0-9]{2}-[0-9]{2}", "$date$", draw.GetText())
+            if txt == "$date$":
+                draw.SetText("$date$ %s"%datetime.date.today())
 
     def Run(self):
-        print("-------------------------")
-        print("Starting plugin: shielding")
-        pcb = pcbnew.GetBoard()
-        self._board = pcb
-        self.find_bounding_box()
-        print "got bounding box"
-        for draw in pcb.DrawingsList():
-            if draw.GetClass() == 'PTEXT':
-                txt = re.sub("\$date\$ [0-9]{4}-[0-9]{2}-[0-9]{2}", "$date$", draw.GetText())
-                if txt == "$date$":
-                    draw.SetText("$date$ %s"%datetime.date.today())
-            else:
-                print "Found: {}".format(draw.GetClass())
+        with run("shielding", pcbnew):
+            self.run_dialog()
 
-            box = " (" + str(self.minx) + ", " + str(self.miny) + " -> " + str(self.maxx) + ", " + str(self.maxy) + ")"
-            print "Bounding box: "
-            print box
+    def run_dialog(self):
+        # wx only in the GUI, the geometry methods also run headless
+        import wx
+        from wx.lib.embeddedimage import PyEmbeddedImage
+
+        log.info("Starting plugin: shielding")
+        self._board = pcbnew.GetBoard()
+        with stage(SCAN):
+            board_index(self._board, fresh=True)
+            scan = self._scan
+            self.find_bounding_box()
+            # an outline moved in place keeps the drawing count, read it again before drawing
+            reused = scan is not None and self._scan is scan
+
+        log.debug("Bounding box: (%s, %s -> %s, %s)", self.minx, self.miny, self.maxx, self.maxy)
 
         # show dialog and ask stuff
 
         class DisplayDialog(wx.Dialog):
-            def __init__(self, parent):
+            def __init__(self, parent, plugin):
                 wx.Dialog.__init__(self, parent, id=wx.ID_ANY, title="Hash Shielding Generator")
+                self.plugin = plugin
                 self.SetIcon(PyEmbeddedImage(shield_generator_ico_b64).GetIcon())
                 self.panel = wx.Panel(self)
 
@@ -129,6 +263,12 @@ class HashShieldGenerator(pcbnew.ActionPlugin):
                 self.offset_left = DEFAULT_OFFSET_LEFT_MM
                 self.offset_right = DEFAULT_OFFSET_RIGHT_MM
                 self.offset_bottom = DEFAULT_OFFSET_BOTTOM_MM
+                self.clearance = DEFAULT_CLEARANCE_MM
+                self.output_mode = OUTPUT_SEGMENTS
+                self.pattern = 0
+                self.angle2 = DEFAULT_LINE_ANGLE + 90
+                self.more_layers = ""
+                self.stagger = False
 
                 pcb = pcbnew.GetBoard()
 
@@ -171,6 +311,32 @@ class HashShieldGenerator(pcbnew.ActionPlugin):
                 self.text_offset_bottom = wx.TextCtrl(self.panel, value=str(self.offset_bottom))
                 self.text_offset_bottom.Bind(wx.EVT_TEXT, self.readvalues)
                 # -----------------------------------------
+                self.title_clearance = wx.StaticText(self.panel, label="Clearance [mm]")
+                self.text_clearance = wx.TextCtrl(self.panel, value=str(self.clearance))
+                self.text_clearance.Bind(wx.EVT_TEXT, self.readvalues)
+                # -----------------------------------------
+                self.title_output = wx.StaticText(self.panel, label="Output")
+                self.choice_output = wx.Choice(self.panel, choices=OUTPUT_MODES)
+                self.choice_output.SetSelection(self.output_mode)
+                self.choice_output.Bind(wx.EVT_CHOICE, self.readvalues)
+                # -----------------------------------------
+                self.title_pattern = wx.StaticText(self.panel, label="Pattern")
+                self.choice_pattern = wx.Choice(self.panel, choices=PATTERN_NAMES)
+                self.choice_pattern.SetSelection(self.pattern)
+                self.choice_pattern.Bind(wx.EVT_CHOICE, self.readvalues)
+                self.title_angle2 = wx.StaticText(self.panel, label="Second angle (cross)")
+                self.text_angle2 = wx.TextCtrl(self.panel, value=str(self.angle2))
+                self.text_angle2.Bind(wx.EVT_TEXT, self.readvalues)
+                # -----------------------------------------
+                self.title_more_layers = wx.StaticText(self.panel, label="More target layers")
+                self.text_more_layers = wx.TextCtrl(self.panel, value=self.more_layers)
+                self.text_more_layers.SetToolTip(wx.ToolTip("Layer names separated by commas, e.g. In1.Cu, In2.Cu"))
+                self.text_more_layers.Bind(wx.EVT_TEXT, self.readvalues)
+                self.title_stagger = wx.StaticText(self.panel, label="Stagger layers")
+                self.checkbox_stagger = wx.CheckBox(self.panel)
+                self.checkbox_stagger.SetValue(self.stagger)
+                self.checkbox_stagger.Bind(wx.EVT_CHECKBOX, self.readvalues)
+                # -----------------------------------------
                 self.title_linewidth = wx.StaticText(self.panel, label="Line width [mm]")
                 self.text_linewidth = wx.TextCtrl(self.panel, value=str(self.line_width))
                 self.text_linewidth.Bind(wx.EVT_TEXT, self.readvalues)
@@ -179,9 +345,21 @@ class HashShieldGenerator(pcbnew.ActionPlugin):
                 self.text_pitch = wx.TextCtrl(self.panel, value=str(self.pitch))
                 self.text_pitch.Bind(wx.EVT_TEXT, self.readvalues)
                 # -----------------------------------------
-                self.title_coverage = wx.StaticText(self.panel, label="Coverage %")
+                self.title_coverage = wx.StaticText(self.panel, label="Copper coverage %")
                 self.text_coverage = wx.StaticText(self.panel, label="-")
                 # -----------------------------------------
+                self.title_target_coverage = wx.StaticText(self.panel, label="Target coverage %")
+                self.text_target_coverage = wx.TextCtrl(self.panel, value=str(DEFAULT_TARGET_COVERAGE))
+                self.title_aperture = wx.StaticText(self.panel, label="Max aperture [mm]")
+                self.text_aperture = wx.TextCtrl(self.panel, value="")
+                self.button_tune = wx.Button(self.panel, label="Tune...")
+                self.button_tune.Bind(wx.EVT_BUTTON, self.onButtonTune)
+                # -----------------------------------------
+                self.preview = wx.StaticBitmap(self.panel, size=PREVIEW_SIZE)
+                self.text_preview = wx.StaticText(self.panel, label="-")
+                self.preview_timer = None
+                self.preview_layer = None
+                # -----------------------------------------
                 # set sizer
                 self.window_sizer = wx.BoxSizer()
                 self.window_sizer.Add(self.panel, 1, wx.ALL | wx.EXPAND)
@@ -197,7 +375,7 @@ class HashShieldGenerator(pcbnew.ActionPlugin):
                 self.title_delete_old = wx.StaticText(self.panel, label="Delete old values?")
                 self.checkbox_delete_old = wx.CheckBox(self.panel)
                 self.checkbox_delete_old.SetValue(self.delete_old)
-                self.checkbox_delete_old.Bind(wx.EVT_TEXT, self.readvalues)
+                self.checkbox_delete_old.Bind(wx.EVT_CHECKBOX, self.readvalues)
 
                 # set sizer for panel content
                 self.sizer = wx.GridBagSizer(10, 0)
@@ -223,8 +401,27 @@ class HashShieldGenerator(pcbnew.ActionPlugin):
                 self.sizer.Add(self.text_offset_top, (9, 1))
                 self.sizer.Add(self.title_offset_bottom, (10, 0))
                 self.sizer.Add(self.text_offset_bottom, (10, 1))
-                self.sizer.Add(self.button_run, (11, 0))
-                self.sizer.Add(self.button_cancel, (11, 1))
+                self.sizer.Add(self.title_clearance, (11, 0))
+                self.sizer.Add(self.text_clearance, (11, 1))
+                self.sizer.Add(self.title_output, (12, 0))
+                self.sizer.Add(self.choice_output, (12, 1))
+                self.sizer.Add(self.title_pattern, (13, 0))
+                self.sizer.Add(self.choice_pattern, (13, 1))
+                self.sizer.Add(self.title_angle2, (14, 0))
+                self.sizer.Add(self.text_angle2, (14, 1))
+                self.sizer.Add(self.title_more_layers, (15, 0))
+                self.sizer.Add(self.text_more_layers, (15, 1))
+                self.sizer.Add(self.title_stagger, (16, 0))
+                self.sizer.Add(self.checkbox_stagger, (16, 1))
+                self.sizer.Add(self.title_target_coverage, (17, 0))
+                self.sizer.Add(self.text_target_coverage, (17, 1))
+                self.sizer.Add(self.title_aperture, (18, 0))
+                self.sizer.Add(self.text_aperture, (18, 1))
+                self.sizer.Add(self.button_tune, (19, 1))
+                self.sizer.Add(self.button_run, (20, 0))
+                self.sizer.Add(self.button_cancel, (20, 1))
+                self.sizer.Add(self.preview, (0, 2), span=(20, 1), flag=wx.LEFT, border=10)
+                self.sizer.Add(self.text_preview, (20, 2), flag=wx.LEFT, border=10)
 
                 # border for nice look
                 self.border = wx.BoxSizer()
@@ -232,56 +429,152 @@ class HashShieldGenerator(pcbnew.ActionPlugin):
                 self.panel.SetSizerAndFit(self.border)
                 self.SetSizerAndFit(self.window_sizer)
 
-                print "Dialog init completed."
+                log.debug("Dialog init completed.")
+                self.schedule_preview()
 
 
             def onButtonRun(self, event):
-                print "--onButtonRun()"
+                log.debug("--onButtonRun()")
                 self.action_go = True
                 event.Skip()
                 self.readvalues()
-                print "--returned from readvalues()"
+                log.debug("--returned from readvalues()")
+                self.stop_preview()
                 self.Close()
-                print "done self.Close()"
+                log.debug("done self.Close()")
 
             def readvalues(self, event=None):
-                print "--readvalues()"
+                log.debug("--readvalues()")
                 self.line_width = self.text_linewidth.GetValue()
                 self.pitch = self.text_pitch.GetValue()
-                if self.line_width and self.pitch:
-                    pitch = float(self.pitch)
-                    width = float(self.line_width)
-                    if pitch > width and pitch > 0 and width > 0 and pitch - width > 0:
-                        coverage = 100.0 * pow((pitch - width), 2) / pow(pitch, 2)
-                        self.text_coverage.SetLabel(str('{0:.1f}'.format(coverage)))
-                    else:
-                        self.text_coverage.SetLabel('-')
                 self.angle = self.spin_angle.GetValue()
                 self.offset_left = self.text_offset_left.GetValue()
                 self.offset_right = self.text_offset_right.GetValue()
-                print "get offset-top"
+                log.debug("get offset-top")
                 self.offset_top = self.text_offset_top.GetValue()
-                print "get offset-bottom"
+                log.debug("get offset-bottom")
                 self.offset_bottom = self.text_offset_bottom.GetValue()
-                print "get checkbox value"
+                self.clearance = self.text_clearance.GetValue()
+                self.output_mode = self.choice_output.GetSelection()
+                self.pattern = self.choice_pattern.GetSelection()
+                self.angle2 = self.text_angle2.GetValue()
+                self.more_layers = self.text_more_layers.GetValue()
+                self.stagger = self.checkbox_stagger.GetValue()
+                log.debug("get checkbox value")
                 self.delete_old = self.checkbox_delete_old.GetValue()
-                print "get source layer"
+                log.debug("get source layer")
                 self.source_layer = self.combo_source.GetSelection()
-                print "get target layer"
+                log.debug("get target layer")
                 self.target_layer = self.combo_target.GetSelection()
+                self.schedule_preview()
+
+            def schedule_preview(self):
+                """Redraw the preview once the values have not changed for a moment"""
+                if self.preview_timer is not None and self.preview_timer.IsRunning():
+                    self.preview_timer.Restart(PREVIEW_DELAY_MS)
+                else:
+                    self.preview_timer = wx.CallLater(PREVIEW_DELAY_MS, self.update_preview)
+
+            def load_outline(self):
+                """Outline of the selected source layer for the preview and the tuner"""
+                if self.preview_layer != self.source_layer:
+                    self.plugin.find_bounding_box(self.source_layer)
+                    self.preview_layer = self.source_layer
+
+            def update_preview(self):
+                """Render the outline and hash into an offscreen bitmap, the board is not touched"""
+                try:
+                    width = pcbnew.FromMM(float(self.line_width))
+                    pitch = pcbnew.FromMM(float(self.pitch))
+                    angle = float(self.angle)
+                    offsets = [pcbnew.FromMM(float(value)) for value in
+                               (self.offset_left, self.offset_right, self.offset_top, self.offset_bottom)]
+                    clearance = pcbnew.FromMM(float(self.clearance))
+                    angle2 = float(self.angle2)
+                except ValueError:
+                    # a value is being typed
+                    return
+                if pitch <= 0 or width <= 0:
+                    return
+
+                started = time.time()
+                with stage('preview'):
+                    self.load_outline()
+                    pattern = PATTERNS[self.pattern]
+                    border, hashes, _, _ = self.plugin.hash_geometry(width, self.target_layer, pitch, angle,
+                                                                     offsets, clearance, pattern, angle2)
+                    # square lattices are measured over the outline, obstacle cuts are left out while
+                    # typing, the other patterns are sampled from the drawn lines
+                    lattice = square_angle(pattern, angle)
+                    segments = None if lattice is not None else tuple(
+                        np.concatenate(pair) for pair in zip(border, hashes))
+                    coverage = shield_coverage(inset_outline(self.plugin.outline, *offsets, extra=width / 2),
+                                               lattice, pitch, width, segments)
+
+                view = fit_view(self.plugin.outline, *PREVIEW_SIZE)
+                bitmap = getattr(wx, 'EmptyBitmap', wx.Bitmap)(*PREVIEW_SIZE)
+                dc = wx.MemoryDC(bitmap)
+                dc.SetBackground(wx.Brush(wx.Colour(255, 255, 255)))
+                dc.Clear()
+                dc.SetPen(wx.Pen(wx.Colour(160, 160, 160), 1))
+                dc.DrawLineList(to_pixels(loop_edges(self.plugin.outline), view).tolist())
+                dc.SetPen(wx.Pen(wx.Colour(200, 0, 0), max(1, int(round(width * view[0])))))
+                dc.DrawLineList(to_pixels(border, view).tolist() + to_pixels(hashes, view).tolist())
+                thin = coverage.thin()
+                dc.SetPen(wx.Pen(wx.Colour(230, 160, 0), 2))
+                dc.SetBrush(wx.TRANSPARENT_BRUSH)
+                for x, y in zip(coverage.x[thin] * view[0] + view[1], coverage.y[thin] * view[0] + view[2]):
+                    dc.DrawCircle(int(round(x)), int(round(y)), max(2, int(coverage.size * view[0] / 2)))
+                dc.SelectObject(wx.NullBitmap)
+                self.preview.SetBitmap(bitmap)
+                self.text_coverage.SetLabel('{0:.1f}'.format(100 * coverage.coverage) if len(coverage) else '-')
+                self.text_preview.SetLabel("{} segments, {:.0f} ms".format(
+                    len(border[0]) + len(hashes[0]), 1000 * (time.time() - started)))
+
+            def onButtonTune(self, event):
+                """Search width, pitch and angle for the target, the picked row fills the fields"""
+                try:
+                    target = float(self.text_target_coverage.GetValue()) / 100.0
+                    aperture = self.text_aperture.GetValue().strip()
+                    max_aperture = pcbnew.FromMM(float(aperture)) if aperture else None
+                    offsets = [pcbnew.FromMM(float(value)) for value in
+                               (self.offset_left, self.offset_right, self.offset_top, self.offset_bottom)]
+                except ValueError:
+                    wx.MessageBox("Target coverage, aperture and offsets must be numbers", "Tune")
+                    return
+                if not 0 < target < 1:
+                    wx.MessageBox("Target coverage must be between 0 and 100 %", "Tune")
+                    return
+
+                self.load_outline()
+                busy = wx.BusyCursor()
+                ranked = self.plugin.tune_hash(target, max_aperture, offsets)
+                del busy
+                rows = format_table(ranked, TUNE_ROWS).split(u'\n')
+                chooser = wx.SingleChoiceDialog(self, rows[0], "Hash parameters, best first", rows[1:])
+                if chooser.ShowModal() == wx.ID_OK:
+                    best = ranked[chooser.GetSelection()]
+                    self.text_linewidth.SetValue('{:.3f}'.format(pcbnew.ToMM(best.width)))
+                    self.text_pitch.SetValue('{:.3f}'.format(pcbnew.ToMM(best.pitch)))
+                    self.spin_angle.SetValue('{:g}'.format(best.angle))
+                chooser.Destroy()
+
+            def stop_preview(self):
+                if self.preview_timer is not None:
+                    self.preview_timer.Stop()
 
             def onButtonCancel(self, event):
                 event.Skip()
+                self.stop_preview()
                 self.Close()
 
        
 
-        frame = DisplayDialog(None)
-        frame.Center()
+        with stage(UI):
+            frame = DisplayDialog(None, self)
+            frame.Center()
         frame.ShowModal()
 
-        print "-> Dialog closed"
-
         # get the values
         if frame.action_go:
             self.layer_source = int(frame.source_layer)
@@ -294,132 +587,331 @@ class HashShieldGenerator(pcbnew.ActionPlugin):
             self.offset_right = pcbnew.FromMM(float(frame.offset_right))
             self.offset_top = pcbnew.FromMM(float(frame.offset_top))
             self.offset_bottom = pcbnew.FromMM(float(frame.offset_bottom))
-
-            print "Source layer: {} Target layer: {}".format(self.layer_source, self.layer_target)
-            print "Line Angle: {}".format(self.line_angle)
-            print "Line Width: {}".format(self.line_width)
-            print "Line Pitch: {}".format(self.line_pitch)
-
-            print "Offsets {}-{}/{}-{}".format(self.offset_left, self.offset_top,
-                                               self.offset_right, self.offset_bottom)
-
-            self.find_bounding_box(self.layer_source)
-
-            print "Bounding box: ({}, {} -> {}, {})".format(self.minx, self.miny,
-                                                            self.maxx, self.maxy)
+            self.clearance = pcbnew.FromMM(float(frame.clearance))
+            self.flag_delete_old = frame.delete_old
+            self.output_mode = frame.output_mode
+            self.pattern = PATTERNS[frame.pattern]
+            self.line_angle2 = float(frame.angle2)
+            self.stagger = frame.stagger
+            self.layers_target = [self.layer_target]
+            for name in frame.more_layers.split(','):
+                name = name.strip()
+                if not name:
+                    continue
+                if name not in frame.layertable:
+                    log.warning("Unknown target layer %s, skipped", name)
+                elif frame.layertable[name] not in self.layers_target:
+                    self.layers_target.append(frame.layertable[name])
+
+            log.info("Source layer %s, target layers %s, pattern %s%s", self.layer_source,
+                     self.layers_target, self.pattern, ", staggered" if self.stagger else "")
+            log.info("Line angle %s, width %s mm, pitch %s mm, offsets %s-%s/%s-%s", self.line_angle,
+                     self.line_width, self.line_pitch, self.offset_left, self.offset_top,
+                     self.offset_right, self.offset_bottom)
+
+            with stage(SCAN):
+                self.find_bounding_box(self.layer_source, fresh=reused)
+                self.stamp_dates()
+
+            log.debug("Bounding box: (%s, %s -> %s, %s)", self.minx, self.miny, self.maxx, self.maxy)
 
             # create shielding
-            self.draw_shielding(self.line_width, self.layer_target)
+            self.draw_shielding(self.line_width, self.layers_target)
+            if self.layer_source not in self.layers_target:
+                # the outline scan stays valid, the shielding added no drawings to its layers
+                self._scan.key = (board_key(self._board), item_count(self._board, DRAWINGS))
 
         else:
-            print "Cancelled shielding creation!"
+            log.info("Cancelled shielding creation")
 
         frame.Destroy()
 
-        print "Final result:"
-        #print box
+    def hash_geometry(self, width, layer, pitch, angle, offsets, clearance, pattern=PATTERN_HASH,
+                      angle2=None, stagger=0.0):
+        """Inset outline and pattern for `layer`, computed without changing the board.
+
+        `offsets` are (left, right, top, bottom).  Returns the border and
+        pattern segments (x0, y0, x1, y1 arrays each) and the obstacle and
+        keep-out counts.
+        """
+        obstacles = self.find_obstacles(layer, clearance + width / 2)
+        keepouts = self.find_keepouts(layer)
+        border, lines = shield_lines(self.outline, offsets, width, pattern, angle, pitch, obstacles, keepouts,
+                                     angle2, stagger)
+        return border, lines, len(obstacles), len(keepouts)
+
+    def min_line_width(self):
+        """Manufacturing minimum line width, from the board design rules when set"""
+        width = getattr(self._board.GetDesignSettings(), 'm_TrackMinWidth', 0)
+        return width if width > 0 else MIN_WIDTH_NM
+
+    def tune_hash(self, target, max_aperture, offsets):
+        """Ranked hash parameters for a coverage target over the current outline, nothing is drawn"""
+        with stage('tune'):
+            ranked = tune(self.outline, offsets, target, max_aperture, self.min_line_width())
+        log.info("Hash tuning: %d candidates\n%s", len(ranked), format_table(ranked, TUNE_ROWS))
+        return ranked
+
+    def shield_pitch(self):
+        return pcbnew.FromMM(float(self.line_pitch)) if self.line_pitch else pcbnew.FromMM(5)
+
+    def shield_offsets(self):
+        return self.offset_left, self.offset_right, self.offset_top, self.offset_bottom
+
+    def shield_geometry(self, width, layer):
+        """Inset board outline and hash clipped inside it, as x0, y0, x1, y1 arrays"""
+        return self.shield_geometries(width, [layer])[0]
+
+    def shield_geometries(self, width, layers):
+        """Border and pattern segments of every target layer, as x0, y0, x1, y1 arrays.
+
+        Obstacles and keep-outs are read from the board first, the
+        geometry of the layers is then computed in a worker pool.  With
+        staggering layer n of N is moved by n / N pitches.
+        """
+        pitch = self.shield_pitch()
+        margin = self.clearance + width / 2
+        with stage(SCAN):
+            cuts = [(self.find_obstacles(layer, margin), self.find_keepouts(layer)) for layer in layers]
+        staggers = [ind / float(len(layers)) if self.stagger else 0.0 for ind in range(len(layers))]
+
+        def layer_lines(job):
+            (obstacles, keepouts), stagger = job
+            return shield_lines(self.outline, self.shield_offsets(), width, self.pattern, self.line_angle,
+                                pitch, obstacles, keepouts, self.line_angle2, stagger)
+
+        pool = ThreadPoolExecutor(max_workers=max(1, min(len(layers), LAYER_WORKERS)))
+        try:
+            found = list(pool.map(layer_lines, zip(cuts, staggers)))
+        finally:
+            pool.shutdown()
+
+        result = []
+        for layer, (obstacles, keepouts), (border, lines) in zip(layers, cuts, found):
+            if not len(border[0]):
+                log.warning("Cannot draw hash: no closed outline found")
+            note("Layer %s: %d border and %d %s segments, pitch %s mm, %d obstacles, %d keep-outs",
+                 layer, len(border[0]), len(lines[0]), self.pattern, pcbnew.ToMM(pitch), len(obstacles),
+                 len(keepouts))
+            segments = tuple(np.concatenate(pair) for pair in zip(border, lines))
+            if len(border[0]):
+                self.report_coverage(segments, width, pitch)
+            result.append(segments)
+        return result
+
+    def report_coverage(self, segments, width, pitch):
+        """Print the copper coverage of generated segments"""
+        inset = inset_outline(self.outline, *self.shield_offsets(), extra=width / 2)
+        coverage = shield_coverage(inset, square_angle(self.pattern, self.line_angle), pitch, width, segments)
+        note("Copper coverage %.1f %%, %d thin areas of %s mm",
+             100 * coverage.coverage, len(coverage.thin()), pcbnew.ToMM(coverage.size))
 
     def draw_outline_and_hash(self, width, layer):
-        PADDING_mm = 0.0
-        real_left = self.minx
-        real_right = self.maxx
-        real_top = self.miny
-        real_bottom = self.maxy
-
-        real_left += self.offset_left
-        real_right -= self.offset_right
-        real_top += self.offset_top
-        real_bottom -= self.offset_bottom
-
-        # intellity check
-        if real_top > real_bottom:
-            print "Cannot draw hash: y2 > y1!!"
+        self.add_segments(self.shield_geometry(width, layer), width, layer)
+
+    def board_index(self):
+        """Shared index of the board, rescanned where items were added or removed"""
+        return board_index(self._board)
+
+    def find_obstacles(self, layer, margin):
+        """Pads, vias and tracks the shielding on `layer` must avoid, grown by `margin`"""
+        index = self.board_index()
+        tracks, pads = index.tracks, index.pads
+        # holes go through every layer, copper only counts on its own layer
+        tracks = tracks.select(tracks.via | (tracks.layer == layer))
+        pads = pads.select((pads.drill > 0) | ((pads.layer <= layer) & (pads.layer2 >= layer)))
+        return Obstacles.from_tracks(tracks, margin) + Obstacles.from_pads(pads, margin)
+
+    def find_keepouts(self, layer):
+        """Outlines of the keep-out areas on `layer`"""
+        keepouts = []
+        for zone in self.board_index().zones(layer):
+            if zone.GetIsKeepout():
+                chain = zone.Outline().COutline(0)
+                keepouts.append(np.array([(chain.CPoint(pnt).x, chain.CPoint(pnt).y)
+                                          for pnt in range(chain.PointCount())], dtype=np.float64))
+        return keepouts
+
+    def draw_shielding(self, width_mm=DEFAULT_LINE_WIDTH_MM, layers=(DEFAULT_LAYER_TARGET,)):
+        """Replace the shielding on the target layers, the board is refreshed once at the end.
+
+        Existing shielding is updated in place: only the segments that
+        differ from the new geometry are moved, removed or added.  The
+        action plugin framework turns all changes made during Run() into
+        a single undo entry.
+        """
+        width = pcbnew.FromMM(width_mm)
+        mode = self.output_mode
+        if mode != OUTPUT_SEGMENTS and square_angle(self.pattern, self.line_angle) is None:
+            log.warning("%s output needs a hash or grid pattern, using segments", OUTPUT_MODES[mode])
+            mode = OUTPUT_SEGMENTS
+        if mode != OUTPUT_SEGMENTS:
+            for ind, layer in enumerate(layers):
+                self.draw_shield_polygons(width, layer, ind / float(len(layers)) if self.stagger else 0.0)
+            with stage(COMMIT):
+                pcbnew.Refresh()
             return
 
-        real_left += PADDING_mm
-        real_right -= PADDING_mm
-        real_top += PADDING_mm
-        real_bottom -= PADDING_mm
-
-        # fix -> not using centerline, but edge of hashline
-        real_left += width / 2
-        real_right -= width / 2
-        real_top += width / 2
-        real_bottom -= width / 2
-
-        print "draw_shielding: ({}, {} -> {}, {})".format(real_left, real_top, real_right, real_bottom)
-
-        self.draw_segment(real_left, real_top, real_right, real_top, width, layer, 'top border')
-        self.draw_segment(real_right, real_top, real_right, real_bottom, width, layer, 'right border')
-        self.draw_segment(real_right, real_bottom, real_left, real_bottom, width, layer, 'bottom border')
-        self.draw_segment(real_left, real_bottom, real_left, real_top, width, layer, 'left border')
-
- 
-
-        if not self.line_pitch:
-            pitch = pcbnew.FromMM(5)
-        else:
-            pitch = pcbnew.FromMM(float(self.line_pitch))
-
-        diag = sqrt(pow(real_right-real_left, 2) + pow(real_bottom-real_top, 2))
-        alfa = self.line_angle * pi / 180.0
-        dy = pitch / cos(alfa)
-        nn = diag / pitch - 1
-        n = 0
-        my = real_bottom - real_top
-        mx = real_right - real_left
-
-        print "diagonal={} mm pitch({} -> {}) => n={}".format(pcbnew.ToMM(diag), pcbnew.ToMM(pitch), pcbnew.ToMM(dy), nn)
-
-        while n < nn:
-            n += 1
-
-            zy = n * dy
-            zx = zy / tan(alfa)
-
-            ax0 = real_left
-            ax1 = zx + real_left
-            ay0 = real_top + zy
-            ay1 = real_top
-
-            if zy > my:
-                ax0 += (zy-my) / tan(alfa)
-                ay0 = real_bottom
-            if zx > mx:
-                ay1 = real_top + ((zx-mx) * tan(alfa))
-                ax1 = real_right
-
-            qx = n * dy
-            qy = qx / tan(alfa)
-
-            bx0 = real_left
-            bx1 = qx + real_left
-            by0 = real_bottom - qy
-            by1 = real_bottom
-
-            if qy > my:
-                by0 = real_top
-                bx0 += (qy-my) * tan(alfa)
-            if qx > mx:
-                bx1 = real_right
-                by1 -= ((qx-mx) / tan(alfa))
-
-            if between(ax0, real_left, real_right) and between(ax1, real_left, real_right) and between(ay0, real_top, real_bottom) and between(ay1, real_top, real_bottom):
-                self.draw_segment(ax0, ay0, ax1, ay1, width, layer, 'a-' + str(n))
-            if between(bx0, real_left, real_right) and between(bx1, real_left, real_right) and between(by0, real_top, real_bottom) and between(by1, real_top, real_bottom):
-                self.draw_segment(bx0, by0, bx1, by1, width, layer, 'b-' + str(n))
-
-
-                
-    def draw_shielding(self, width_mm=DEFAULT_LINE_WIDTH_MM, layer=DEFAULT_LAYER_TARGET):
-        if self.flag_delete_old:
-            drawings = [draw for draw in self._board.DrawingsList() if draw.GetClass() == 'DRAWSEGMENT' and draw.GetLayer() == layer and draw.GetType() == 0]
-            for draw in drawings:
-                self._board.Remove(draw)
-
-        self.draw_outline_and_hash(pcbnew.FromMM(width_mm), layer)
-
-        pcbnew.Refresh()
+        # compute first, so a failure leaves the old shielding in place
+        with stage(COMPUTE):
+            geometries = self.shield_geometries(width, layers)
+        with stage(COMMIT):
+            for layer, segments in zip(layers, geometries):
+                if self.flag_delete_old:
+                    self.remove_shielding(layer, keep_segments=True)
+                    self.update_shielding(segments, width, layer)
+                else:
+                    note("Added %d shielding segments", self.add_segments(segments, width, layer))
+            with stage('refresh'):
+                pcbnew.Refresh()
+
+    def update_shielding(self, segments, width, layer):
+        """Turn the tagged shielding on `layer` into `segments` with the fewest item changes"""
+        with stage('read'):
+            items = self.shield_items(layer, pcbnew.S_SEGMENT)
+            old = np.zeros((4, len(items)), dtype=np.int64)
+            widths = np.zeros(len(items), dtype=np.int64)
+            for ind, draw in enumerate(items):
+                start = draw.GetStart()
+                end = draw.GetEnd()
+                old[:, ind] = (start.x, start.y, end.x, end.y)
+                widths[ind] = draw.GetWidth()
+
+        with stage('match'):
+            diff = diff_segments(old, segments)
+
+        with stage('apply'):
+            self.apply_diff(diff, items, widths, segments, width, layer)
+        return diff
+
+    def apply_diff(self, diff, items, widths, segments, width, layer):
+        """Move, resize, remove and add shielding items as `diff` says"""
+        resized = 0
+        for ind in diff.keep_old[widths[diff.keep_old] != width]:
+            items[ind].SetWidth(width)
+            resized += 1
+        rounded = [np.round(values).astype(np.int64).tolist() for values in segments]
+        for ind, new in zip(diff.move_old, diff.move_new):
+            items[ind].SetStart(pcbnew.wxPoint(rounded[0][new], rounded[1][new]))
+            items[ind].SetEnd(pcbnew.wxPoint(rounded[2][new], rounded[3][new]))
+            items[ind].SetWidth(width)
+        for ind in diff.remove:
+            self._board.Remove(items[ind])
+        changed(drawings=True)
+        self.add_segments([values[diff.add] for values in segments], width, layer)
+        note("Shielding update: %s, %d widths changed", diff.summary(), resized)
+
+    def shield_items(self, layer=None, shape=None):
+        """Generated shielding drawings, on `layer` and of `shape` or any"""
+        return [draw for draw in self.board_index().drawings(layer, 'DRAWSEGMENT')
+                if draw.GetTimeStamp() == SHIELD_TIMESTAMP and (shape is None or draw.GetShape() == shape)]
+
+    def shield_zones(self, layer=None):
+        """Generated hatched shielding zones (KiCad 6 and newer name them)"""
+        return [zone for zone in self.board_index().zones()
+                if hasattr(zone, 'GetZoneName') and zone.GetZoneName() == SHIELD_ZONE_NAME
+                and (layer is None or zone.GetLayer() == layer)]
+
+    def remove_shielding(self, layer=None, keep_segments=False):
+        """Remove the tagged shielding items, collected in one pass over the drawings"""
+        items = [draw for draw in self.shield_items(layer)
+                 if not keep_segments or draw.GetShape() != pcbnew.S_SEGMENT]
+        items += self.shield_zones(layer)
+        for draw in items:
+            self._board.Remove(draw)
+        changed(drawings=True, zones=True)
+        if items:
+            note("Removed %d shielding items", len(items))
+        return len(items)
+
+    def shield_polygon_set(self, width, layer, stagger=0.0):
+        """Shielding copper as a fractured SHAPE_POLY_SET: outline minus openings and obstacles"""
+        region = inset_outline(self.outline, self.offset_left, self.offset_right,
+                               self.offset_top, self.offset_bottom)
+        pitch = pcbnew.FromMM(float(self.line_pitch or 5))
+        cut = [loop for loop in region if signed_area(loop) < 0]
+        cut.extend(hash_openings(region, square_angle(self.pattern, self.line_angle), pitch, width, stagger))
+        cut.extend(self.find_obstacles(layer, self.clearance).polygons())
+        cut.extend(self.find_keepouts(layer))
+        shield = poly_set([loop for loop in region if signed_area(loop) > 0])
+        shield.BooleanSubtract(poly_set(cut), pcbnew.SHAPE_POLY_SET.PM_FAST)
+        shield.Fracture(pcbnew.SHAPE_POLY_SET.PM_FAST)
+        return shield, region, pitch
+
+    def draw_shield_polygons(self, width, layer, stagger=0.0):
+        """Shielding as a few filled polygons, or as one hatched zone on copper layers"""
+        with stage(COMPUTE):
+            shield, region, pitch = self.shield_polygon_set(width, layer, stagger)
+        mode = self.output_mode
+        if mode == OUTPUT_ZONE and not (hasattr(pcbnew, 'ZONE_FILL_MODE_HATCH_PATTERN')
+                                        and pcbnew.IsCopperLayer(layer)):
+            log.warning("Hatched zones need KiCad 6 and a copper layer, using polygons")
+            mode = OUTPUT_POLYGONS
+        with stage(COMMIT):
+            if self.flag_delete_old:
+                self.remove_shielding(layer)
+            if mode == OUTPUT_ZONE:
+                count = self.add_shield_zone(region, width, layer, pitch)
+            else:
+                count = self.add_polygons(shield, layer)
+        note("%s output: %d objects on layer %s", OUTPUT_MODES[mode], count, layer)
+
+    def add_polygons(self, shield, layer_id):
+        """Add every outline of a fractured SHAPE_POLY_SET as a tagged filled polygon"""
+        for ind in range(shield.OutlineCount()):
+            single = pcbnew.SHAPE_POLY_SET()
+            single.AddOutline(shield.Outline(ind))
+            drawseg = pcbnew.DRAWSEGMENT(self._board)
+            drawseg.SetShape(pcbnew.S_POLYGON)
+            drawseg.SetPolyShape(single)
+            drawseg.SetLayer(layer_id)
+            drawseg.SetWidth(0)
+            drawseg.SetTimeStamp(SHIELD_TIMESTAMP)
+            self._board.Add(drawseg)
+        changed(drawings=True)
+        return shield.OutlineCount()
+
+    def add_shield_zone(self, region, width, layer_id, pitch):
+        """Add the outline as one zone with hatched fill, the zone filler keeps the clearances"""
+        zone = pcbnew.ZONE(self._board)
+        zone.SetLayer(layer_id)
+        zone.SetZoneName(SHIELD_ZONE_NAME)
+        outline = zone.Outline()
+        for loop in region:
+            if signed_area(loop) > 0:
+                outline.NewOutline()
+            else:
+                outline.NewHole()
+            for pos_x, pos_y in np.round(loop).astype(np.int64).tolist():
+                outline.Append(pos_x, pos_y)
+        zone.SetFillMode(pcbnew.ZONE_FILL_MODE_HATCH_PATTERN)
+        zone.SetHatchThickness(width)
+        zone.SetHatchGap(pitch - width)
+        angle = square_angle(self.pattern, self.line_angle)
+        try:
+            zone.SetHatchOrientation(angle)
+        except TypeError:
+            zone.SetHatchOrientation(pcbnew.EDA_ANGLE(angle, pcbnew.DEGREES_T))
+        zone.SetLocalClearance(self.clearance)
+        self._board.Add(zone)
+        changed(zones=True)
+        # fill only the new zone, the other zones of the board are not ours to change
+        pcbnew.ZONE_FILLER(self._board).Fill([zone])
+        return 1
+
+    def add_segments(self, segments, width, layer_id):
+        """Add segments (x0, y0, x1, y1 arrays) as tagged shielding, without refreshing"""
+        rounded = [np.round(values).astype(np.int64).tolist() for values in segments]
+        for pos_x0, pos_y0, pos_x1, pos_y1 in zip(*rounded):
+            drawseg = pcbnew.DRAWSEGMENT(self._board)
+            drawseg.SetStart(pcbnew.wxPoint(pos_x0, pos_y0))
+            drawseg.SetEnd(pcbnew.wxPoint(pos_x1, pos_y1))
+            drawseg.SetLayer(layer_id)
+            drawseg.SetWidth(width)
+            drawseg.SetTimeStamp(SHIELD_TIMESTAMP)
+            self._board.Add(drawseg)
+        changed(drawings=True)
+        return len(rounded[0])
 
     def draw_layer_list(self, layer=DEFAULT_LAYER_TARGET):
         numlayers = pcbnew.PCB_LAYER_ID_COUNT
@@ -455,18 +947,14 @@ class HashShieldGenerator(pcbnew.ActionPlugin):
         self.draw_segment(px1, py1, px2, py2, width, layer_id)
 
     def draw_segment(self, pos_x0, pos_y0, pos_x1, pos_y1, width, layer_id, idx=None):
-        print "Drawing[{}]: ({}, {}) -> ({}, {}) width={} mm".format(idx, pcbnew.ToMM(pos_x0), pcbnew.ToMM(pos_y0), pcbnew.ToMM(pos_x1), pcbnew.ToMM(pos_y1), pcbnew.ToMM(width))
-        drawseg = pcbnew.DRAWSEGMENT(self._board)
-        self._board.Add(drawseg)
-        drawseg.SetStart(pcbnew.wxPoint(pos_x0, pos_y0))
-        drawseg.SetEnd(pcbnew.wxPoint(pos_x1, pos_y1))
-        drawseg.SetLayer(layer_id)
-        drawseg.SetWidth(width)
+        log.debug("Drawing[%s]: (%s, %s) -> (%s, %s) width=%s", idx, pos_x0, pos_y0, pos_x1, pos_y1, width)
+        self.add_segments(([pos_x0], [pos_y0], [pos_x1], [pos_y1]), width, layer_id)
 
 
     def draw_text(self, xpos, ypos, message):
         text = pcbnew.TEXTE_PCB(self._board)
         self._board.Add(text)
+        changed(drawings=True)
         text.SetTextX(xpos)
         text.SetTextY(ypos)
         text.SetText(message)
@@ -0,0 +1,210 @@
+# Copyright (c) 2018 Tommi Rintala, New Cable Corporation Ltd
+
+"""Uniform grid index over board copper.
+
+The grid is built once per analysis from TrackTable or PadTable columns.
+Every item is registered in each grid cell its bounding box touches, the
+cell contents are kept in CSR form (one sorted item array and a start
+offset per cell), so all queries are done in bulk with numpy and return
+index arrays instead of looping over board items.
+"""
+
+from __future__ import division
+
+import numpy as np
+
+CHUNK = 1 << 16     # query boxes handled per numpy round
+
+
+def expand_ranges(starts, counts):
+    """Concatenation of arange(start, start + count) for every pair"""
+    counts = np.asarray(counts, dtype=np.int64)
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(np.asarray(starts, dtype=np.int64) - offsets, counts) + np.arange(counts.sum())
+
+
+def segment_distance(px, py, x0, y0, x1, y1):
+    """Distance from points to segments (element wise), zero length segments are points"""
+    dx = x1 - x0
+    dy = y1 - y0
+    length2 = dx * dx + dy * dy
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = ((px - x0) * dx + (py - y0) * dy) / length2
+    t = np.clip(np.nan_to_num(t), 0.0, 1.0)
+    return np.hypot(px - x0 - t * dx, py - y0 - t * dy)
+
+
+def run_min(group, value):
+    """Minimum of `value` per run of equal `group` entries.
+
+    Returns the group ids, the minima and the index of the first minimum
+    of every group.
+    """
+    if not len(group):
+        return group, np.empty(0), group
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    low = np.minimum.reduceat(value, starts)
+    at_low = value == np.repeat(low, np.diff(np.r_[starts, len(group)]))
+    pick = np.minimum.reduceat(np.where(at_low, np.arange(len(group)), len(group)), starts)
+    return group[starts], low, pick
+
+
+class SpatialGrid(object):
+    """Uniform grid over the bounding boxes of segments.
+
+    Items are segments (x0, y0) - (x1, y1) with a half width, a pad or a
+    via is a zero length segment with its box from the pad size.  `cell`
+    defaults to about one item per cell, but never less than the typical
+    item size so that short tracks stay in one or two cells.
+    """
+
+    def __init__(self, x0, y0, x1, y1, half_x, half_y=None, cell=None):
+        self.x0 = np.asarray(x0, dtype=np.float64)
+        self.y0 = np.asarray(y0, dtype=np.float64)
+        self.x1 = np.asarray(x1, dtype=np.float64)
+        self.y1 = np.asarray(y1, dtype=np.float64)
+        half_x = np.asarray(half_x, dtype=np.float64)
+        half_y = half_x if half_y is None else np.asarray(half_y, dtype=np.float64)
+        self.left = np.minimum(self.x0, self.x1) - half_x
+        self.right = np.maximum(self.x0, self.x1) + half_x
+        self.top = np.minimum(self.y0, self.y1) - half_y
+        self.bottom = np.maximum(self.y0, self.y1) + half_y
+
+        count = len(self.x0)
+        if count:
+            self.origin_x = self.left.min()
+            self.origin_y = self.top.min()
+            extent_x = self.right.max() - self.origin_x
+            extent_y = self.bottom.max() - self.origin_y
+        else:
+            self.origin_x = self.origin_y = 0.0
+            extent_x = extent_y = 1.0
+        if cell is None:
+            typical = np.median(np.maximum(self.right - self.left, self.bottom - self.top)) if count else 1.0
+            cell = max(np.sqrt(extent_x * extent_y / max(count, 1)), typical, 1.0)
+        self.cell = float(cell)
+        self.cols = int(extent_x // self.cell) + 1
+        self.rows = int(extent_y // self.cell) + 1
+
+        item, cx, cy = self._cells(self.left, self.top, self.right, self.bottom)
+        keys = cx * self.rows + cy
+        order = np.argsort(keys, kind='mergesort')
+        self.items = item[order]
+        self.starts = np.zeros(self.cols * self.rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=self.cols * self.rows), out=self.starts[1:])
+        self.cell_x, self.cell_y = self._cell_range(self.left, self.top, self.right, self.bottom)[:2]
+
+    def __len__(self):
+        return len(self.x0)
+
+    @classmethod
+    def from_tracks(cls, table, margin=0, cell=None):
+        """Grid over the tracks and vias of a TrackTable, boxes grown by `margin` nm"""
+        half = table.width / 2.0 + margin
+        return cls(table.x0, table.y0, table.x1, table.y1, half, cell=cell)
+
+    @classmethod
+    def from_pads(cls, pads, margin=0, cell=None):
+        """Grid over the pads of a PadTable, rotated pads by their enclosing circle"""
+        rotated = (pads.orient % 180) != 0
+        half_x = np.where(rotated, np.hypot(pads.sx, pads.sy), pads.sx) / 2.0 + margin
+        half_y = np.where(rotated, np.hypot(pads.sx, pads.sy), pads.sy) / 2.0 + margin
+        return cls(pads.x, pads.y, pads.x, pads.y, half_x, half_y, cell=cell)
+
+    def _cell_range(self, left, top, right, bottom):
+        cx0 = np.clip(np.floor((left - self.origin_x) / self.cell), 0, self.cols - 1).astype(np.int64)
+        cx1 = np.clip(np.floor((right - self.origin_x) / self.cell), 0, self.cols - 1).astype(np.int64)
+        cy0 = np.clip(np.floor((top - self.origin_y) / self.cell), 0, self.rows - 1).astype(np.int64)
+        cy1 = np.clip(np.floor((bottom - self.origin_y) / self.cell), 0, self.rows - 1).astype(np.int64)
+        return cx0, cy0, cx1, cy1
+
+    def _cells(self, left, top, right, bottom):
+        """(box index, cell column, cell row) for every cell touched by every box"""
+        cx0, cy0, cx1, cy1 = self._cell_range(left, top, right, bottom)
+        height = cy1 - cy0 + 1
+        counts = (cx1 - cx0 + 1) * height
+        owner = np.repeat(np.arange(len(counts)), counts)
+        local = expand_ranges(np.zeros(len(counts), dtype=np.int64), counts)
+        return owner, cx0[owner] + local // height[owner], cy0[owner] + local % height[owner]
+
+    def query_boxes(self, left, top, right, bottom):
+        """(query, item) index pairs for item boxes overlapping the query boxes.
+
+        Every pair is returned once, grouped by query.  A pair is only
+        taken from the first cell shared by both boxes, so no duplicate
+        removal is needed.
+        """
+        left = np.atleast_1d(np.asarray(left, dtype=np.float64))
+        top = np.atleast_1d(np.asarray(top, dtype=np.float64))
+        right = np.atleast_1d(np.asarray(right, dtype=np.float64))
+        bottom = np.atleast_1d(np.asarray(bottom, dtype=np.float64))
+        found_query = [np.empty(0, dtype=np.int64)]
+        found_item = [np.empty(0, dtype=np.int64)]
+        for first in range(0, len(left), CHUNK):
+            part = slice(first, first + CHUNK)
+            owner, cx, cy = self._cells(left[part], top[part], right[part], bottom[part])
+            query_x, query_y = self._cell_range(left[part], top[part], left[part], top[part])[:2]
+            query_x = query_x[owner]
+            query_y = query_y[owner]
+            keys = cx * self.rows + cy
+            counts = self.starts[keys + 1] - self.starts[keys]
+            query = np.repeat(owner, counts) + first
+            item = self.items[expand_ranges(self.starts[keys], counts)]
+            hit = ((np.repeat(cx, counts) == np.maximum(np.repeat(query_x, counts), self.cell_x[item]))
+                   & (np.repeat(cy, counts) == np.maximum(np.repeat(query_y, counts), self.cell_y[item]))
+                   & (self.left[item] <= right[query]) & (self.right[item] >= left[query])
+                   & (self.top[item] <= bottom[query]) & (self.bottom[item] >= top[query]))
+            found_query.append(query[hit])
+            found_item.append(item[hit])
+        return np.concatenate(found_query), np.concatenate(found_item)
+
+    def query_points(self, x, y, radius=0):
+        """(point, item) pairs for item boxes within `radius` of the points"""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        return self.query_boxes(x - radius, y - radius, x + radius, y + radius)
+
+    def pairs(self, margin=0):
+        """Item pairs (i < j) whose boxes come within `margin` of each other"""
+        first, second = self.query_boxes(self.left - margin, self.top - margin,
+                                         self.right + margin, self.bottom + margin)
+        keep = first < second
+        return first[keep], second[keep]
+
+    def nearest(self, x, y, max_distance=None):
+        """Nearest item centre line to every point.
+
+        Returns (item, distance), -1 and inf for points with nothing
+        within `max_distance`.  The search box starts at one cell and is
+        doubled for the points that have no hit closer than the box.
+        """
+        x = np.atleast_1d(np.asarray(x, dtype=np.float64))
+        y = np.atleast_1d(np.asarray(y, dtype=np.float64))
+        best = np.full(len(x), -1, dtype=np.int64)
+        distance = np.full(len(x), np.inf)
+        if not len(self) or not len(x):
+            return best, distance
+        limit = np.hypot(self.cols, self.rows) * self.cell + np.max(np.hypot(
+            np.abs(x - self.origin_x), np.abs(y - self.origin_y)))
+        if max_distance is not None:
+            limit = min(limit, max_distance)
+
+        todo = np.arange(len(x))
+        radius = min(self.cell, limit)
+        while len(todo):
+            query, item = self.query_points(x[todo], y[todo], radius)
+            dist = segment_distance(x[todo][query], y[todo][query], self.x0[item], self.y0[item],
+                                    self.x1[item], self.y1[item])
+            closest, low, pick = run_min(query, dist)
+            # a hit outside the radius may have a closer item outside the box
+            done = low <= radius
+            best[todo[closest[done]]] = item[pick[done]]
+            distance[todo[closest[done]]] = low[done]
+
+            finished = np.zeros(len(todo), dtype=bool)
+            finished[closest[done]] = True
+            if radius >= limit:
+                break
+            todo = todo[~finished]
+            radius = min(radius * 2, limit)
+        return best, distance
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+"""Build and query times of the spatial grid on a synthetic board.
+
+    python spikes/spatial_bench.py [segments]
+
+Run from the repository root.
+"""
+
+from __future__ import division, print_function
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tracetable import TrackTable
+from spatial import SpatialGrid
+
+MM = 1000000
+
+
+def synthetic_board(count, seed=1):
+    """`count` short 0/45/90 degree tracks on a 300 x 200 mm board"""
+    rng = np.random.RandomState(seed)
+    x0 = rng.randint(0, 300 * MM, count)
+    y0 = rng.randint(0, 200 * MM, count)
+    length = rng.exponential(2 * MM, count).astype(np.int64)
+    angle = rng.randint(0, 8, count) * np.pi / 4
+    rows = np.column_stack((x0, y0, x0 + (length * np.cos(angle)).astype(np.int64),
+                            y0 + (length * np.sin(angle)).astype(np.int64),
+                            rng.choice([150000, 200000, 250000, 500000], count),
+                            rng.randint(0, 4, count), np.zeros(count), rng.randint(0, 2000, count),
+                            np.zeros(count), np.zeros(count)))
+    rows[:, 6] = rows[:, 5]
+    return TrackTable.from_rows(rows)
+
+
+def timed(label, count, function, *args):
+    started = time.time()
+    result = function(*args)
+    seconds = time.time() - started
+    print('{:<28} {:8.3f} s {:12.0f} /s'.format(label, seconds, count / seconds))
+    return result
+
+
+def main(count=100000):
+    table = synthetic_board(count)
+    print('{} segments'.format(count))
+    grid = timed('build', count, SpatialGrid.from_tracks, table)
+    print('{} x {} cells of {:.2f} mm, {} entries'.format(grid.cols, grid.rows, grid.cell / MM, len(grid.items)))
+
+    rng = np.random.RandomState(2)
+    queries = 100000
+    x = rng.uniform(0, 300 * MM, queries)
+    y = rng.uniform(0, 200 * MM, queries)
+    query, _ = timed('1 mm box queries', queries, grid.query_boxes, x - MM, y - MM, x + MM, y + MM)
+    print('{:.1f} hits per query'.format(len(query) / queries))
+    timed('nearest segment', queries, grid.nearest, x, y)
+    first, _ = timed('pairs within 0.5 mm', count, grid.pairs, MM // 2)
+    print('{} candidate pairs'.format(len(first)))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
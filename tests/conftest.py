@@ -0,0 +1,8 @@
+import sys
+
+# outside KiCad the plugins run against the stand-in pcbnew module
+try:
+    import pcbnew
+except ImportError:
+    import fakepcbnew
+    sys.modules['pcbnew'] = fakepcbnew
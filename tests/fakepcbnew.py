@@ -0,0 +1,535 @@
+"""Stand-in for the parts of the KiCad 5 pcbnew module the plugins use.
+
+Items are plain Python objects with the pcbnew getters, every getter
+builds a new point like the SWIG proxies do.  `synthetic_board()` makes
+a board of any size and `set_board()` makes it the one GetBoard()
+returns.  conftest.py installs this module as `pcbnew` when KiCad is not
+available, the benchmarks do the same.
+"""
+
+from __future__ import division
+
+import math
+
+import numpy as np
+
+# KiCad 5 layer ids
+F_Cu = 0
+In1_Cu = 1
+B_Cu = 31
+Edge_Cuts = 44
+F_Fab = 49
+PCB_LAYER_ID_COUNT = 50
+LAYER_NAMES = dict([(F_Cu, 'F.Cu'), (B_Cu, 'B.Cu'), (Edge_Cuts, 'Edge.Cuts'), (F_Fab, 'F.Fab')]
+                   + [(ind, 'In{}.Cu'.format(ind)) for ind in range(1, B_Cu)])
+
+# STROKE_T
+S_SEGMENT = 0
+S_RECT = 1
+S_ARC = 2
+S_CIRCLE = 3
+S_POLYGON = 4
+
+PAD_SHAPE_CIRCLE = 0
+PAD_SHAPE_RECT = 1
+PAD_SHAPE_OVAL = 2
+
+IU_PER_MM = 1000000.0
+
+
+def FromMM(mm):
+    return int(round(mm * IU_PER_MM))
+
+
+def ToMM(iu):
+    return iu / IU_PER_MM
+
+
+def IsCopperLayer(layer):
+    return F_Cu <= layer <= B_Cu
+
+
+def Refresh():
+    pass
+
+
+class wxPoint(object):
+    __slots__ = ('x', 'y')
+
+    def __init__(self, x=0, y=0):
+        self.x = x
+        self.y = y
+
+
+class wxSize(wxPoint):
+    __slots__ = ()
+
+
+class EDA_RECT(object):
+    def __init__(self, left, top, right, bottom):
+        self._box = (left, top, right, bottom)
+
+    def GetLeft(self):
+        return self._box[0]
+
+    def GetTop(self):
+        return self._box[1]
+
+    def GetRight(self):
+        return self._box[2]
+
+    def GetBottom(self):
+        return self._box[3]
+
+
+class SHAPE_LINE_CHAIN(object):
+    def __init__(self, points=()):
+        self.points = [tuple(point) for point in points]
+
+    def PointCount(self):
+        return len(self.points)
+
+    def CPoint(self, ind):
+        return wxPoint(*self.points[ind])
+
+    def Append(self, x, y):
+        self.points.append((x, y))
+
+
+class SHAPE_POLY_SET(object):
+    def __init__(self):
+        self.outlines = []
+
+    def NewOutline(self):
+        self.outlines.append(SHAPE_LINE_CHAIN())
+        return len(self.outlines) - 1
+
+    def Append(self, x, y):
+        self.outlines[-1].Append(x, y)
+
+    def AddOutline(self, chain):
+        self.outlines.append(chain)
+
+    def OutlineCount(self):
+        return len(self.outlines)
+
+    def Outline(self, ind):
+        return self.outlines[ind]
+
+    COutline = Outline
+
+
+class BOARD_ITEM(object):
+    def __init__(self, board=None):
+        self._layer = F_Cu
+        self._stamp = 0
+        self._parent = board
+
+    def GetLayer(self):
+        return self._layer
+
+    def SetLayer(self, layer):
+        self._layer = layer
+
+    def IsOnLayer(self, layer):
+        return layer == self._layer
+
+    def GetTimeStamp(self):
+        return self._stamp
+
+    def SetTimeStamp(self, stamp):
+        self._stamp = stamp
+
+    def GetParent(self):
+        return self._parent
+
+
+class TRACK(BOARD_ITEM):
+    def __init__(self, board=None, start=(0, 0), end=(0, 0), width=0, layer=F_Cu, net=0, stamp=0):
+        BOARD_ITEM.__init__(self, board)
+        self._start = start
+        self._end = end
+        self._width = width
+        self._layer = layer
+        self._net = net
+        self._stamp = stamp
+
+    def GetStart(self):
+        return wxPoint(*self._start)
+
+    def GetEnd(self):
+        return wxPoint(*self._end)
+
+    def GetWidth(self):
+        return self._width
+
+    def GetNetCode(self):
+        return self._net
+
+
+class VIA(TRACK):
+    def __init__(self, board=None, position=(0, 0), width=0, top=F_Cu, bottom=B_Cu, net=0, drill=0, stamp=0):
+        TRACK.__init__(self, board, position, position, width, top, net, stamp)
+        self._bottom = bottom
+        self._drill = drill
+
+    def GetPosition(self):
+        return wxPoint(*self._start)
+
+    def TopLayer(self):
+        return self._layer
+
+    def BottomLayer(self):
+        return self._bottom
+
+    def GetDrillValue(self):
+        return self._drill
+
+    def IsOnLayer(self, layer):
+        return self._layer <= layer <= self._bottom
+
+
+class MODULE(BOARD_ITEM):
+    def __init__(self, board=None, reference=u'U1'):
+        BOARD_ITEM.__init__(self, board)
+        self._reference = reference
+
+    def GetReference(self):
+        return self._reference
+
+
+class D_PAD(BOARD_ITEM):
+    def __init__(self, parent=None, position=(0, 0), size=(0, 0), orientation=0, shape=PAD_SHAPE_RECT,
+                 drill=0, layers=(F_Cu,), net=0, name=u'1'):
+        BOARD_ITEM.__init__(self, parent)
+        self._position = position
+        self._size = size
+        self._orientation = orientation
+        self._shape = shape
+        self._drill = drill
+        self._layers = layers
+        self._net = net
+        self._name = name
+
+    def GetPosition(self):
+        return wxPoint(*self._position)
+
+    def GetSize(self):
+        return wxSize(*self._size)
+
+    def GetOrientation(self):
+        # tenths of a degree
+        return self._orientation
+
+    def GetShape(self):
+        return self._shape
+
+    def GetDrillSize(self):
+        return wxSize(self._drill, self._drill)
+
+    def IsOnLayer(self, layer):
+        return layer in self._layers
+
+    def GetNetCode(self):
+        return self._net
+
+    def GetName(self):
+        return self._name
+
+
+class DRAWSEGMENT(BOARD_ITEM):
+    def __init__(self, board=None):
+        BOARD_ITEM.__init__(self, board)
+        self._shape = S_SEGMENT
+        self._start = (0, 0)
+        self._end = (0, 0)
+        self._width = 0
+        self._angle = 0
+        self._poly = SHAPE_POLY_SET()
+
+    def GetClass(self):
+        return 'DRAWSEGMENT'
+
+    def GetShape(self):
+        return self._shape
+
+    def SetShape(self, shape):
+        self._shape = shape
+
+    def GetStart(self):
+        return wxPoint(*self._start)
+
+    def SetStart(self, point):
+        self._start = (point.x, point.y)
+
+    def GetEnd(self):
+        return wxPoint(*self._end)
+
+    def SetEnd(self, point):
+        self._end = (point.x, point.y)
+
+    def GetWidth(self):
+        return self._width
+
+    def SetWidth(self, width):
+        self._width = width
+
+    # arcs and circles: start is the centre, end a point of the circle
+    def GetCenter(self):
+        return self.GetStart()
+
+    def GetArcStart(self):
+        return self.GetEnd()
+
+    def GetAngle(self):
+        return self._angle
+
+    def SetAngle(self, angle):
+        self._angle = angle
+
+    def GetRadius(self):
+        return int(round(math.hypot(self._end[0] - self._start[0], self._end[1] - self._start[1])))
+
+    def GetPolyShape(self):
+        return self._poly
+
+    def SetPolyShape(self, poly):
+        self._poly = poly
+
+
+class TEXTE_PCB(BOARD_ITEM):
+    def __init__(self, board=None, text=u''):
+        BOARD_ITEM.__init__(self, board)
+        self._text = text
+
+    def GetClass(self):
+        return 'PTEXT'
+
+    def GetText(self):
+        return self._text
+
+    def SetText(self, text):
+        self._text = text
+
+    def SetTextX(self, x):
+        pass
+
+    def SetTextY(self, y):
+        pass
+
+
+class ZONE_CONTAINER(BOARD_ITEM):
+    # a filled zone is filled all over its outline
+    def __init__(self, board=None, points=(), layer=F_Cu, keepout=False, net=0, filled=False):
+        BOARD_ITEM.__init__(self, board)
+        self._layer = layer
+        self._keepout = keepout
+        self._net = net
+        self._outline = SHAPE_POLY_SET()
+        self._outline.AddOutline(SHAPE_LINE_CHAIN(points))
+        self._fill = SHAPE_POLY_SET()
+        if filled:
+            self._fill.AddOutline(SHAPE_LINE_CHAIN(points))
+
+    def GetIsKeepout(self):
+        return self._keepout
+
+    def GetNetCode(self):
+        return self._net
+
+    def Outline(self):
+        return self._outline
+
+    def GetFilledPolysList(self):
+        return self._fill
+
+
+class NETINFO_ITEM(object):
+    def __init__(self, code, name):
+        self._code = code
+        self._name = name
+
+    def GetNetCode(self):
+        return self._code
+
+    def GetNetname(self):
+        return self._name
+
+
+class BOARD_DESIGN_SETTINGS(object):
+    def __init__(self):
+        self.m_TrackMinWidth = 200000
+
+
+class BOARD(object):
+    def __init__(self):
+        self.tracks = []
+        self.pads = []
+        self.drawings = []
+        self.zones = []
+        self.nets = {}
+        self.settings = BOARD_DESIGN_SETTINGS()
+
+    def GetTracks(self):
+        return list(self.tracks)
+
+    def GetPads(self):
+        return list(self.pads)
+
+    def DrawingsList(self):
+        return list(self.drawings)
+
+    def GetAreaCount(self):
+        return len(self.zones)
+
+    def GetArea(self, ind):
+        return self.zones[ind]
+
+    def FindNet(self, code):
+        return self.nets.get(code)
+
+    def GetNetCount(self):
+        return len(self.nets)
+
+    def GetDesignSettings(self):
+        return self.settings
+
+    def GetLayerName(self, layer):
+        return LAYER_NAMES.get(layer, u'Layer{}'.format(layer))
+
+    def GetBoundingBox(self):
+        points = [(item._start, item._end) for item in self.tracks + self.drawings
+                  if isinstance(item, (TRACK, DRAWSEGMENT))]
+        if not points:
+            return EDA_RECT(0, 0, 0, 0)
+        coords = np.array(points, dtype=np.int64).reshape(-1, 2)
+        left, top = coords.min(axis=0)
+        right, bottom = coords.max(axis=0)
+        return EDA_RECT(int(left), int(top), int(right), int(bottom))
+
+    def Add(self, item):
+        if isinstance(item, TRACK):
+            self.tracks.append(item)
+        elif isinstance(item, D_PAD):
+            self.pads.append(item)
+        elif isinstance(item, ZONE_CONTAINER):
+            self.zones.append(item)
+        else:
+            self.drawings.append(item)
+
+    def Remove(self, item):
+        for items in (self.tracks, self.pads, self.drawings, self.zones):
+            if item in items:
+                items.remove(item)
+                return
+
+
+# None like outside the Pcbnew GUI, until a test sets a board
+_board = [None]
+
+
+def GetBoard():
+    return _board[0]
+
+
+def set_board(board):
+    """Make `board` the one GetBoard() returns"""
+    _board[0] = board
+    return board
+
+
+class ActionPlugin(object):
+    def __init__(self):
+        self.name = ''
+        self.category = ''
+        self.description = ''
+        self.defaults()
+
+    def defaults(self):
+        pass
+
+    def register(self):
+        pass
+
+
+def synthetic_board(tracks=1000, vias=None, pads=None, nets=None, outline=64, size=(300.0, 200.0),
+                    radius=None, layers=4, seed=1):
+    """Random board: short 0/45/90 degree tracks, vias, pads and a rounded outline.
+
+    `outline` is the number of Edge.Cuts segments of the outline, a
+    rectangle of `size` mm with corners of `radius` mm (a tenth of the
+    smaller side by default).  Vias and pads default to a tenth of the
+    tracks, nets to a fiftieth.
+    """
+    vias = tracks // 10 if vias is None else vias
+    pads = tracks // 10 if pads is None else pads
+    nets = max(1, tracks // 50) if nets is None else nets
+    rng = np.random.RandomState(seed)
+    board = BOARD()
+    width, height = FromMM(size[0]), FromMM(size[1])
+    margin = FromMM(5)
+
+    for code in range(1, nets + 1):
+        board.nets[code] = NETINFO_ITEM(code, u'Net-{}'.format(code))
+
+    x0 = rng.randint(margin, width - margin, tracks)
+    y0 = rng.randint(margin, height - margin, tracks)
+    length = rng.exponential(FromMM(2), tracks)
+    angle = rng.randint(0, 8, tracks) * np.pi / 4
+    x1 = np.clip(x0 + (length * np.cos(angle)).astype(np.int64), margin, width - margin)
+    y1 = np.clip(y0 + (length * np.sin(angle)).astype(np.int64), margin, height - margin)
+    track_width = rng.choice([150000, 200000, 250000, 500000], tracks)
+    copper = [B_Cu if layer == layers - 1 else layer for layer in range(layers)]
+    track_layer = rng.choice(copper, tracks)
+    track_net = rng.randint(1, nets + 1, tracks)
+    for ind, (ax, ay, bx, by, size_, layer, net) in enumerate(zip(
+            x0.tolist(), y0.tolist(), x1.tolist(), y1.tolist(), track_width.tolist(),
+            track_layer.tolist(), track_net.tolist())):
+        board.tracks.append(TRACK(board, (ax, ay), (bx, by), size_, layer, net, ind + 1))
+
+    vx = rng.randint(margin, width - margin, vias).tolist()
+    vy = rng.randint(margin, height - margin, vias).tolist()
+    vnet = rng.randint(1, nets + 1, vias).tolist()
+    for ind, (x, y, net) in enumerate(zip(vx, vy, vnet)):
+        board.tracks.append(VIA(board, (x, y), 600000, F_Cu, B_Cu, net, 300000, tracks + ind + 1))
+
+    px = rng.randint(margin, width - margin, pads).tolist()
+    py = rng.randint(margin, height - margin, pads).tolist()
+    pnet = rng.randint(0, nets + 1, pads).tolist()
+    smd = rng.rand(pads) < 0.7
+    module = MODULE(board, u'U1')
+    for ind, (x, y, net, flat) in enumerate(zip(px, py, pnet, smd.tolist())):
+        if flat:
+            pad = D_PAD(module, (x, y), (1500000, 800000), 900 * (ind % 2), PAD_SHAPE_RECT, 0,
+                        (F_Cu,), net, u'{}'.format(ind + 1))
+        else:
+            pad = D_PAD(module, (x, y), (1700000, 1700000), 0, PAD_SHAPE_CIRCLE, 1000000,
+                        tuple(copper), net, u'{}'.format(ind + 1))
+        board.pads.append(pad)
+
+    radius = min(size) / 10.0 if radius is None else radius
+    for edge in rounded_rectangle(width, height, FromMM(radius), outline):
+        segment = DRAWSEGMENT(board)
+        segment.SetLayer(Edge_Cuts)
+        segment.SetStart(wxPoint(*edge[:2]))
+        segment.SetEnd(wxPoint(*edge[2:]))
+        board.drawings.append(segment)
+    board.drawings.append(TEXTE_PCB(board, u'$date$'))
+    return board
+
+
+def rounded_rectangle(width, height, radius, count):
+    """`count` (x0, y0, x1, y1) edges of a closed rectangle with round corners"""
+    corners = max(1, (count - 4) // 4)
+    points = []
+    for cx, cy, start in ((width - radius, radius, -90), (width - radius, height - radius, 0),
+                          (radius, height - radius, 90), (radius, radius, 180)):
+        for step in range(corners + 1):
+            angle = math.radians(start + 90.0 * step / corners)
+            point = (int(round(cx + radius * math.cos(angle))), int(round(cy + radius * math.sin(angle))))
+            # very fine outlines round to repeated points, those would be zero length edges
+            if not points or point != points[-1]:
+                points.append(point)
+    if points[-1] == points[0]:
+        points.pop()
+    return [points[ind] + points[(ind + 1) % len(points)] for ind in range(len(points))]
@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from batch import NET_COLUMNS, RowWriter, analyse_board, main
+
+BOARD = os.path.join(os.path.dirname(__file__), 'data', 'small.kicad_pcb')
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_board_row(self):
+        row, = analyse_board(BOARD)
+        self.assertIsNone(row['error'])
+        self.assertEqual((row['tracks'], row['vias'], row['nets']), (3, 1, 3))
+        # copper of a 3.0 mm pitch, 0.3 mm wide hash plus its border, not the 81 % open share
+        self.assertGreater(row['shield_copper_pct'], 19.0)
+        self.assertLess(row['shield_copper_pct'], 30.0)
+
+    def test_error_row(self):
+        row, = analyse_board(os.path.join(self.folder, 'missing.kicad_pcb'), per_net=True)
+        self.assertTrue(row['error'])
+        self.assertEqual(set(row), set(NET_COLUMNS))
+
+    def test_json_is_strict(self):
+        stream = io.StringIO()
+        writer = RowWriter(stream, NET_COLUMNS, 'json')
+        for row in analyse_board(BOARD, per_net=True):
+            writer.write(row)
+        rows = [json.loads(line, parse_constant=self.fail) for line in stream.getvalue().splitlines()]
+        self.assertEqual([row['net'] for row in rows], [0, 1, 2])
+        # net 0 has no tracks, its unlimited current is written as null
+        self.assertIsNone(rows[0]['max_current_a'])
+        self.assertGreater(rows[1]['max_current_a'], 0)
+
+    def test_main(self):
+        broken = os.path.join(self.folder, 'broken.kicad_pcb')
+        with open(broken, 'w') as stream:
+            stream.write('(kicad_pcb (segment (start 1 2)))')
+        output = os.path.join(self.folder, 'out.csv')
+        self.assertEqual(main(['-j', '1', '-o', output, BOARD, broken]), 1)
+        with open(output) as stream:
+            rows = dict((row['file'], row) for row in csv.DictReader(stream))
+        self.assertEqual(rows[BOARD]['error'], '')
+        self.assertEqual(rows[BOARD]['tracks'], '3')
+        self.assertTrue(rows[broken]['error'])
+
+        output = os.path.join(self.folder, 'out.jsonl')
+        self.assertEqual(main(['-j', '1', '-f', 'json', '--nets', '-o', output, BOARD]), 0)
+        with open(output) as stream:
+            rows = [json.loads(line, parse_constant=self.fail) for line in stream]
+        self.assertEqual(len(rows), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import sys
+import unittest
+
+import numpy as np
+
+import fakepcbnew
+from fakepcbnew import DRAWSEGMENT, Edge_Cuts, F_Cu, synthetic_board
+
+from boardindex import BoardIndex, board_index, changed
+
+
+@unittest.skipUnless(sys.modules.get('pcbnew') is fakepcbnew, "needs the stand-in pcbnew")
+class TestBoardIndex(unittest.TestCase):
+    def setUp(self):
+        self.board = synthetic_board(400, outline=20)
+
+    def test_lookups(self):
+        index = BoardIndex(self.board)
+        for net in (1, 5):
+            tracks = [item for item in self.board.GetTracks() if item.GetNetCode() == net]
+            self.assertEqual(index.track_items_for_net(net), tracks)
+            pads = [pad for pad in self.board.GetPads() if pad.GetNetCode() == net]
+            self.assertEqual(index.pad_items_for_net(net), pads)
+            self.assertTrue(np.all(index.tracks.net[index.tracks_for_net(net)] == net))
+        self.assertEqual(len(index.drawings(Edge_Cuts, 'DRAWSEGMENT')), 20)
+        self.assertEqual(len(index.drawings(cls='PTEXT')), 1)
+        self.assertEqual(len(index.drawings()), 21)
+        self.assertEqual(index.zones(), [])
+
+    def test_invalidation(self):
+        index = board_index(self.board, fresh=True)
+        self.assertEqual(len(index.drawings(F_Cu, 'DRAWSEGMENT')), 0)
+        tracks = index.tracks
+        # an added drawing changes the count, only the drawings are reread
+        self.board.Add(DRAWSEGMENT(self.board))
+        self.assertIs(board_index(self.board), index)
+        self.assertEqual(len(index.drawings(F_Cu, 'DRAWSEGMENT')), 1)
+        self.assertIs(index.tracks, tracks)
+        # replacing a drawing keeps the count, the editor says so
+        self.board.Remove(index.drawings(F_Cu, 'DRAWSEGMENT')[0])
+        self.board.Add(DRAWSEGMENT(self.board))
+        changed(drawings=True)
+        self.assertIs(index.drawings(F_Cu, 'DRAWSEGMENT')[0], self.board.DrawingsList()[-1])
+        self.assertIsNot(board_index(self.board, fresh=True), index)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+import numpy as np
+
+from tracetable import TrackTable
+from coupling import coupling_matrix, parallel_pairs, strip_capacitance, EPSILON_0
+
+MM = 1000000
+
+
+def make_table():
+    rows = (
+        # x0, y0, x1, y1, width, layer, layer2, net, drill, via
+        (0, 0, 10 * MM, 0, MM // 2, 0, 0, 1, 0, 0),
+        (5 * MM, MM, 20 * MM, MM, MM // 2, 0, 0, 2, 0, 0),     # 5 mm side by side, 0.5 mm gap
+        (0, -MM, 10 * MM, -MM, MM // 2, 31, 31, 3, 0, 0),      # other layer
+        (0, 2 * MM, 0, 10 * MM, MM // 2, 0, 0, 3, 0, 0),       # perpendicular
+        (0, MM // 2, 10 * MM, MM // 2, MM // 4, 0, 0, 1, 0, 0),  # same net
+    )
+    return TrackTable.from_rows(rows, {1: u'A', 2: u'B', 3: u'C'})
+
+
+class TestCoupling(unittest.TestCase):
+    def test_parallel_pairs(self):
+        first, second, overlap, spacing = parallel_pairs(make_table())
+        self.assertEqual(sorted(zip(first, second)), [(0, 1), (1, 4)])
+        pair = list(zip(first, second)).index((0, 1))
+        self.assertAlmostEqual(overlap[pair], 5 * MM)
+        self.assertAlmostEqual(spacing[pair], MM // 2)
+
+    def test_strip_capacitance(self):
+        # k = 1/sqrt(2) makes K(k) == K(k'), the capacitance is eps0 * eps_eff
+        width = (np.sqrt(2) - 1) / 2
+        self.assertAlmostEqual(strip_capacitance(width, 1.0, 2.0) / EPSILON_0, 2.0)
+        self.assertGreater(strip_capacitance(0.5e-3, 0.2e-3), strip_capacitance(0.5e-3, 0.4e-3))
+
+    def test_matrix(self):
+        coupling = coupling_matrix(make_table(), height=None)
+        self.assertEqual(list(coupling.netcodes), [0, 1, 2, 3])
+        self.assertEqual(coupling.between(1, 3), 0.0)
+        self.assertEqual(coupling.between(1, 2), coupling.between(2, 1))
+        self.assertAlmostEqual(coupling.between(1, 2), coupling.pairs.capacitance.sum())
+        self.assertEqual(coupling.strongest(1)[0][:2], (u'A', u'B'))
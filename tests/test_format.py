@@ -27,5 +27,5 @@ data = (
 class TestFormatFunc(unittest.TestCase):
     def test_format(self):
         for inp, out in data:
-            print "input of '%s' should be '%s'" %(inp, out)
+            print("input of '%s' should be '%s'" % (inp, out))
             self.assertEqual(format_number(inp), out)
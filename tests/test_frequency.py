@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+
+from tracetable import TrackTable, net_geometry, net_parameters
+from frequency import frequency_response, microstrip, skin_depth, stripline
+
+MM = 1000000
+
+
+def make_geometry():
+    rows = (
+        # x0, y0, x1, y1, width, layer, layer2, net, drill, via
+        (0, 0, 100 * MM, 0, 370000, 0, 0, 1, 0, 0),
+        (0, MM, 50 * MM, MM, 200000, 0, 0, 2, 0, 0),
+        (50 * MM, MM, 50 * MM, 20 * MM, 400000, 0, 0, 2, 0, 0),
+        (0, 0, 0, 0, 0, 0, 31, 2, 300000, 1),
+    )
+    return net_geometry(TrackTable.from_rows(rows, {1: u'A', 2: u'B'}))
+
+
+class TestFrequency(unittest.TestCase):
+    def test_line_constants(self):
+        self.assertAlmostEqual(skin_depth(1e6) * 1e6, 66.0, 0)
+        # 50 Ohm microstrip on FR4
+        z0, eps_eff = microstrip(0.37e-3, 0.2e-3, 4.5)
+        self.assertAlmostEqual(z0, 50.5, 0)
+        self.assertTrue(1 < eps_eff < 4.5)
+        self.assertGreater(stripline(0.1e-3, 0.2e-3)[0], stripline(0.3e-3, 0.2e-3)[0])
+
+    def test_response(self):
+        geometry = make_geometry()
+        frequencies = np.array([0, 1e3, 1e10, 4e10])
+        response = frequency_response(geometry, frequencies)
+        self.assertEqual(response.resistance.shape, (3, 4))
+        self.assertEqual(list(response.resistance[0]), [0.0] * 4)
+        # DC is the series resistance, skin effect grows as sqrt(f)
+        np.testing.assert_allclose(response.resistance[:, 0], net_parameters(geometry).resistance)
+        np.testing.assert_allclose(response.resistance[:, 1], response.resistance[:, 0], rtol=1e-6)
+        np.testing.assert_allclose(response.resistance[1:, 3] / response.resistance[1:, 2], 2.0, rtol=0.05)
+        # a low loss line at high frequency
+        net = response.index(1)
+        self.assertAlmostEqual(abs(response.impedance[net, 3]), microstrip(0.37e-3, 0.2e-3)[0], 0)
+        self.assertTrue(np.isnan(response.impedance[net, 0]))
+        self.assertGreater(response.inductance[net], 0)
+        samples = response.samples()
+        self.assertEqual(samples.shape, (12, 6))
+        np.testing.assert_allclose(samples[4 * net + 2, :3], (1, 1e10, response.resistance[net, 2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+
+import numpy as np
+
+from hashgeom import LineFamily, circle_points, hash_segments, loop_edges, orient_outline, signed_area
+from hashcover import exact_coverage, lattice_areas, lattice_range, raster_coverage, shield_coverage
+
+MM = 1000000.0
+
+OUTER = np.array([(0, 0), (60, 0), (60, 20), (40, 45), (0, 40)], dtype=np.float64) * MM
+HOLE = np.array([(20, 10), (20, 20), (30, 20), (30, 10)], dtype=np.float64) * MM
+
+
+class TestCoverage(unittest.TestCase):
+    def test_lattice_areas(self):
+        loops = orient_outline([OUTER, HOLE, circle_points(45 * MM, 10 * MM, 4 * MM)])
+        family = LineFamily(-30, 3 * MM)
+        first, shape = lattice_range(loops, family)
+        areas = lattice_areas(loops, family, 0.0, 3 * MM, first, shape)
+        self.assertAlmostEqual(areas.sum() / sum(signed_area(loop) for loop in loops), 1.0, places=9)
+        self.assertTrue(np.all(areas >= -1.0))
+        self.assertTrue(np.all(areas <= 9 * MM * MM + 1.0))
+
+    def test_square(self):
+        # lattice aligned with a 10 x 10 pitch square: 100 full openings
+        pitch = 3 * MM
+        width = 0.3 * MM
+        square = [np.array([(0, 0), (30, 0), (30, 30), (0, 30)], dtype=np.float64) * MM]
+        result = exact_coverage(square, 0, pitch, width)
+        region = (30 * MM + width) ** 2
+        self.assertAlmostEqual(result.area.sum() / region, 1.0, places=9)
+        self.assertAlmostEqual(result.coverage, 1 - 100 * (pitch - width) ** 2 / region, places=9)
+        self.assertEqual(result.method, 'exact')
+
+    def test_raster_agrees(self):
+        loops = orient_outline([OUTER, HOLE])
+        pitch = 3 * MM
+        width = 0.3 * MM
+        exact = exact_coverage(loops, 30, pitch, width)
+        segments = tuple(np.concatenate(pair) for pair in zip(loop_edges(loops), hash_segments(loops, 30, pitch)))
+        raster = raster_coverage(loops, segments, width, cell=width / 8)
+        self.assertAlmostEqual(exact.coverage, raster.coverage, places=2)
+        self.assertAlmostEqual(exact.area.sum() / raster.area.sum(), 1.0, places=2)
+        self.assertEqual(len(exact.thin()), 0)
+
+    def test_thin_spot(self):
+        # segments missing around a cut show up as thin tiles
+        square = [np.array([(0, 0), (60, 0), (60, 60), (0, 60)], dtype=np.float64) * MM]
+        x0, y0, x1, y1 = [np.concatenate(pair) for pair in zip(loop_edges(square),
+                                                                   hash_segments(square, 0, 2 * MM))]
+        away = (np.maximum(x0, x1) < 20 * MM) | (np.minimum(x0, x1) > 30 * MM)
+        away |= (np.maximum(y0, y1) < 20 * MM) | (np.minimum(y0, y1) > 30 * MM)
+        result = shield_coverage(square, 0, 2 * MM, 0.5 * MM, (x0[away], y0[away], x1[away], y1[away]))
+        self.assertEqual(result.method, 'raster')
+        thin = result.thin()
+        self.assertTrue(len(thin))
+        self.assertTrue(np.all(np.abs(result.x[thin] - 25 * MM) < 10 * MM))
+        self.assertTrue(np.all(np.abs(result.y[thin] - 25 * MM) < 10 * MM))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,227 @@
+import unittest
+
+import numpy as np
+
+from tracetable import PadTable, PAD_CIRCLE, PAD_OVAL, PAD_RECT
+from spatial import SpatialGrid
+from hashcover import exact_coverage
+from hashgeom import (Obstacles, arc_extents, arc_points, chain_outline, diff_segments, fit_view,
+                      hash_openings, hash_segments, inset_outline, loop_edges, orient_outline, pattern_segments,
+                      scanline_spans, segment_cuts, signed_area, subtract_intervals, to_pixels)
+
+MM = 1000000.0
+
+
+def edges(*loops):
+    rows = []
+    for loop in loops:
+        rows.extend(loop[ind] + loop[(ind + 1) % len(loop)] for ind in range(len(loop)))
+    return np.array(rows, dtype=np.float64) * MM
+
+
+L_SHAPE = [(0, 0), (50, 0), (50, 50), (100, 50), (100, 100), (0, 100)]
+SQUARE = [(0, 0), (100, 0), (100, 100), (0, 100)]
+HOLE = [(40, 40), (60, 40), (60, 60), (40, 60)]
+
+
+class TestHashGeom(unittest.TestCase):
+    def test_coverage(self):
+        # ten 3 mm cells a side, the border on the outer hash lines
+        square = [np.array(SQUARE, dtype=np.float64) * 0.3 * MM]
+        expected = 1.0 - (10 * 2.7) ** 2 / 30.3 ** 2
+        self.assertAlmostEqual(exact_coverage(square, 0, 3 * MM, 0.3 * MM).coverage, expected)
+        self.assertEqual(exact_coverage(square, 0, 0.3 * MM, 3 * MM).coverage, 1.0)
+
+    def test_chain(self):
+        rows = edges(L_SHAPE)
+        rows[2] = np.roll(rows[2], 2)   # one edge drawn backwards
+        loops, open_edges = chain_outline(rows[[3, 0, 5, 2, 1, 4]])
+        self.assertEqual(open_edges, 0)
+        self.assertEqual(len(loops), 1)
+        self.assertAlmostEqual(abs(signed_area(loops[0])), 7500 * MM * MM)
+        loops, open_edges = chain_outline(edges(L_SHAPE)[:-1])
+        self.assertEqual((len(loops), open_edges), (0, 5))
+
+    def test_arc(self):
+        points = arc_points(0, 0, MM, 0, 90)
+        np.testing.assert_allclose(points[-1], [0, MM], atol=1e-6)
+        self.assertTrue(np.all(np.abs(np.hypot(points[:, 0], points[:, 1]) - MM) < 1e-6))
+        # through the top, the extents are exact where the polyline falls short
+        np.testing.assert_allclose(arc_extents(0, 0, MM, MM, 90), (-MM, MM, MM, np.sqrt(2) * MM))
+        np.testing.assert_allclose(arc_extents(0, 0, MM, 0, -90), (0, -MM, MM, 0), atol=1e-6)
+
+    def test_orientation(self):
+        loops = orient_outline(chain_outline(edges(SQUARE, HOLE))[0])
+        areas = sorted(signed_area(loop) for loop in loops)
+        self.assertTrue(areas[0] < 0 < areas[1])
+
+    def test_inset(self):
+        inset = inset_outline(chain_outline(edges(L_SHAPE))[0], 5 * MM, 5 * MM, MM, MM)[0]
+        self.assertEqual(sorted(map(tuple, np.round(inset / MM, 6))),
+                         [(5, 1), (5, 99), (45, 1), (45, 51), (95, 51), (95, 99)])
+
+    def test_spans_around_hole(self):
+        loops = orient_outline(chain_outline(edges(SQUARE, HOLE))[0])
+        x0, y0, x1, y1 = scanline_spans(loops, 0, 10 * MM, (0, 5 * MM))
+        spans = sorted(zip(np.round(y0 / MM), np.round(x0 / MM), np.round(x1 / MM)))
+        self.assertEqual(len(spans), 12)
+        self.assertEqual(spans[4:8], [(45, 0, 40), (45, 60, 100), (55, 0, 40), (55, 60, 100)])
+
+    def test_hash_inside(self):
+        loops = inset_outline(chain_outline(edges(L_SHAPE))[0], MM, MM, MM, MM)
+        x0, y0, x1, y1 = hash_segments(loops, 45, 3 * MM)
+        self.assertTrue(len(x0) > 0)
+        # no span may reach into the cut out corner
+        for x, y in ((x0, y0), (x1, y1), ((x0 + x1) / 2, (y0 + y1) / 2)):
+            self.assertFalse(np.any((x > 49.5 * MM) & (y < 50.5 * MM)))
+
+
+class TestObstacles(unittest.TestCase):
+    def test_intervals(self):
+        obstacles = Obstacles([0.0], [0.0], [5.0], rx=[20.0], ry=[0.0], half_x=[4.0], half_y=[1.0],
+                              angle=[np.pi / 2])
+        start, end = obstacles.intervals(np.array([0, 1, 1]), [-10.0, 10.0, 10.0], [3.0, 0.0, 5.0],
+                                         1.0, 0.0)
+        np.testing.assert_allclose(start[:2], [6.0, 9.0])
+        np.testing.assert_allclose(end[:2], [14.0, 11.0])
+        self.assertTrue(start[2] >= end[2])
+
+    def test_pads(self):
+        pads = PadTable.from_rows([(0, 0, 4, 2, 90, PAD_OVAL, 0, 0, 0, 1)])
+        obstacles = Obstacles.from_pads(pads, 1)
+        # the oval stands upright: 2 + 2 * 1 wide, 4 + 2 * 1 high
+        start, end = obstacles.intervals(np.arange(len(obstacles)), 0.0, -10.0, 0.0, 1.0)
+        self.assertAlmostEqual(start.min(), 7.0)
+        self.assertAlmostEqual(end.max(), 13.0)
+
+    def test_subtract(self):
+        owner, start, end = subtract_intervals(np.array([0, 0, 1]), np.array([0.0, 20.0, 0.0]),
+                                               np.array([10.0, 30.0, 10.0]),
+                                               np.array([0, 0, 0, 1]), np.array([2.0, 3.0, 8.0, 20.0]),
+                                               np.array([4.0, 5.0, 25.0, 30.0]))
+        self.assertEqual(list(zip(owner, start, end)), [(0, 0, 2), (0, 5, 8), (0, 25, 30), (1, 0, 10)])
+
+    def test_segment_cuts(self):
+        obstacles = Obstacles([5.0], [0.0], [1.0])
+        x0, y0, x1, y1 = segment_cuts([0.0, 0.0], [0.0, 5.0], [10.0, 10.0], [0.0, 5.0], obstacles,
+                                      [np.array([[7.0, 4.0], [8.0, 4.0], [8.0, 6.0], [7.0, 6.0]])])
+        self.assertEqual(sorted(zip(x0, x1, y0)), [(0, 4, 0), (0, 7, 5), (6, 10, 0), (8, 10, 5)])
+
+    def test_hash_clearance(self):
+        loops = chain_outline(edges(SQUARE))[0]
+        pads = PadTable.from_rows([(50 * MM, 50 * MM, 6 * MM, 3 * MM, 30, PAD_RECT, 0, 0, 0, 1),
+                                   (20 * MM, 70 * MM, 4 * MM, 4 * MM, 0, PAD_CIRCLE, 0, 0, 0, 1)])
+        obstacles = Obstacles.from_pads(pads, MM)
+        x0, y0, x1, y1 = hash_segments(loops, 45, 3 * MM, obstacles)
+        plain = hash_segments(loops, 45, 3 * MM)
+        self.assertTrue(len(x0) > len(plain[0]))
+        t = np.linspace(0, 1, 200)[:, None]
+        x = x0 + t * (x1 - x0)
+        y = y0 + t * (y1 - y0)
+        start, end = obstacles.intervals(np.repeat(np.arange(len(obstacles)), x.size),
+                                         np.tile(x.ravel(), len(obstacles)),
+                                         np.tile(y.ravel(), len(obstacles)), 1.0, 0.0)
+        # sample points are inside an obstacle when t = 0 lies strictly in the interval
+        self.assertFalse(np.any((start < -1) & (end > 1)))
+
+
+class TestSegmentDiff(unittest.TestCase):
+    def test_diff(self):
+        old = (np.array([0.0, 0.0, 5.0, 5.0, 9.0]), np.zeros(5), np.array([10.0, 10.0, 0.0, 7.0, 9.0]),
+               np.array([0.0, 0.0, 5.0, 5.0, 1.0]))
+        # old 2 comes back reversed and a little off, one copy of the duplicate goes
+        new = (np.array([0.0, 0.0, 3.0]), np.array([5.0, 0.0, 3.0]), np.array([5.02, 10.0, 4.0]),
+               np.array([0.0, 0.0, 4.0]))
+        diff = diff_segments(old, new, quantum=0.1)
+        self.assertEqual(sorted(zip(diff.keep_old, diff.keep_new)), [(0, 1), (2, 0)])
+        self.assertEqual(len(diff.move_old), 1)
+        self.assertEqual(list(diff.move_new), [2])
+        self.assertEqual(len(diff.remove), 2)
+        self.assertEqual(len(diff.add), 0)
+        self.assertEqual(diff.summary(), "2 kept, 1 moved, 2 removed, 0 added")
+
+
+class TestOpenings(unittest.TestCase):
+    def test_openings_between_lines(self):
+        loops = chain_outline(edges(L_SHAPE))[0]
+        openings = hash_openings(loops, 30, 3 * MM, 0.3 * MM)
+        self.assertTrue(len(openings) > 700)
+        np.testing.assert_allclose([abs(signed_area(square)) for square in openings[:5]], (2.7 * MM) ** 2)
+        # every opening centre lies halfway between two hash lines
+        centre = openings.mean(axis=1)
+        inside = (centre[:, 0] > 5 * MM) & (centre[:, 0] < 45 * MM) & (centre[:, 1] > 5 * MM) & (centre[:, 1] < 95 * MM)
+        hashes = SpatialGrid(*hash_segments(loops, 30, 3 * MM), half_x=0.0)
+        _, distance = hashes.nearest(centre[inside, 0], centre[inside, 1])
+        np.testing.assert_allclose(distance, 1.5 * MM)
+
+    def test_openings_open_area(self):
+        # 20.3 mm high, the last row is a 0.3 mm strip short of the middle line
+        size = np.array([30.0, 20.3]) * MM
+        loops = [np.array(SQUARE, dtype=np.float64) / 100 * size]
+        pitch, width = MM, 0.2 * MM
+        openings = hash_openings(loops, 0, pitch, width)
+        low = np.maximum(openings.min(axis=1), 0.0)
+        high = np.minimum(openings.max(axis=1), size)
+        polygon_open = np.prod(np.clip(high - low, 0.0, None), axis=1).sum()
+        # the drawn lines of the grid leave the product of the gaps along x and y open
+        x0, y0, x1, y1 = hash_segments(loops, 0, pitch)
+        gaps = []
+        for across, other, extent in ((y0, y1, size[1]), (x0, x1, size[0])):
+            centre = np.unique(np.round(across[np.isclose(across, other)]))
+            covered = np.minimum(centre + width / 2, extent) - np.maximum(centre - width / 2, 0.0)
+            gaps.append(extent - np.clip(covered, 0.0, None).sum())
+        self.assertAlmostEqual(polygon_open / (gaps[0] * gaps[1]), 1.0, 9)
+
+    def test_obstacle_polygons(self):
+        obstacles = Obstacles([0.0], [0.0], [MM], rx=[0.0], ry=[0.0], half_x=[2.0], half_y=[1.0],
+                              angle=[np.pi / 2])
+        circle, rect = obstacles.polygons()
+        self.assertTrue(np.all(np.hypot(circle[:, 0], circle[:, 1]) >= MM))
+        self.assertAlmostEqual(abs(signed_area(circle)) / (np.pi * MM * MM), 1.0, 1)
+        np.testing.assert_allclose(rect, [[1, -2], [1, 2], [-1, 2], [-1, -2]], atol=1e-12)
+
+
+class TestPatterns(unittest.TestCase):
+    def setUp(self):
+        self.square = [np.array(SQUARE, dtype=np.float64) * MM / 2]
+
+    def test_hash_and_grid(self):
+        for got, want in zip(pattern_segments(self.square, 'hash', 30, 3 * MM), hash_segments(self.square, 30, 3 * MM)):
+            self.assertTrue(np.array_equal(got, want))
+        x0, y0, x1, y1 = pattern_segments(self.square, 'grid', 30, 3 * MM)
+        self.assertTrue(np.all(np.isclose(x0, x1, rtol=0, atol=1) | np.isclose(y0, y1, rtol=0, atol=1)))
+        x0, y0, x1, y1 = pattern_segments(self.square, 'cross', 10, 3 * MM, angle2=-40)
+        angles = np.round(np.degrees(np.arctan2(y1 - y0, x1 - x0)) % 180)
+        self.assertEqual(sorted(set(angles)), [40.0, 170.0])
+
+    def test_hex(self):
+        pitch = 3 * MM
+        x0, y0, x1, y1 = pattern_segments(self.square, 'hex', 20, pitch)
+        inner = ((np.minimum(x0, x1) > 5 * MM) & (np.maximum(x0, x1) < 45 * MM)
+                 & (np.minimum(y0, y1) > 5 * MM) & (np.maximum(y0, y1) < 45 * MM))
+        self.assertTrue(np.allclose(np.hypot(x1 - x0, y1 - y0)[inner], pitch / np.sqrt(3)))
+        # every corner well inside joins three cell sides
+        ends = np.round(np.concatenate((np.column_stack((x0, y0)), np.column_stack((x1, y1)))) / 1000)
+        corners, counts = np.unique(ends, axis=0, return_counts=True)
+        middle = (np.abs(corners * 1000 - 25 * MM) < 10 * MM).all(axis=1)
+        self.assertTrue(middle.any())
+        self.assertTrue(np.all(counts[middle] == 3))
+
+    def test_stagger(self):
+        plain = pattern_segments(self.square, 'grid', 0, 2 * MM)
+        staggered = pattern_segments(self.square, 'grid', 0, 2 * MM, stagger=0.5)
+        vertical = np.abs(plain[0] - plain[2]) < 1
+        moved = np.abs(staggered[0] - staggered[2]) < 1
+        self.assertEqual(set(np.round(plain[0][vertical] / MM) % 2), set([0.0]))
+        self.assertEqual(set(np.round(staggered[0][moved] / MM) % 2), set([1.0]))
+
+
+class TestPreview(unittest.TestCase):
+    def test_fit_view(self):
+        loops = chain_outline(edges(L_SHAPE))[0]
+        view = fit_view(loops, 208, 108)
+        pixels = to_pixels(loop_edges(loops), view)
+        self.assertEqual(pixels[:, [0, 2]].min(), 54)
+        self.assertEqual(pixels[:, [0, 2]].max(), 154)
+        self.assertEqual(pixels[:, [1, 3]].min(), 4)
+        self.assertEqual(pixels[:, [1, 3]].max(), 104)
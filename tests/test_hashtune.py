@@ -0,0 +1,43 @@
+import unittest
+
+import numpy as np
+
+from hashcover import exact_coverage
+from hashtune import aperture, aperture_limit, format_table, infinite_pitch, tune
+
+MM = 1000000.0
+SQUARE = [np.array([(0, 0), (60, 0), (60, 40), (0, 40)], dtype=np.float64) * MM]
+
+
+class TestHashTune(unittest.TestCase):
+    def test_limits(self):
+        self.assertAlmostEqual(aperture_limit(1e9) / MM, 14.99, places=2)
+        self.assertAlmostEqual(aperture(3 * MM, 1 * MM) / MM, 2 * np.sqrt(2))
+        pitch = infinite_pitch(0.3 * MM, 0.85)
+        # 40 cells a side, the copper share tends to 0.85 as the border gets relatively thinner
+        square = [np.array([(0, 0), (1, 0), (1, 1), (0, 1)], dtype=np.float64) * 40 * pitch]
+        expected = 1.0 - (40 * (pitch - 0.3 * MM)) ** 2 / (40 * pitch + 0.3 * MM) ** 2
+        self.assertAlmostEqual(exact_coverage(square, 0, pitch, 0.3 * MM).coverage, expected)
+        self.assertAlmostEqual(expected, 0.85, places=2)
+
+    def test_tune(self):
+        ranked = tune(SQUARE, (MM, MM, MM, MM), 0.8, max_aperture=0.5 * MM, min_width=0.2 * MM,
+                      width_steps=(1.0, 2.0), angles=(0.0, 45.0))
+        self.assertEqual(len(ranked), 4)
+        best = ranked[0]
+        self.assertTrue(best.feasible)
+        self.assertGreaterEqual(best.coverage, 0.8)
+        self.assertLessEqual(best.aperture, 0.5 * MM)
+        self.assertTrue(all(candidate.width >= 0.2 * MM for candidate in ranked))
+        self.assertEqual(len(format_table(ranked).splitlines()), 5)
+
+    def test_unreachable(self):
+        # a tiny aperture cannot be met with this coverage target and width
+        ranked = tune(SQUARE, (MM, MM, MM, MM), 0.99, max_aperture=0.001 * MM, min_width=0.2 * MM,
+                      width_steps=(1.0,), angles=(0.0,))
+        self.assertFalse(ranked[0].feasible)
+        self.assertGreater(ranked[0].shortfall, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+
+import numpy as np
+
+from tracetable import GeometryCache, TrackTable, net_geometry
+from frequency import C_0, microstrip
+from inductance import (bar_inductance, loop_inductance, mutual_inductance, net_inductance, net_pairs,
+                        run_directions)
+
+MM = 1000000
+WIDTH = 200000
+
+
+def make_table(rows):
+    return TrackTable.from_rows([row + (0, 0) if len(row) == 8 else row for row in rows])
+
+
+def track(x0, y0, x1, y1, net=1, layer=0, width=WIDTH):
+    return (x0 * MM, y0 * MM, x1 * MM, y1 * MM, width, layer, layer, net)
+
+
+class TestInductance(unittest.TestCase):
+    def test_bar(self):
+        # Rosa: mu0 l / 2 pi (ln(2 l / (w + t)) + 1/2)
+        expected = 2e-7 * 0.01 * (np.log(0.02 / 0.218e-3) + 0.5)
+        self.assertAlmostEqual(bar_inductance(0.01, 0.2e-3, 18e-6) / expected, 1.0, 2)
+
+    def test_mutual(self):
+        one = np.array([0.0])
+        ten = np.array([0.01])
+        # parallel closed form against the quadrature of a slightly turned pair
+        parallel = mutual_inductance(one, one, ten, one, one, one + 1e-3, ten, one + 1e-3, one)
+        turned = mutual_inductance(one, one, ten, one, one, one + 1e-3, ten, one + 1.001e-3, one)
+        self.assertAlmostEqual(turned[0] / parallel[0], 1.0, 3)
+        # reversed current, perpendicular tracks
+        reverse = mutual_inductance(one, one, ten, one, ten, one + 1e-3, one, one + 1e-3, one)
+        self.assertEqual(reverse[0], -parallel[0])
+        self.assertEqual(mutual_inductance(one, one, ten, one, one, one, one, ten, one)[0], 0.0)
+
+    def test_directions(self):
+        table = make_table([track(0, 0, 5, 0), track(10, 0, 5, 0), track(10, 0, 10, 5), track(10, 0, 20, 0),
+                            track(30, 0, 40, 0, net=2)])
+        # the third end at (10, 0) is a branch, the other runs continue
+        self.assertEqual(list(run_directions(table)), [False, True, False, False, False])
+
+    def test_pairs(self):
+        table = make_table([track(0, 0, 10, 0), track(0, 0.5, 10, 0.5), track(0, 0.5, 10, 0.5, net=2),
+                            track(0, 0.5, 10, 0.5, layer=31), track(0, 5, 10, 5)])
+        pairs = sorted(zip(*[np.concatenate(found) for found in zip(*net_pairs(table))]))
+        self.assertEqual(pairs, [(0, 1)])
+
+    def test_nets(self):
+        straight = net_inductance(make_table([track(0, 0, 100, 0)]))
+        split = net_inductance(make_table([track(0, 0, 50, 0), track(100, 0, 50, 0)]))
+        self.assertAlmostEqual(split.partial[1] / straight.partial[1], 1.0, 6)
+        self.assertEqual(split.pairs, 1)
+        # a long microstrip agrees with the line inductance Z0 sqrt(eps_eff) / c
+        z0, eps_eff = microstrip(0.218e-3, 0.2e-3, 1.0)
+        self.assertAlmostEqual(straight.loop[1] / 0.1 / (z0 / C_0), 1.0, 1)
+        # folding the same track back on itself cancels most of it
+        hairpin = net_inductance(make_table([track(0, 0, 50, 0), track(50, 0, 50, 0.5), track(50, 0.5, 0, 0.5)]))
+        self.assertLess(hairpin.partial[1], 0.5 * straight.partial[1])
+
+    def test_cache(self):
+        rows = [track(0, 0, 10, 0), track(10, 0, 10, 5), track(0, 1, 10, 1, net=2), track(0, 3, 10, 3, net=0)]
+        cache = GeometryCache()
+        cache.update(make_table(rows), loop_inductance)
+        rows[1] = track(10, 0, 10, 8)
+        geometry = cache.update(make_table(rows), loop_inductance)
+        expected = net_geometry(make_table(rows), loop_inductance)
+        self.assertEqual(cache.misses, 1)
+        np.testing.assert_allclose(geometry.inductance, expected.inductance)
+        self.assertTrue(np.all(geometry.inductance > 0))
+
+    def test_no_tracks(self):
+        empty = make_table([])
+        self.assertEqual(list(loop_inductance(empty)), [0.0])
+        self.assertEqual(list(net_pairs(empty)), [])
+        # a via alone has no track to pair or reverse
+        via = make_table([(0, 0, 0, 0, MM, 0, 31, 1, MM // 2, 1)])
+        geometry = net_geometry(via, loop_inductance)
+        self.assertEqual(list(geometry.inductance), [0.0])
+        self.assertEqual(net_inductance(via).pairs, 0)
+
+    def test_cache_deleted_net(self):
+        rows = [track(0, 0, 10, 0), track(10, 0, 10, 5), track(0, 1, 10, 1, net=2)]
+        via = (10 * MM, 5 * MM, 10 * MM, 5 * MM, MM, 0, 31, 1, MM // 2, 1)
+        cache = GeometryCache()
+        cache.update(make_table(rows + [via]), loop_inductance)
+        # delete the tracks of net 1, its via stays, then the last track of all
+        geometry = cache.update(make_table(rows[2:] + [via]), loop_inductance)
+        expected = net_geometry(make_table(rows[2:] + [via]), loop_inductance)
+        np.testing.assert_allclose(geometry.inductance, expected.inductance)
+        geometry = cache.update(make_table([via]), loop_inductance)
+        self.assertEqual(list(geometry.netcodes), [0])
+        self.assertEqual(list(geometry.inductance), [0.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
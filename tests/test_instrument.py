@@ -0,0 +1,75 @@
+import types
+import unittest
+
+import instrument
+from instrument import CallCounter, LAST_RUNS, format_report, note, run, stage
+
+
+class BOARD(object):
+    def __init__(self, count):
+        self.count = count
+
+    def GetTracks(self):
+        return list(range(self.count))
+
+
+def make_module():
+    module = types.ModuleType('fakepcbnew')
+    module.BOARD = BOARD
+    module.FromMM = lambda mm: int(mm * 1000000)
+    return module
+
+
+class TestInstrument(unittest.TestCase):
+    def test_call_counter(self):
+        module = make_module()
+        with CallCounter(module) as counter:
+            board = module.BOARD(3)
+            for _ in range(4):
+                board.GetTracks()
+            module.FromMM(1.0)
+        self.assertEqual(counter.calls['BOARD.GetTracks'], 4)
+        self.assertEqual(counter.calls['BOARD.__init__'], 1)
+        self.assertEqual(counter.calls['FromMM'], 1)
+        self.assertEqual(counter.total, 6)
+        # the originals are back
+        self.assertIs(vars(BOARD)['GetTracks'], BOARD.__dict__['GetTracks'])
+        self.assertFalse(hasattr(BOARD.GetTracks, '_wiretools_counted'))
+        self.assertFalse(hasattr(module.FromMM, '_wiretools_counted'))
+
+    def test_run_report(self):
+        module = make_module()
+        with run('test plugin', module, count_calls=True) as report:
+            with stage(instrument.SCAN):
+                board = module.BOARD(2)
+            for _ in range(3):
+                with stage(instrument.COMPUTE):
+                    with stage('inner'):
+                        board.GetTracks()
+            note("%d tracks", 2)
+        self.assertIs(LAST_RUNS['test plugin'], report)
+        self.assertEqual(list(report.stages), [(instrument.SCAN,), (instrument.COMPUTE,),
+                                               (instrument.COMPUTE, 'inner')])
+        self.assertEqual(report.stages[(instrument.COMPUTE,)][0], 3)
+        self.assertEqual(report.stages[(instrument.COMPUTE,)][2], 3)
+        self.assertEqual(report.stages[(instrument.SCAN,)][2], 1)
+        self.assertEqual(report.notes, ['2 tracks'])
+        text = format_report([report])
+        self.assertIn('BOARD.GetTracks', text)
+        self.assertIn('\n  inner', text)
+
+    def test_failed_run(self):
+        with self.assertRaises(ValueError):
+            with run('failing plugin'):
+                raise ValueError('no outline')
+        report = LAST_RUNS['failing plugin']
+        self.assertEqual(report.error, 'ValueError: no outline')
+        self.assertIsNone(report.calls)
+        self.assertIn('not counted', report.format())
+        # outside of a run stages only time nothing
+        with stage(instrument.COMPUTE) as report:
+            self.assertIsNone(report)
+
+
+if __name__ == '__main__':
+    unittest.main()
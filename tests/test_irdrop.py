@@ -0,0 +1,141 @@
+import sys
+import unittest
+
+import numpy as np
+
+import fakepcbnew
+from fakepcbnew import F_Cu, ZONE_CONTAINER, synthetic_board
+
+from tracetable import TrackTable, PadTable, PAD_RECT, RHO_CU
+from netgraph import EDGE_BARREL, EDGE_TRACK, EDGE_ZONE, BoardNetwork, barrel_resistance
+from zonemesh import mesh_zones
+from irdrop import PowerNet, ir_drop
+
+MM = 1000000
+CU = 35e-6
+SHEET = RHO_CU / CU
+
+
+def rectangle(x0, y0, x1, y1):
+    return np.array(((x0, y0), (x1, y0), (x1, y1), (x0, y1)), dtype=np.float64)
+
+
+def make_network():
+    tracks = TrackTable.from_rows((
+        # x0, y0, x1, y1, width, layer, layer2, net, drill, via
+        # net 1: 10 mm of track from J1 to U1, U2 off the track
+        (0, 0, 10 * MM, 0, MM, 0, 0, 1, 0, 0),
+        # net 2: F.Cu track down a via into an inner plane, up another via
+        (0, 20 * MM, 2 * MM, 20 * MM, MM, 0, 0, 2, 0, 0),
+        (2 * MM, 20 * MM, 2 * MM, 20 * MM, MM, 0, 31, 2, MM // 2, 1),
+        (8 * MM, 20 * MM, 8 * MM, 20 * MM, MM, 0, 31, 2, MM // 2, 1),
+        (8 * MM, 20 * MM, 9 * MM, 20 * MM, MM, 31, 31, 2, 0, 0),
+    ), {1: u'A', 2: u'B'})
+    pads = PadTable.from_rows((
+        # x, y, sx, sy, orient, shape, drill, layer, layer2, net
+        (0, 0, MM, MM, 0, PAD_RECT, 0, 0, 0, 1),
+        (10 * MM, 0, MM, MM, 0, PAD_RECT, 0, 0, 0, 1),
+        (30 * MM, 0, MM, MM, 0, PAD_RECT, 0, 0, 0, 1),
+        (0, 20 * MM, MM, MM, 0, PAD_RECT, 0, 0, 0, 2),
+        (9 * MM, 20 * MM, MM, MM, 0, PAD_RECT, 0, 31, 31, 2),
+        # a one cell wide strip of zone on B.Cu, 20 squares long
+        (0, 40 * MM, MM // 4, MM // 4, 0, PAD_RECT, 0, 31, 31, 3),
+        (10 * MM, 40 * MM, MM // 4, MM // 4, 0, PAD_RECT, 0, 31, 31, 3),
+    ), [u'J1-1', u'U1-1', u'U2-1', u'J2-1', u'U3-1', u'J3-1', u'U4-1'])
+    strip = rectangle(0, 40 * MM - MM // 10, 10 * MM + MM // 4, 40 * MM + MM // 10)
+    zones = mesh_zones(((2, 1, [rectangle(MM, 15 * MM, 9 * MM, 25 * MM)]), (3, 31, [strip])), MM // 2)
+    return BoardNetwork(tracks, pads, cu_thick=CU, zones=zones)
+
+
+class TestZoneMesh(unittest.TestCase):
+    def test_cells(self):
+        # two overlapping zones of a net share their cells
+        mesh = mesh_zones(((1, 0, [rectangle(0, 0, 2 * MM, 2 * MM)]),
+                           (1, 0, [rectangle(MM, 0, 2 * MM, 2 * MM)]),
+                           (2, 0, [rectangle(5 * MM, 0, 7 * MM, 2 * MM)])), MM)
+        # grid points on the right and bottom edges are outside, 2 x 2 cells per zone
+        self.assertEqual(len(mesh), 8)
+        self.assertEqual(len(mesh.edge_a), 8)
+        self.assertTrue(np.all(mesh.net[mesh.edge_a] == mesh.net[mesh.edge_b]))
+        found = mesh.find([MM + 400000, 5 * MM, 5 * MM, 20 * MM], [100000, MM, MM, 0], 0, [1, 2, 1, 1])
+        self.assertEqual(mesh.x[found[0]], MM)
+        self.assertEqual(mesh.y[found[0]], 0)
+        self.assertEqual(mesh.net[found[1]], 2)
+        self.assertEqual(list(found[2:]), [-1, -1])
+
+
+class TestIRDrop(unittest.TestCase):
+    def setUp(self):
+        self.network = make_network()
+
+    def test_track(self):
+        result = PowerNet(self.network, [u'J1-1'], 3.3).solve({u'U1-1': 2.0})
+        resistance = RHO_CU * 10e-3 / (CU * 1e-3)
+        self.assertAlmostEqual(result.pad_voltage(u'U1-1')[0], 3.3 - 2.0 * resistance)
+        drop, node = result.worst_drop()
+        self.assertAlmostEqual(drop[0] / (2.0 * resistance), 1.0)
+        self.assertEqual(node[0], self.network.pad_node[1])
+        track = np.flatnonzero(self.network.edge_kind[result.edges] == EDGE_TRACK)
+        self.assertAlmostEqual(abs(result.current[track[0], 0]), 2.0)
+        self.assertAlmostEqual(result.density[track[0], 0] / (2.0 / (CU * 1e-3)), 1.0)
+
+    def test_zone_strip(self):
+        result = PowerNet(self.network, [u'J3-1']).solve({u'U4-1': 1.0})
+        self.assertAlmostEqual(result.worst_drop()[0][0] / (20 * SHEET), 1.0)
+        self.assertTrue(np.all(self.network.edge_kind[result.edges] == EDGE_ZONE))
+        self.assertTrue(np.allclose(np.abs(result.current), 1.0))
+
+    def test_inner_plane(self):
+        result = PowerNet(self.network, [u'J2-1']).solve({u'U3-1': 1.0})
+        kinds = self.network.edge_kind[result.edges]
+        self.assertEqual(set(kinds.tolist()), {EDGE_TRACK, EDGE_BARREL, EDGE_ZONE})
+        # F.Cu to the plane on layer 1 in one via, the plane to B.Cu in the other
+        series = barrel_resistance(0.5e-3) * (1 + 30) / 31.0 + RHO_CU * 3e-3 / (CU * 1e-3)
+        drop = result.worst_drop()[0][0]
+        self.assertGreater(drop, series)
+        self.assertLess(drop, series + 20 * SHEET)
+
+    def test_load_cases(self):
+        power = PowerNet(self.network, [u'J2-1'], 5.0)
+        both = power.solve([{u'U3-1': 1.0}, {u'U3-1': 3.0}])
+        single = power.solve({u'U3-1': 1.0})
+        self.assertEqual(len(both), 2)
+        self.assertTrue(np.allclose(both.drop[:, 1], 3 * single.drop[:, 0]))
+        self.assertTrue(np.allclose(both.voltage[:, 0], single.voltage[:, 0]))
+        self.assertEqual(len(both.summary()), 2)
+
+    def test_errors(self):
+        power = PowerNet(self.network, [u'J1-1'])
+        self.assertRaises(ValueError, power.solve, {u'U2-1': 1.0})
+        self.assertRaises(ValueError, power.solve, {u'U3-1': 1.0})
+        self.assertRaises(ValueError, PowerNet, self.network, [u'J1-1', u'J2-1'])
+        self.assertRaises(ValueError, PowerNet, self.network, [])
+
+
+@unittest.skipUnless(sys.modules.get('pcbnew') is fakepcbnew, "needs the stand-in pcbnew")
+class TestBoardIRDrop(unittest.TestCase):
+    def test_board(self):
+        board = synthetic_board(400, outline=20)
+        pads = [pad for pad in board.GetPads() if pad.GetNetCode() == 3]
+        pos = [pad.GetPosition() for pad in pads]
+        left, right = min(item.x for item in pos), max(item.x for item in pos)
+        top, bottom = min(item.y for item in pos), max(item.y for item in pos)
+        board.Add(ZONE_CONTAINER(board, ((left - MM, top - MM), (right + MM, top - MM),
+                                         (right + MM, bottom + MM), (left - MM, bottom + MM)),
+                                 F_Cu, net=3, filled=True))
+        names = [u'U1-{}'.format(pad.GetName()) for pad in pads]
+        result = ir_drop(board, names[:1], dict((name, 0.5) for name in names[1:]), 1.0)
+        self.assertEqual(result.net, 3)
+        drop = result.worst_drop()[0][0]
+        self.assertGreater(drop, 0.0)
+        self.assertLess(drop, 1.0)
+        self.assertTrue(np.all(result.voltage <= 1.0 + 1e-12))
+        # numpy pad indexes work like names, no source is a ValueError
+        rows = [ind for ind, pad in enumerate(board.GetPads()) if pad.GetNetCode() == 3]
+        by_index = ir_drop(board, [np.int64(rows[0])], dict((name, 0.5) for name in names[1:]), 1.0)
+        self.assertTrue(np.allclose(by_index.voltage, result.voltage))
+        self.assertRaises(ValueError, ir_drop, board, [], {}, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
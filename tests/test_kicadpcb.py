@@ -0,0 +1,40 @@
+import os
+import unittest
+
+from kicadpcb import iter_records, read_board
+
+BOARD = os.path.join(os.path.dirname(__file__), 'data', 'small.kicad_pcb')
+
+
+class TestKicadPcb(unittest.TestCase):
+    def test_records(self):
+        buf = b'(kicad_pcb (net 1 "a (b)") (zone (net 2) (polygon (pts (xy 0 0)))) (module x (pad 1 smd rect (net 2 c))) (segment (start 1 2)))'
+        records = list(iter_records(buf))
+        self.assertEqual(records, [[b'net', b'1', b'a (b)'],
+                                   [b'module', b'x', [b'pad', b'1', b'smd', b'rect', [b'net', b'2', b'c']]],
+                                   [b'segment', [b'start', b'1', b'2']]])
+
+    def test_read_board(self):
+        board = read_board(BOARD)
+        self.assertEqual(board.netnames, {0: u'default', 1: u'GND', 2: u'/VCC 3V3'})
+        tracks = board.tracks
+        self.assertEqual(len(tracks), 4)
+        self.assertEqual(list(tracks.via), [False, False, True, False])
+        self.assertEqual(list(tracks.layer), [0, 31, 0, 0])
+        self.assertEqual(tracks.layer2[2], 31)
+        self.assertEqual(tracks.x0[0], 119050000)
+        self.assertEqual(tracks.drill[2], 400000)
+        self.assertEqual(len(board.lines), 4)
+        self.assertEqual(set(board.lines.layer), set([44]))
+
+    def test_read_pads(self):
+        pads = read_board(BOARD).pads
+        self.assertEqual(pads.names, [u'R1-1', u'R1-2'])
+        self.assertEqual(list(pads.x), [119050000, 120950000])
+        self.assertEqual(list(pads.y), [80000000, 80000000])
+        self.assertEqual(list(pads.net), [1, 2])
+        self.assertEqual(list(pads.pads_for_net(2)), [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+import numpy as np
+
+from tracetable import TrackTable, PadTable, PAD_RECT, PAD_CIRCLE, RHO_CU
+from netgraph import BoardNetwork, barrel_resistance
+
+MM = 1000000
+CU = 35e-6
+
+
+def track_r(length_mm, width_mm):
+    return RHO_CU * length_mm / (CU * width_mm)
+
+
+def make_board():
+    tracks = TrackTable.from_rows((
+        # x0, y0, x1, y1, width, layer, layer2, net, drill, via
+        (0, 0, 5 * MM, 0, MM, 0, 0, 1, 0, 0),
+        (5 * MM, 0, 5 * MM, 0, MM, 0, 31, 1, MM // 2, 1),
+        (5 * MM, 0, 10 * MM, 0, MM, 31, 31, 1, 0, 0),
+        # two equal parallel paths on net 2
+        (0, 10 * MM, 10 * MM, 10 * MM, MM, 0, 0, 2, 0, 0),
+        (0, 10 * MM, 0, 12 * MM, MM, 0, 0, 2, 0, 0),
+        (0, 12 * MM, 10 * MM, 12 * MM, MM, 0, 0, 2, 0, 0),
+        (10 * MM, 12 * MM, 10 * MM, 10 * MM, MM, 0, 0, 2, 0, 0),
+    ), {1: u'A', 2: u'B'})
+    pads = PadTable.from_rows((
+        # x, y, sx, sy, orient, shape, drill, layer, layer2, net
+        (0, 0, 2 * MM, MM, 90, PAD_RECT, 0, 0, 0, 1),
+        (10 * MM, 0, 2 * MM, 2 * MM, 0, PAD_CIRCLE, MM, 0, 31, 1),
+        (0, 11 * MM, 2 * MM, 3 * MM, 0, PAD_RECT, 0, 0, 0, 2),
+        (10 * MM, 11 * MM, 2 * MM, 3 * MM, 0, PAD_RECT, 0, 0, 0, 2),
+        (20 * MM, 0, 2 * MM, 2 * MM, 0, PAD_RECT, 0, 0, 0, 1),
+    ), [u'U1-1', u'U2-1', u'U1-2', u'U2-2', u'U3-1'])
+    return BoardNetwork(tracks, pads, cu_thick=CU)
+
+
+class TestNetGraph(unittest.TestCase):
+    def test_series_through_via(self):
+        network = make_board()
+        expected = 2 * track_r(5, 1) + barrel_resistance(0.5e-3)
+        self.assertAlmostEqual(network.effective_resistance(u'U1-1', u'U2-1') / expected, 1.0)
+
+    def test_parallel_paths(self):
+        network = make_board()
+        # the pads cover the track ends, leaving two 10 mm branches in parallel
+        self.assertAlmostEqual(network.effective_resistance(u'U1-2', u'U2-2') / (track_r(10, 1) / 2), 1.0)
+
+    def test_unconnected(self):
+        network = make_board()
+        self.assertEqual(network.effective_resistance(u'U1-1', u'U3-1'), np.inf)
+        self.assertEqual(network.effective_resistance(u'U1-1', u'U1-1'), 0.0)
+        self.assertRaises(ValueError, network.effective_resistance, u'U1-1', u'U1-2')
@@ -0,0 +1,87 @@
+import sys
+import unittest
+
+import numpy as np
+
+import fakepcbnew
+from fakepcbnew import DRAWSEGMENT, Edge_Cuts, F_Cu, FromMM, S_ARC, set_board, synthetic_board, wxPoint
+
+import traceinfo
+from shielding import SHIELD_TIMESTAMP, HashShieldGenerator
+
+
+@unittest.skipUnless(sys.modules.get('pcbnew') is fakepcbnew, "needs the stand-in pcbnew")
+class TestPluginsHeadless(unittest.TestCase):
+    def setUp(self):
+        self.board = set_board(synthetic_board(500, outline=40))
+
+    def tearDown(self):
+        set_board(None)
+
+    def test_synthetic_board(self):
+        self.assertEqual(len(self.board.GetTracks()), 550)
+        self.assertEqual(len(self.board.GetPads()), 50)
+        self.assertEqual(self.board.GetNetCount(), 10)
+        resistance, inductance, _, _, _, names, length = traceinfo.traceinfo()
+        self.assertEqual([names[code] for code in range(1, 11)], [u'Net-{}'.format(code) for code in range(1, 11)])
+        self.assertTrue(all(length[code] > 0 for code in range(1, 11)))
+        self.assertTrue(all(inductance[code] > 0 for code in range(1, 11)))
+
+    def test_register_without_board(self):
+        # pcbnew loads the action plugins before a board is open
+        from diagnostics import DiagnosticsPlugin
+        set_board(None)
+        for plugin in (HashShieldGenerator, traceinfo.TraceInfoGenerator, DiagnosticsPlugin):
+            plugin().register()
+
+    def test_empty_board(self):
+        set_board(synthetic_board(0))
+        resistance, inductance, _, _, _, names, length = traceinfo.traceinfo()
+        self.assertEqual(inductance, {0: 0.0})
+        self.assertEqual(length, {0: 0.0})
+
+    def test_outline_scan(self):
+        plugin = HashShieldGenerator()
+        plugin.find_bounding_box()
+        outline = plugin.outline
+        # same board and drawing count: the scan is reused, fresh reads again
+        plugin.find_bounding_box()
+        self.assertIs(plugin.outline, outline)
+        plugin.find_bounding_box(fresh=True)
+        self.assertIsNot(plugin.outline, outline)
+        np.testing.assert_allclose(np.concatenate(plugin.outline), np.concatenate(outline))
+
+        # a half circle above the board, the polyline points miss its top
+        arc = DRAWSEGMENT(self.board)
+        arc.SetShape(S_ARC)
+        arc.SetLayer(Edge_Cuts)
+        arc.SetStart(wxPoint(0, -FromMM(150)))
+        arc.SetEnd(wxPoint(FromMM(10), -FromMM(150)))
+        arc.SetAngle(-1800)
+        self.board.Add(arc)
+        plugin.find_bounding_box()
+        self.assertIsNot(plugin.outline, outline)
+        self.assertEqual(plugin.miny, -FromMM(160))
+
+    def test_shielding(self):
+        plugin = HashShieldGenerator()
+        plugin.find_bounding_box()
+        self.assertEqual(len(plugin.outline), 1)
+        self.assertEqual(len(plugin.outline[0]), 40)
+        plugin.line_pitch = 2.0
+        plugin.line_angle = 45.0
+
+        plugin.draw_shielding(0.3, [F_Cu])
+        count = len(plugin.shield_items(F_Cu))
+        self.assertGreater(count, 100)
+        # regeneration with the same values changes nothing
+        plugin.draw_shielding(0.3, [F_Cu])
+        self.assertEqual(len(plugin.shield_items(F_Cu)), count)
+        self.assertTrue(all(draw.GetTimeStamp() == SHIELD_TIMESTAMP and draw.GetWidth() == FromMM(0.3)
+                            for draw in plugin.shield_items(F_Cu)))
+        self.assertEqual(plugin.remove_shielding(), count)
+        self.assertEqual(len(self.board.DrawingsList()), 41)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+
+from tracetable import TrackTable
+from spatial import SpatialGrid, segment_distance
+
+MM = 1000000
+
+
+def random_tracks(count, seed=3):
+    rng = np.random.RandomState(seed)
+    x0 = rng.randint(0, 100 * MM, count)
+    y0 = rng.randint(0, 80 * MM, count)
+    length = rng.randint(0, 5 * MM, count)
+    angle = rng.randint(0, 8, count) * np.pi / 4
+    rows = np.column_stack((x0, y0, x0 + (length * np.cos(angle)).astype(np.int64),
+                            y0 + (length * np.sin(angle)).astype(np.int64),
+                            rng.randint(1, 5, count) * MM // 10, np.zeros(count), np.zeros(count),
+                            rng.randint(0, 20, count), np.zeros(count), np.zeros(count)))
+    return TrackTable.from_rows(rows)
+
+
+class TestSpatialGrid(unittest.TestCase):
+    def test_query_boxes(self):
+        grid = SpatialGrid.from_tracks(random_tracks(2000))
+        boxes = np.array([[0, 0, 10 * MM, 10 * MM], [50 * MM, 40 * MM, 50 * MM, 40 * MM],
+                          [-5 * MM, -5 * MM, 200 * MM, 200 * MM]], dtype=np.float64)
+        query, item = grid.query_boxes(*boxes.T)
+        for ind, (left, top, right, bottom) in enumerate(boxes):
+            expected = np.flatnonzero((grid.left <= right) & (grid.right >= left)
+                                      & (grid.top <= bottom) & (grid.bottom >= top))
+            self.assertEqual(sorted(item[query == ind]), list(expected))
+
+    def test_pairs(self):
+        grid = SpatialGrid.from_tracks(random_tracks(300))
+        first, second = grid.pairs(MM)
+        overlap = ((grid.left[:, None] - MM <= grid.right[None, :])
+                   & (grid.right[:, None] + MM >= grid.left[None, :])
+                   & (grid.top[:, None] - MM <= grid.bottom[None, :])
+                   & (grid.bottom[:, None] + MM >= grid.top[None, :]))
+        expected = np.argwhere(np.triu(overlap, 1))
+        self.assertEqual(sorted(zip(first, second)), [tuple(pair) for pair in expected])
+
+    def test_nearest(self):
+        grid = SpatialGrid.from_tracks(random_tracks(1000))
+        rng = np.random.RandomState(5)
+        x = rng.uniform(-20 * MM, 120 * MM, 50)
+        y = rng.uniform(-20 * MM, 100 * MM, 50)
+        item, distance = grid.nearest(x, y)
+        brute = segment_distance(x[:, None], y[:, None], grid.x0, grid.y0, grid.x1, grid.y1)
+        np.testing.assert_allclose(distance, brute.min(axis=1))
+        np.testing.assert_allclose(brute[np.arange(50), item], distance)
+
+    def test_nearest_limit(self):
+        grid = SpatialGrid(np.array([0.0]), np.array([0.0]), np.array([10.0]), np.array([0.0]), 1.0)
+        item, distance = grid.nearest([5.0, 5.0], [3.0, 50.0], max_distance=10)
+        self.assertEqual(list(item), [0, -1])
+        self.assertEqual(list(distance), [3.0, np.inf])
@@ -15,8 +15,10 @@ class Point(object):
     
     
 
+# points in board units, calculate_length() gives mm: width, copper
+# thickness and rho (ohm mm) in mm as well
 testcases_resistance = (
-    (Point(x=0, y=0), Point(x=10, y=0), 1e-3, 35e-6, 1.72e-8, 0.00491429),
+    (Point(x=0, y=0), Point(x=10e+6, y=0), 1.0, 35e-3, 1.72e-5, 0.00491429),
 )
 
 testcases_length = (
@@ -26,7 +28,7 @@ testcases_length = (
 class TestTraceInfo(unittest.TestCase):
     def test_calculate_resistance(self):
         for start, end, width, thick, rho, expected in testcases_resistance:
-            self.assertEqual(calculate_resistance(start, end, width, rho), expected)
+            self.assertAlmostEqual(calculate_resistance(start, end, width, thick, rho) / expected, 1.0, places=5)
 
 
     def test_calculate_length(self):
@@ -0,0 +1,88 @@
+import unittest
+
+import numpy as np
+
+from tracetable import (TrackTable, GeometryCache, net_geometry, net_parameters, net_totals, net_view,
+                        segment_lengths, max_current, RHO_CU)
+
+MM = 1000000
+
+
+def make_table():
+    rows = (
+        # x0, y0, x1, y1, width, layer, layer2, net, drill, via
+        (0, 0, 10 * MM, 0, MM, 0, 0, 1, 0, 0),
+        (10 * MM, 0, 10 * MM, 5 * MM, MM // 2, 0, 0, 1, 0, 0),
+        (10 * MM, 5 * MM, 10 * MM, 5 * MM, MM, 0, 31, 1, MM // 2, 1),
+        (0, 0, 3 * MM, 4 * MM, MM, 31, 31, 2, 0, 0),
+    )
+    return TrackTable.from_rows(rows, {1: u'GND', 2: u'VCC'})
+
+
+class TestTrackTable(unittest.TestCase):
+    def test_lengths(self):
+        table = make_table()
+        np.testing.assert_allclose(segment_lengths(table), [10e-3, 5e-3, 0, 5e-3])
+
+    def test_split(self):
+        table = make_table()
+        self.assertEqual(len(table.tracks), 3)
+        self.assertEqual(len(table.vias), 1)
+
+    def test_net_totals(self):
+        totals = net_totals(make_table(), cu_thick=35e-6, internal_layer=False)
+        self.assertEqual(list(totals.netcodes), [0, 1, 2])
+        self.assertEqual(totals.names, [u'default', u'GND', u'VCC'])
+        # the name column is converted once, not per list cell
+        self.assertIs(totals.column('names'), totals.column('names'))
+        self.assertEqual(totals.column('names')[1], u'GND')
+        np.testing.assert_allclose(totals.length, [0, 15, 5])
+        expected = RHO_CU * (10e-3 / 1e-3 + 5e-3 / 0.5e-3) / 35e-6
+        self.assertAlmostEqual(totals.resistance[1], expected)
+        self.assertEqual(totals.maxcurrent[0], np.inf)
+        self.assertAlmostEqual(totals.maxcurrent[1], max_current(0.5e-3, 35e-6, 20, False))
+
+    def test_parameter_stage(self):
+        geometry = net_geometry(make_table())
+        thin = net_parameters(geometry, cu_thick=18e-6)
+        thick = net_parameters(geometry, cu_thick=36e-6)
+        np.testing.assert_allclose(thin.resistance, 2 * thick.resistance)
+        np.testing.assert_allclose(thin.length, thick.length)
+        self.assertAlmostEqual(geometry.min_width[1], 0.5e-3)
+
+    def test_as_dicts(self):
+        res, ind, pwr, vdrop, maxcur, names, length = net_totals(make_table()).as_dicts()
+        self.assertEqual(sorted(res), [0, 1, 2])
+        self.assertEqual(names[2], u'VCC')
+        self.assertEqual(res[1], vdrop[1])
+
+    def test_net_view(self):
+        totals = net_totals(make_table())
+        self.assertEqual(list(net_view(totals)), [0, 1, 2])
+        self.assertEqual(list(net_view(totals, 'resistance', descending=True)), [1, 2, 0])
+        self.assertEqual(list(net_view(totals, pattern='vc')), [2])
+        self.assertEqual(list(net_view(totals, 'names', top=2, top_by='maxcurrent')), [1, 2])
+        self.assertEqual(list(net_view(totals, top=1, top_by='resistance', top_descending=True)), [1])
+
+    def test_cache_delta(self):
+        cache = GeometryCache()
+        table = make_table()
+        cache.update(table)
+        self.assertEqual(cache.misses, 3)
+
+        moved = TrackTable(table.x0, table.y0, table.x1 + (table.net == 2) * MM, table.y1,
+                           table.width, table.layer, table.net, layer2=table.layer2,
+                           drill=table.drill, via=table.via, netnames=table.netnames)
+        geometry = cache.update(moved)
+        self.assertEqual((cache.hits, cache.misses, cache.removed), (2, 1, 1))
+        expected = net_geometry(moved)
+        np.testing.assert_allclose(geometry.length, expected.length)
+        np.testing.assert_allclose(geometry.length_per_width, expected.length_per_width)
+
+        geometry = cache.update(moved.select(moved.net != 1))
+        self.assertEqual(list(geometry.netcodes), [0, 2])
+        self.assertEqual(cache.removed, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
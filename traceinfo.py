@@ -3,22 +3,30 @@
 #import sys
 from math import sqrt, log, exp
 
-import wx
-import wx.aui
-
 #from pcbnew import *
 import pcbnew
 
+try:
+    from .tracetable import (RHO_CU, CU_THICK, MAX_TEMP, MIL, GeometryCache,
+                             ipc_constant, max_current, net_geometry, net_parameters,
+                             net_view)
+    from .instrument import SCAN, COMPUTE, UI, note, run, stage
+    from .boardindex import board_index
+    from .inductance import loop_inductance
+except (ImportError, ValueError):
+    from tracetable import (RHO_CU, CU_THICK, MAX_TEMP, MIL, GeometryCache,
+                            ipc_constant, max_current, net_geometry, net_parameters,
+                            net_view)
+    from instrument import SCAN, COMPUTE, UI, note, run, stage
+    from boardindex import board_index
+    from inductance import loop_inductance
+
 # some code stolen from:
 # https://github.com/KiCad/kicad-source-mirror/blob/master/pcb_calculator/tracks_width_versus_current.cpp
 
 #ToUnits = ToMM
 #FromUnits = FromMM
 
-RHO_CU = 1.72e-8  # Copper resistivity
-CU_THICK = 18e-6  # Board thickness
-MAX_TEMP = 20     # maximum temperature rise (degrees Celcius)
-
 def format_number(inputvalue, dec=3):
     """Format number more nicely"""
     value = inputvalue
@@ -32,17 +40,17 @@ def format_number(inputvalue, dec=3):
     elif abs(value) >= 1e3:
         value /= 1e3
         post = "k"
-    elif abs(value) >= 0:
-        if abs(value) < 1e-12:
+    elif abs(value) > 0:
+        if abs(value) < 1e-9:
             value *= 1e12
             post = 'p'
-        elif abs(value) < 1e-9:
+        elif abs(value) < 1e-6:
             value *= 1e9
             post = 'n'
-        elif abs(value) < 1e-6:
+        elif abs(value) < 1e-3:
             value *= 1e6
             post = 'u'
-        elif abs(value) < 1e-3:
+        elif abs(value) < 1:
             value *= 1000
             post = 'm'
 
@@ -60,114 +68,55 @@ def calculate_resistance(start, end, width, height, rho_cu=RHO_CU):
     #resistance = rho_cu * length/area
     return resistance
 
-def calculate_inductance(areaMM2):
-    return 0
-
-
-
 def calculate_area(point1, point2, width):
     area = calculate_length(point1, point2) * pcbnew.ToMM(width)
     return area
 
 
 def calculate_trace_width(current_A, thickness_m, delta_T_C, use_internal_layer):
-    if use_internal_layer:
-        scale = 0.024
-    else:
-        scale = 0.048
-    dtmp = log(current_A) - log(scale) - 0.44 * log(delta_T_C) - 0.725 * log(thickness_m)
+    scale = ipc_constant(use_internal_layer)
+    # IPC-2221 works in mils
+    dtmp = log(current_A) - log(scale) - 0.44 * log(delta_T_C) - 0.725 * log(thickness_m / MIL)
     dtmp /= 0.725
-    trackwidth = exp(dtmp)
+    trackwidth = exp(dtmp) * MIL
     return trackwidth
 
 def calculate_max_current(width_m, thickness_m, delta_T_C, use_internal_layer):
-    if use_internal_layer:
-        scale = 0.024
-    else:
-        scale = 0.048
-    area = thickness_m * width_m
-    current = scale * pow(delta_T_C, 0.44) * pow(area, 0.725)
-    return current
+    return float(max_current(width_m, thickness_m, delta_T_C, use_internal_layer))
 
 def calculate_length(point1, point2):
     return sqrt(pow(pcbnew.ToMM(point1.y)-pcbnew.ToMM(point2.y), 2)
                 + pow(pcbnew.ToMM(point1.x)-pcbnew.ToMM(point2.x), 2))
 
-def traceinfo(cu_thick=CU_THICK, internal_layer=True):
-    resistance = {0:0}
-    inductance = {0:0}
-    #maxvoltage = {0:999999}
-    maxcurrent = {0:999999}
-    voltagedrop = {0:0}
-    powerloss = {0:0}
-    netnames = {0:u'default'}
-    lengths = {0:0}
-
-    for trace in pcbnew.GetBoard().GetTrackWidthList():
-        print("trace width: " + str(trace))
-        for item in pcbnew.GetBoard().GetTracks():
-            print("track: " + str(trace))
-            if isinstance(item, pcbnew.VIA):
-                pos = item.GetPosition()
-                drill = item.GetDrillValue()
-                width = item.GetWidth()
-                print(" * Via: ", (pcbnew.ToMM(pos), pcbnew.ToMM(drill), pcbnew.ToMM(width)))
-            elif isinstance(item, pcbnew.TRACK):
-                if item.GetNet():
-                    net = item.GetNet()
-                    net_id = net.GetNet()
-                    net_name = net.GetNetname() or u''
-                else:
-                    net_id = 0
-                    net_name = u'default'
-
-                start = item.GetStart()
-                end = item.GetEnd()
-                width = item.GetWidth()
-
-                area = calculate_area(start, end, width)
-                length = calculate_length(start, end)
-                #net_name = net.GetNetname() or u''
-                print(" * TRACK: ", net_name, area)
-                if net_id not in resistance:
-                    resistance[net_id] = 0
-                if net_id not in inductance:
-                    inductance[net_id] = 0
-                if net_id not in voltagedrop:
-                    voltagedrop[net_id] = 0
-                if net_id not in powerloss:
-                    powerloss[net_id] = 0
-                if net_id not in maxcurrent:
-                    maxcurrent[net_id] = 99999999
-                if net_id not in netnames:
-                    netnames[net_id] = net_name
-                if net_id not in lengths:
-                    lengths[net_id] = 0
-                #rr = calculate_resistance(start, end, width)
-                ii = calculate_inductance(area)
-
-                #print(" -> area= ", area, ", R= ", rr, " L= ", ii)
-
-                cable_current = 1
-
-                extResistance = (RHO_CU * length) / (width * cu_thick)
-                external_voltage = extResistance * cable_current
-                lengths[net_id] += length
-                resistance[net_id] += extResistance
-                voltagedrop[net_id] += external_voltage
-                powerloss[net_id] += external_voltage * cable_current
-                #inductance[net_id] += ii
-                maxcurr = calculate_max_current(width, cu_thick, 20, internal_layer)
-                maxcurrent[net_id] = min(maxcurr, maxcurrent[net_id])
-
-    for net in resistance:
-        print("Total resistance for net: ", net, " (", netnames[net], ") is ", resistance[net], " Ohm")
-        print(" voltagedrop: ", voltagedrop[net])
-        print(" powerloss:   ", powerloss[net])
-        print(" max current: ", maxcurrent[net])
-    for net in inductance:
-        print("Total inductance for net: ", net, " is ", inductance[net], " Ohm")
-    return (resistance, inductance, powerloss, voltagedrop, maxcurrent, netnames, lengths)
+def trace_geometry(board=None, cache=None):
+    """Scan the board once and reduce it to per-net geometry.
+
+    With a GeometryCache only the tracks changed since its last update
+    are recomputed, the inductance only for the nets they belong to.
+    The board is always rescanned, a moved track keeps the item counts
+    the shared index checks.
+    """
+    with stage(SCAN):
+        table = board_index(board or pcbnew.GetBoard(), fresh=True).tracks
+    with stage(COMPUTE):
+        if cache is None:
+            geometry = net_geometry(table, loop_inductance)
+            stats = ""
+        else:
+            geometry = cache.update(table, loop_inductance)
+            stats = ", " + cache.summary()
+    note("Traceinfo: %d tracks, %d vias, %d nets%s",
+         int((~table.via).sum()), int(table.via.sum()), len(geometry), stats)
+    return geometry
+
+def traceinfo(cu_thick=CU_THICK, internal_layer=True, geometry=None):
+    """Per-net trace results as dicts keyed by net code.
+
+    Pass the `geometry` from trace_geometry() to skip the board scan.
+    """
+    if geometry is None:
+        geometry = trace_geometry()
+    return net_parameters(geometry, cu_thick, internal_layer).as_dicts()
 
 
 class TraceInfoGenerator(pcbnew.ActionPlugin):
@@ -177,71 +126,97 @@ class TraceInfoGenerator(pcbnew.ActionPlugin):
         self.description = "This plugin gives some info about traces"
 
         self._board = pcbnew.GetBoard()
+        self._cache = GeometryCache()
 
 
     def get_max_voltage(self, K_const, temprise, width, thickness):
         return K_const * pow(temprise, 0.44) * pow(width * thickness, 0.725)
 
     def Run(self):
-        print("----------------------------------")
-        print("Starting Traceinfo plugin")
+        with run("traceinfo", pcbnew):
+            self.show_results()
+
+    def show_results(self):
+        import wx
+
+        # SWIG hands out a new proxy per call, compare the wrapped pointers
+        board = pcbnew.GetBoard()
+        if self._board is None or board.this != self._board.this:
+            self._board = board
+            self._cache = GeometryCache()
+        cache = self._cache
+        geometry = trace_geometry(board, cache)
+
+        # (title, NetTotals column, width)
+        columns = (("Net#", 'netcodes', 60),
+                   ("Name", 'names', 180),
+                   ("Length [mm]", 'length', 100),
+                   ("Resistance [Ohm]", 'resistance', 120),
+                   ("Inductance [H]", 'inductance', 110),
+                   ("Power loss [W]", 'powerloss', 110),
+                   ("Voltage loss [V]", 'voltagedrop', 110),
+                   ("Max Current [A]", 'maxcurrent', 110))
+        # (title, sort column, descending) of the preset views
+        views = (("All nets", None, False),
+                 ("Highest resistance", 'resistance', True),
+                 ("Lowest max current", 'maxcurrent', False))
+
+        class NetList(wx.ListCtrl):
+            """Virtual list, rows are formatted from the NetTotals arrays on demand"""
+            def __init__(self, parent):
+                wx.ListCtrl.__init__(self, parent, style=wx.LC_REPORT | wx.LC_VIRTUAL | wx.LC_HRULES | wx.LC_VRULES)
+                for col, (title, _, width) in enumerate(columns):
+                    self.InsertColumn(col, title, width=width)
+                self.totals = None
+                self.rows = []
+
+            def set_rows(self, totals, rows):
+                self.totals = totals
+                self.rows = rows
+                self.SetItemCount(len(rows))
+                self.Refresh()
+
+            def OnGetItemText(self, item, col):
+                value = self.totals.column(columns[col][1])[self.rows[item]]
+                if col < 2:
+                    return str(value)
+                return format_number(value)
 
         class DisplayResults(wx.Dialog):
             def __init__(self, parent):
-                wx.Dialog.__init__(self, parent, id=wx.ID_ANY, title="Traceinfo Results")
+                wx.Dialog.__init__(self, parent, id=wx.ID_ANY, title="Traceinfo Results",
+                                   style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
                 #self.SetIcon()
                 panel = wx.Panel(self)
 
-                #pcb = pcbnew.GetBoard()
-                #nets = pcb.GetNets()
-                res, ind, pwr_loss, voltage_loss, max_current, net_names, length = traceinfo(CU_THICK, True)
+                self.geometry = geometry
+                with stage(COMPUTE):
+                    self.totals = net_parameters(self.geometry, CU_THICK, True)
+                self.sort_by = 'netcodes'
+                self.descending = False
 
                 window_sizer = wx.BoxSizer()
                 window_sizer.Add(panel, 1, wx.ALL | wx.EXPAND)
-
-                sizer = wx.GridBagSizer(10, 0)
                 panel.SetBackgroundColour("white")
-                #sizer = wx.BoxSizer(wx.VERTICAL)
-                sizer.Add(wx.StaticText(panel, label="Net#"), border=4, pos=(0, 0))
-                sizer.Add(wx.StaticText(panel, label="Name"), border=4, pos=(0, 1))
-                sizer.Add(wx.StaticText(panel, label="Length [mm]"), border=4, pos=(0, 2))
-                sizer.Add(wx.StaticText(panel, label="Resistance [Ohm]"), border=4, pos=(0, 3))
-                sizer.Add(wx.StaticText(panel, label="Inductance [H]"), border=4, pos=(0, 4))
-                sizer.Add(wx.StaticText(panel, label="Power loss [W]"), border=4, pos=(0, 5))
-                sizer.Add(wx.StaticText(panel, label="Voltage loss [V]"), border=4, pos=(0, 6))
-                sizer.Add(wx.StaticText(panel, label="Max Current [A]"), border=4, pos=(0, 7))
-                self.lb_net = {}
-                self.lb_name = {}
-                self.lb_res = {}
-                self.lb_ind = {}
-                self.lb_pwr = {}
-                self.lb_vdo = {}
-                self.lb_max = {}
-                self.lb_len = {}
-                self.row = {}
-                row = 1
-                for net in res:
-                    self.lb_net[row] = wx.StaticText(panel, label=str(net))
-                    self.lb_name[row] = wx.StaticText(panel, label=str(net_names[net]))
-                    self.lb_len[row] = wx.StaticText(panel, label=format_number(length[net]))
-                    self.lb_res[row] = wx.StaticText(panel, label=format_number(res[net]))
-                    self.lb_ind[row] = wx.StaticText(panel, label=format_number(ind[net]))
-                    self.lb_pwr[row] = wx.StaticText(panel, label=format_number(pwr_loss[net]))
-                    self.lb_vdo[row] = wx.StaticText(panel, label=format_number(voltage_loss[net]))
-                    self.lb_max[row] = wx.StaticText(panel, label=format_number(max_current[net]))
-                    self.lb_net[row].SetBackgroundColour('#cfcfcf')
-                    #lb_max[row] = wx.StaticText(panel, label=str("%.2e"%([net]))
-
-                    sizer.Add(self.lb_net[row], flag=wx.ALL|wx.EXPAND, border=4, pos=(row, 0))
-                    sizer.Add(self.lb_name[row], flag=wx.ALL|wx.EXPAND, border=4, pos=(row, 1))
-                    sizer.Add(self.lb_len[row], flag=wx.ALL|wx.EXPAND, border=4, pos=(row, 2))
-                    sizer.Add(self.lb_res[row], flag=wx.ALL|wx.EXPAND, border=4, pos=(row, 3))
-                    sizer.Add(self.lb_ind[row], flag=wx.ALL|wx.EXPAND, border=4, pos=(row, 4))
-                    sizer.Add(self.lb_pwr[row], flag=wx.ALL|wx.EXPAND, border=4, pos=(row, 5))
-                    sizer.Add(self.lb_vdo[row], flag=wx.ALL|wx.EXPAND, border=4, pos=(row, 6))
-                    sizer.Add(self.lb_max[row], flag=wx.ALL|wx.EXPAND, border=4, pos=(row, 7))
-                    self.row[net] = row
-                    row += 1
+
+                top = wx.BoxSizer(wx.HORIZONTAL)
+                top.Add(wx.StaticText(panel, label="Filter"), 0, wx.RIGHT | wx.ALIGN_CENTER_VERTICAL, 4)
+                self.filter = wx.TextCtrl(panel)
+                self.filter.Bind(wx.EVT_TEXT, self.update_view)
+                top.Add(self.filter, 1, wx.RIGHT, 8)
+                self.view = wx.Choice(panel, choices=[view[0] for view in views])
+                self.view.SetSelection(0)
+                self.view.Bind(wx.EVT_CHOICE, self.on_view)
+                top.Add(self.view, 0, wx.RIGHT, 4)
+                self.top_count = wx.SpinCtrl(panel, min=1, max=100000, initial=20)
+                self.top_count.Bind(wx.EVT_SPINCTRL, self.update_view)
+                top.Add(self.top_count, 0, wx.RIGHT, 4)
+                self.status = wx.StaticText(panel, label="")
+                top.Add(self.status, 0, wx.LEFT | wx.ALIGN_CENTER_VERTICAL, 4)
+
+                self.netlist = NetList(panel)
+                self.netlist.Bind(wx.EVT_LIST_COL_CLICK, self.on_column_click)
+                self.netlist.SetMinSize((900, 400))
 
                 bottom = wx.BoxSizer(wx.HORIZONTAL)
 
@@ -255,14 +230,40 @@ class TraceInfoGenerator(pcbnew.ActionPlugin):
                 close_button = wx.Button(panel, label="Close")
                 close_button.Bind(wx.EVT_BUTTON, self.on_button_close)
                 bottom.Add(close_button, 0, wx.LEFT, 4) #, (row, 6))
-                self.maxrows = row
 
                 border = wx.BoxSizer(wx.VERTICAL)
-                border.Add(sizer, 3, wx.ALL | wx.EXPAND, 5)
-                border.Add(bottom, 3, wx.TOP | wx.EXPAND, 5)
+                border.Add(top, 0, wx.ALL | wx.EXPAND, 5)
+                border.Add(self.netlist, 1, wx.ALL | wx.EXPAND, 5)
+                border.Add(bottom, 0, wx.TOP | wx.EXPAND, 5)
                 panel.SetSizerAndFit(border)
                 self.SetSizerAndFit(window_sizer)
-                #self.Fit()
+                self.update_view()
+
+            def update_view(self, event=None):
+                if event:
+                    event.Skip()
+                _, view_sort, view_descending = views[self.view.GetSelection()]
+                top = self.top_count.GetValue() if view_sort else None
+                rows = net_view(self.totals, self.sort_by, self.descending, self.filter.GetValue(),
+                                top, view_sort, view_descending)
+                self.netlist.set_rows(self.totals, rows)
+                self.status.SetLabel("{} / {} nets, {}".format(len(rows), len(self.totals), cache.summary()))
+
+            def on_view(self, event):
+                _, view_sort, view_descending = views[self.view.GetSelection()]
+                if view_sort:
+                    self.sort_by = view_sort
+                    self.descending = view_descending
+                self.update_view(event)
+
+            def on_column_click(self, event):
+                column = columns[event.GetColumn()][1]
+                if column == self.sort_by:
+                    self.descending = not self.descending
+                else:
+                    self.sort_by = column
+                    self.descending = False
+                self.update_view()
 
             def update_display(self, event):
                 event.Skip()
@@ -276,23 +277,14 @@ class TraceInfoGenerator(pcbnew.ActionPlugin):
                     internal = True
                 else:
                     internal = False
-                res, ind, pwr_loss, voltage_loss, max_current, net_names, length = traceinfo(thickness, internal)
-                for net in res:
-                    row = self.row[net]
-                    self.lb_net[row].SetLabel(str(net))
-                    self.lb_name[row].SetLabel(str(net_names[net]))
-                    self.lb_len[row].SetLabel(format_number(length[net]))
-                    self.lb_res[row].SetLabel(format_number(res[net]))
-                    self.lb_ind[row].SetLabel(format_number(ind[net]))
-                    self.lb_pwr[row].SetLabel(format_number(pwr_loss[net]))
-                    self.lb_vdo[row].SetLabel(format_number(voltage_loss[net]))
-                    self.lb_max[row].SetLabel(format_number(max_current[net]))
-
+                self.totals = net_parameters(self.geometry, thickness, internal)
+                self.update_view()
 
             def on_button_close(self, event):
                 event.Skip()
                 self.Close()
-        frame = DisplayResults(None)
-        frame.Center()
+        with stage(UI):
+            frame = DisplayResults(None)
+            frame.Center()
         frame.ShowModal()
         frame.Destroy()
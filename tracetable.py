@@ -0,0 +1,575 @@
+# Copyright (c) 2018 Tommi Rintala, New Cable Corporation Ltd
+
+"""Columnar track tables and vectorized trace calculations.
+
+The board copper is pulled out of pcbnew in a single pass into a
+structure-of-arrays (one numpy column per property, coordinates in
+native integer nanometres).  All the trace calculations then work on
+whole columns at once and per-net totals are grouped reductions.
+"""
+
+from __future__ import division
+
+import numpy as np
+
+RHO_CU = 1.72e-8  # Copper resistivity
+CU_THICK = 18e-6  # Board thickness
+MAX_TEMP = 20     # maximum temperature rise (degrees Celcius)
+
+# IPC-2221 constants, area is given in square mils
+IPC_K_INTERNAL = 0.024
+IPC_K_EXTERNAL = 0.048
+MIL = 25.4e-6
+
+NM = 1e-9  # one board unit in metres
+
+
+class TrackTable(object):
+    """Tracks and vias of a board as numpy columns.
+
+    One row per item.  Tracks run from (x0, y0) to (x1, y1) on `layer`,
+    vias sit at (x0, y0) == (x1, y1) and span `layer` .. `layer2`.
+    Coordinates, widths and drills are integer nanometres.  `uid` is the
+    item time stamp / UUID folded to an integer, 0 when unknown.
+    """
+
+    COLUMNS = ('x0', 'y0', 'x1', 'y1', 'width', 'layer', 'layer2', 'net', 'drill', 'via', 'uid')
+
+    def __init__(self, x0, y0, x1, y1, width, layer, net, layer2=None, drill=None, via=None,
+                 uid=None, netnames=None):
+        self.x0 = np.asarray(x0, dtype=np.int64)
+        self.y0 = np.asarray(y0, dtype=np.int64)
+        self.x1 = np.asarray(x1, dtype=np.int64)
+        self.y1 = np.asarray(y1, dtype=np.int64)
+        self.width = np.asarray(width, dtype=np.int64)
+        self.layer = np.asarray(layer, dtype=np.int32)
+        self.net = np.asarray(net, dtype=np.int32)
+        size = len(self.x0)
+        if layer2 is None:
+            self.layer2 = self.layer.copy()
+        else:
+            self.layer2 = np.asarray(layer2, dtype=np.int32)
+        if drill is None:
+            self.drill = np.zeros(size, dtype=np.int64)
+        else:
+            self.drill = np.asarray(drill, dtype=np.int64)
+        if via is None:
+            self.via = np.zeros(size, dtype=bool)
+        else:
+            self.via = np.asarray(via, dtype=bool)
+        if uid is None:
+            self.uid = np.zeros(size, dtype=np.int64)
+        else:
+            self.uid = np.asarray(uid, dtype=np.int64)
+        self.netnames = dict(netnames or {})
+        self.netnames.setdefault(0, u'default')
+
+    def __len__(self):
+        return len(self.x0)
+
+    @classmethod
+    def from_rows(cls, rows, netnames=None):
+        """Build a table from (x0, y0, x1, y1, width, layer, layer2, net, drill, via[, uid]) tuples"""
+        data = np.array(rows, dtype=np.int64)
+        if not data.size:
+            data = data.reshape(-1, len(cls.COLUMNS))
+        uid = data[:, 10] if data.shape[1] > 10 else None
+        return cls(data[:, 0], data[:, 1], data[:, 2], data[:, 3], data[:, 4],
+                   data[:, 5], data[:, 7], layer2=data[:, 6], drill=data[:, 8],
+                   via=data[:, 9], uid=uid, netnames=netnames)
+
+    def select(self, mask):
+        """Return a new table with the rows selected by a boolean mask or index array"""
+        return TrackTable(self.x0[mask], self.y0[mask], self.x1[mask], self.y1[mask],
+                          self.width[mask], self.layer[mask], self.net[mask],
+                          layer2=self.layer2[mask], drill=self.drill[mask],
+                          via=self.via[mask], uid=self.uid[mask], netnames=self.netnames)
+
+    @property
+    def tracks(self):
+        return self.select(~self.via)
+
+    @property
+    def vias(self):
+        return self.select(self.via)
+
+
+class NetOrder(object):
+    """Rows of a net column grouped by net, for lookups without a scan"""
+
+    def __init__(self, net):
+        self.order = np.argsort(net, kind='mergesort')
+        self.sorted = np.asarray(net)[self.order]
+
+    def rows(self, net):
+        """Row indexes of `net`, in table order"""
+        low, high = np.searchsorted(self.sorted, [net, net + 1])
+        return self.order[low:high]
+
+
+UID_MASK = (1 << 63) - 1
+
+
+def uid_from_text(text):
+    """Fold a hex time stamp or UUID string to a table uid"""
+    try:
+        return int(text.replace('-', ''), 16) & UID_MASK
+    except ValueError:
+        return 0
+
+
+def item_uid(item):
+    """Time stamp (KiCad 5) or UUID (KiCad 6+) of a board item as a table uid"""
+    if hasattr(item, 'm_Uuid'):
+        return uid_from_text(item.m_Uuid.AsString())
+    return item.GetTimeStamp() & UID_MASK
+
+
+def extract_tracks(board, items=None):
+    """Read every TRACK and VIA of a pcbnew board in one pass.
+
+    When an `items` list is given the pcbnew items are appended to it in
+    table row order.
+    """
+    import pcbnew
+
+    rows = []
+    for item in board.GetTracks():
+        if items is not None:
+            items.append(item)
+        net = item.GetNetCode()
+        if isinstance(item, pcbnew.VIA):
+            pos = item.GetPosition()
+            rows.append((pos.x, pos.y, pos.x, pos.y, item.GetWidth(),
+                         item.TopLayer(), item.BottomLayer(), net,
+                         item.GetDrillValue(), 1, item_uid(item)))
+        else:
+            start = item.GetStart()
+            end = item.GetEnd()
+            layer = item.GetLayer()
+            rows.append((start.x, start.y, end.x, end.y, item.GetWidth(),
+                         layer, layer, net, 0, 0, item_uid(item)))
+
+    table = TrackTable.from_rows(rows)
+    for code in np.unique(table.net):
+        if code == 0:
+            continue
+        net = board.FindNet(int(code))
+        if net:
+            table.netnames[int(code)] = net.GetNetname() or u''
+    return table
+
+
+# pad shapes, same codes as pcbnew PAD_SHAPE_T
+PAD_CIRCLE = 0
+PAD_RECT = 1
+PAD_OVAL = 2
+
+F_CU = 0
+B_CU = 31
+
+
+class PadTable(object):
+    """Pads of a board as numpy columns.
+
+    Positions, sizes and drills are integer nanometres, `orient` is in
+    degrees.  Copper layers span `layer` .. `layer2` like vias, -1 for
+    pads without copper.  `names` are "REFERENCE-PAD" strings.
+    """
+
+    COLUMNS = ('x', 'y', 'sx', 'sy', 'orient', 'shape', 'drill', 'layer', 'layer2', 'net')
+
+    def __init__(self, x, y, sx, sy, orient, shape, drill, layer, layer2, net, names=None):
+        self.x = np.asarray(x, dtype=np.int64)
+        self.y = np.asarray(y, dtype=np.int64)
+        self.sx = np.asarray(sx, dtype=np.int64)
+        self.sy = np.asarray(sy, dtype=np.int64)
+        self.orient = np.asarray(orient, dtype=np.float64)
+        self.shape = np.asarray(shape, dtype=np.int32)
+        self.drill = np.asarray(drill, dtype=np.int64)
+        self.layer = np.asarray(layer, dtype=np.int32)
+        self.layer2 = np.asarray(layer2, dtype=np.int32)
+        self.net = np.asarray(net, dtype=np.int32)
+        if names is None:
+            names = [u''] * len(self.x)
+        self.names = list(names)
+        self._net_order = None
+
+    def __len__(self):
+        return len(self.x)
+
+    @classmethod
+    def from_rows(cls, rows, names=None):
+        """Build a table from (x, y, sx, sy, orient, shape, drill, layer, layer2, net) tuples"""
+        data = np.array(rows, dtype=np.float64).reshape(-1, len(cls.COLUMNS))
+        ints = np.round(data).astype(np.int64)
+        return cls(ints[:, 0], ints[:, 1], ints[:, 2], ints[:, 3], data[:, 4], ints[:, 5],
+                   ints[:, 6], ints[:, 7], ints[:, 8], ints[:, 9], names)
+
+    def select(self, mask):
+        index = np.arange(len(self))[mask]
+        return PadTable(self.x[index], self.y[index], self.sx[index], self.sy[index],
+                        self.orient[index], self.shape[index], self.drill[index],
+                        self.layer[index], self.layer2[index], self.net[index],
+                        [self.names[ind] for ind in index])
+
+    def pads_for_net(self, net):
+        """Indexes of the pads of a net, without scanning the table"""
+        if self._net_order is None:
+            self._net_order = NetOrder(self.net)
+        return self._net_order.rows(net)
+
+    def find(self, name):
+        """Index of a pad by its "REFERENCE-PAD" name"""
+        return self.names.index(name)
+
+
+def pad_layers(front, back):
+    """Copper layer span of a pad on the front and/or back copper"""
+    if front and back:
+        return F_CU, B_CU
+    if front:
+        return F_CU, F_CU
+    if back:
+        return B_CU, B_CU
+    return -1, -1
+
+
+def extract_pads(board, items=None):
+    """Read every pad of a pcbnew board in one pass, `items` as in extract_tracks()"""
+    import pcbnew
+
+    rows = []
+    names = []
+    for pad in board.GetPads():
+        if items is not None:
+            items.append(pad)
+        pos = pad.GetPosition()
+        size = pad.GetSize()
+        if hasattr(pad, 'GetOrientationDegrees'):
+            orient = pad.GetOrientationDegrees()
+        else:
+            orient = pad.GetOrientation() / 10.0
+        layer, layer2 = pad_layers(pad.IsOnLayer(pcbnew.F_Cu), pad.IsOnLayer(pcbnew.B_Cu))
+        rows.append((pos.x, pos.y, size.x, size.y, orient, pad.GetShape(),
+                     pad.GetDrillSize().x, layer, layer2, pad.GetNetCode()))
+        number = pad.GetNumber() if hasattr(pad, 'GetNumber') else pad.GetName()
+        names.append(u'{}-{}'.format(pad.GetParent().GetReference(), number))
+    return PadTable.from_rows(rows, names)
+
+
+def segment_lengths(table):
+    """Length of every row in metres, vias have zero length"""
+    dx = (table.x1 - table.x0).astype(np.float64)
+    dy = (table.y1 - table.y0).astype(np.float64)
+    return np.hypot(dx, dy) * NM
+
+
+def segment_resistance(table, cu_thick=CU_THICK, rho_cu=RHO_CU):
+    """DC resistance of every row in Ohms"""
+    width = table.width * NM
+    with np.errstate(divide='ignore', invalid='ignore'):
+        resistance = rho_cu * segment_lengths(table) / (width * cu_thick)
+    resistance[table.via | (table.width <= 0)] = 0.0
+    return resistance
+
+
+def ipc_constant(internal_layer):
+    if internal_layer:
+        return IPC_K_INTERNAL
+    return IPC_K_EXTERNAL
+
+
+def max_current(width_m, thickness_m, delta_t=MAX_TEMP, internal_layer=True):
+    """IPC-2221 maximum current I = K * dT^0.44 * A^0.725, A in square mils.
+
+    Works on scalars and numpy arrays alike.
+    """
+    area = np.asarray(width_m, dtype=np.float64) * thickness_m / (MIL * MIL)
+    return ipc_constant(internal_layer) * pow(delta_t, 0.44) * np.power(area, 0.725)
+
+
+def group_nets(net):
+    """Map net codes to dense group indexes, net 0 is always present.
+
+    Returns (codes, inverse) where codes[inverse] == net.
+    """
+    codes, inverse = np.unique(np.append(np.asarray(net, dtype=np.int32), 0), return_inverse=True)
+    return codes, inverse[:-1].ravel()
+
+
+def group_min(inverse, values, groups, empty=np.inf):
+    """Minimum of values per group index, `empty` for groups with no rows"""
+    result = np.full(groups, empty, dtype=np.float64)
+    if len(values):
+        order = np.lexsort((values, inverse))
+        first = np.unique(inverse[order], return_index=True)
+        result[first[0]] = values[order][first[1]]
+    return result
+
+
+class NetGeometry(object):
+    """Per-net geometry sums, independent of copper thickness and IPC constants.
+
+    `length` is in metres, `length_per_width` is the sum of length/width
+    over the tracks of the net (dimensionless) and `min_width` the
+    narrowest track in metres.  `inductance` (henries) is None unless it
+    was asked for.
+    """
+
+    def __init__(self, netcodes, names, length, length_per_width, min_width, inductance=None):
+        self.netcodes = netcodes
+        self.names = names
+        self.length = length
+        self.length_per_width = length_per_width
+        self.min_width = min_width
+        self.inductance = inductance
+
+    def __len__(self):
+        return len(self.netcodes)
+
+
+def net_geometry(table, inductance=None):
+    """Reduce the tracks of a table to per-net geometry sums.
+
+    `inductance` is a function of a TrackTable giving a value for every
+    net of group_nets(), such as inductance.loop_inductance.
+    """
+    tracks = table.tracks
+    codes, inverse = group_nets(tracks.net)
+    groups = len(codes)
+
+    length = segment_lengths(tracks)
+    width = tracks.width * NM
+    with np.errstate(divide='ignore', invalid='ignore'):
+        per_width = np.where(width > 0, length / width, 0.0)
+
+    return NetGeometry(codes, [table.netnames.get(int(code), u'') for code in codes],
+                       np.bincount(inverse, weights=length, minlength=groups),
+                       np.bincount(inverse, weights=per_width, minlength=groups),
+                       group_min(inverse, width, groups),
+                       None if inductance is None else inductance(tracks))
+
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def row_keys(table):
+    """64-bit identity of every row: uid and geometry hashed together.
+
+    Identical rows get distinct keys by their occurrence count, so the
+    keys of a table are unique.
+    """
+    keys = np.zeros(len(table), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for name in TrackTable.COLUMNS:
+            keys = (keys ^ getattr(table, name).astype(np.int64).view(np.uint64)) * _GOLDEN
+            keys ^= keys >> np.uint64(29)
+        order = np.argsort(keys, kind='mergesort')
+        ordered = keys[order]
+        first = np.concatenate(([True], ordered[1:] != ordered[:-1]))
+        starts = np.flatnonzero(first)
+        rank = np.arange(len(keys)) - np.repeat(starts, np.diff(np.append(starts, len(keys))))
+        keys[order] = ordered + rank.astype(np.uint64) * _GOLDEN
+    return keys
+
+
+class GeometryCache(object):
+    """Per-segment geometry kept between traceinfo runs.
+
+    update() only computes the rows that are new since the previous
+    table (by row_keys()), the per-net sums are corrected by the
+    contributions of the added and removed rows.  The inductance is not
+    a sum over rows, it is computed again for the nets that changed.
+    """
+
+    def __init__(self):
+        empty = np.empty(0)
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.net = np.empty(0, dtype=np.int32)
+        self.length = empty
+        self.length_per_width = empty
+        self.width = empty
+        self.codes = np.zeros(1, dtype=np.int32)
+        self.sum_length = np.zeros(1)
+        self.sum_per_width = np.zeros(1)
+        self.count = np.zeros(1, dtype=np.int64)
+        self.min_width = np.full(1, np.inf)
+        self.inductance = np.zeros(1)
+        self.hits = 0
+        self.misses = 0
+        self.removed = 0
+
+    def _grow_codes(self, codes):
+        """Make room for net codes not seen before"""
+        merged = np.union1d(self.codes, codes)
+        if len(merged) == len(self.codes):
+            return
+        index = np.searchsorted(merged, self.codes)
+        for name in ('sum_length', 'sum_per_width', 'count', 'min_width', 'inductance'):
+            old = getattr(self, name)
+            new = np.full(len(merged), np.inf) if name == 'min_width' else np.zeros(len(merged), old.dtype)
+            new[index] = old
+            setattr(self, name, new)
+        self.codes = merged
+
+    def update(self, table, inductance=None):
+        """Bring the cache up to date with `table`, returns its NetGeometry.
+
+        `inductance` is the function net_geometry() takes.
+        """
+        tracks = table.tracks
+        keys = row_keys(tracks)
+
+        index = np.searchsorted(self.keys, keys)
+        index[index >= len(self.keys)] = 0
+        hit = (self.keys[index] == keys) if len(self.keys) else np.zeros(len(keys), dtype=bool)
+        gone = np.ones(len(self.keys), dtype=bool)
+        gone[index[hit]] = False
+
+        added = tracks.select(~hit)
+        length = segment_lengths(added)
+        width = added.width * NM
+        with np.errstate(divide='ignore', invalid='ignore'):
+            per_width = np.where(width > 0, length / width, 0.0)
+
+        self._grow_codes(added.net)
+        groups = len(self.codes)
+        plus = np.searchsorted(self.codes, added.net)
+        minus = np.searchsorted(self.codes, self.net[gone])
+        self.sum_length += (np.bincount(plus, weights=length, minlength=groups)
+                            - np.bincount(minus, weights=self.length[gone], minlength=groups))
+        self.sum_per_width += (np.bincount(plus, weights=per_width, minlength=groups)
+                               - np.bincount(minus, weights=self.length_per_width[gone], minlength=groups))
+        self.count += np.bincount(plus, minlength=groups) - np.bincount(minus, minlength=groups)
+
+        kept = index[hit]
+        self.keys = np.concatenate((self.keys[kept], keys[~hit]))
+        self.net = np.concatenate((self.net[kept], added.net))
+        self.length = np.concatenate((self.length[kept], length))
+        self.length_per_width = np.concatenate((self.length_per_width[kept], per_width))
+        self.width = np.concatenate((self.width[kept], width))
+        order = np.argsort(self.keys)
+        for name in ('keys', 'net', 'length', 'length_per_width', 'width'):
+            setattr(self, name, getattr(self, name)[order])
+
+        # minimum widths can not be corrected by delta, redo the touched nets
+        touched = np.union1d(plus, minus)
+        rows = np.isin(np.searchsorted(self.codes, self.net), touched)
+        group = np.searchsorted(self.codes, self.net[rows])
+        self.min_width[touched] = group_min(group, self.width[rows], groups)[touched]
+        if inductance is not None:
+            changed = tracks.select(np.isin(tracks.net, self.codes[touched]))
+            index = np.searchsorted(self.codes, group_nets(changed.net)[0])
+            values = inductance(changed)
+            self.inductance[touched] = 0.0
+            # group_nets() always has net 0, it may not be one of the changed
+            mine = np.isin(index, touched)
+            self.inductance[index[mine]] = values[mine]
+
+        self.hits = int(hit.sum())
+        self.misses = len(keys) - self.hits
+        self.removed = int(gone.sum())
+
+        live = (self.count > 0) | (self.codes == 0)
+        codes = self.codes[live]
+        sum_length = np.where(self.count > 0, self.sum_length, 0.0)[live]
+        sum_per_width = np.where(self.count > 0, self.sum_per_width, 0.0)[live]
+        return NetGeometry(codes, [table.netnames.get(int(code), u'') for code in codes],
+                           sum_length, sum_per_width, self.min_width[live],
+                           None if inductance is None else self.inductance[live])
+
+    def summary(self):
+        return "cache {} hits, {} misses, {} removed".format(self.hits, self.misses, self.removed)
+
+
+NET_COLUMNS = ('netcodes', 'names', 'length', 'resistance', 'inductance',
+               'powerloss', 'voltagedrop', 'maxcurrent')
+
+
+class NetTotals(object):
+    """Per-net results, one array element per net in `netcodes` order"""
+
+    def __init__(self, netcodes, names, length, resistance, inductance, powerloss, voltagedrop, maxcurrent):
+        self.netcodes = netcodes
+        self.names = names
+        # converted once, the virtual list indexes it for every painted cell
+        self._names = np.array(names, dtype='U')
+        self.length = length
+        self.resistance = resistance
+        self.inductance = inductance
+        self.powerloss = powerloss
+        self.voltagedrop = voltagedrop
+        self.maxcurrent = maxcurrent
+
+    def __len__(self):
+        return len(self.netcodes)
+
+    def column(self, name):
+        """One of NET_COLUMNS as a numpy array"""
+        if name == 'names':
+            return self._names
+        return np.asarray(getattr(self, name))
+
+    def as_dicts(self):
+        """Legacy traceinfo() result: dicts keyed by net code"""
+        codes = [int(code) for code in self.netcodes]
+
+        def todict(values):
+            return dict(zip(codes, [float(value) for value in values]))
+
+        return (todict(self.resistance), todict(self.inductance), todict(self.powerloss),
+                todict(self.voltagedrop), todict(self.maxcurrent),
+                dict(zip(codes, self.names)), todict(self.length))
+
+
+def _order(key, descending=False):
+    """Stable argsort, ties keep their order also when descending"""
+    if descending and key.dtype.kind in 'iuf':
+        return np.argsort(-key, kind='mergesort')
+    order = np.argsort(key, kind='mergesort')
+    if descending:
+        order = order[::-1]
+    return order
+
+
+def net_view(totals, sort_by='netcodes', descending=False, pattern=None, top=None,
+             top_by=None, top_descending=False):
+    """Row order for displaying `totals`.
+
+    Rows whose name contains `pattern` (case insensitive), limited to the
+    `top` first ones when ordered by `top_by` and finally sorted by the
+    `sort_by` column.
+    """
+    rows = np.arange(len(totals))
+    if pattern:
+        names = np.char.lower(totals.column('names'))
+        rows = rows[np.char.find(names, pattern.lower()) >= 0]
+    if top:
+        key = totals.column(top_by or sort_by)[rows]
+        rows = rows[_order(key, top_descending)[:top]]
+    return rows[_order(totals.column(sort_by)[rows], descending)]
+
+
+def net_parameters(geometry, cu_thick=CU_THICK, internal_layer=True, current=1.0, rho_cu=RHO_CU):
+    """Per-net electrical results from cached geometry, O(nets).
+
+    Series resistance scales as 1/thickness and since the IPC current
+    grows with width the net limit is set by its narrowest track.
+    `current` is the test current assumed to flow through every track.
+    """
+    groups = len(geometry)
+    resistance = rho_cu * geometry.length_per_width / cu_thick
+    voltagedrop = resistance * current
+    powerloss = voltagedrop * current
+    with np.errstate(over='ignore'):
+        maxcurrent = max_current(geometry.min_width, cu_thick, MAX_TEMP, internal_layer)
+
+    inductance = np.zeros(groups) if geometry.inductance is None else geometry.inductance
+    return NetTotals(geometry.netcodes, geometry.names, geometry.length * 1e3, resistance,
+                     inductance, powerloss, voltagedrop, maxcurrent)
+
+
+def net_totals(table, cu_thick=CU_THICK, internal_layer=True, current=1.0, rho_cu=RHO_CU):
+    """Per-net length, series resistance, losses and max current of the tracks"""
+    return net_parameters(net_geometry(table), cu_thick, internal_layer, current, rho_cu)
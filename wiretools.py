@@ -3,6 +3,11 @@ import pcbnew
 import inspect
 import os
 
+try:
+    from .boardindex import board_index
+except (ImportError, ValueError):
+    from boardindex import board_index
+
 filename = inspect.getframeinfo(inspect.currentframe()).filename
 path = os.path.dirname(os.path.abspath(filename))
 
@@ -27,12 +32,8 @@ def coordsFromPolySet(ps):
 
 """Get all pads for a NET"""
 def padsForNet(net):
-    retval = []
-    for pad in board.getPads():
-        # first get the netinfo, then get the netcode (int)
-        if pad.GetNet().GetNet() == net:
-            retval.append(pad)
-    return retval
+    # grouped by net code in the shared board index, no scan per net
+    return board_index(board).pad_items_for_net(net)
 
 # from collections import defaultdict
 
@@ -66,8 +67,8 @@ def get_layertable():
     
 def dump_net_tracks(net):
     board = pcbnew.GetBoard()
-    clktracks = board.TracksInNet(clknet.GetNet())
-    for track in clktracks:
+    layertable = dict((ind, board.GetLayerName(ind)) for ind in range(pcbnew.PCB_LAYER_ID_COUNT))
+    for track in board_index(board).track_items_for_net(net):
         print("{},{} -> {},{} width {} layer {}".format(track.GetStart().x/SCALE, track.GetStart().y/SCALE, track.GetEnd().x/SCALE, track.GetEnd().y/SCALE, track.GetWidth()/SCALE, layertable[track.GetLayer()]))
 
 #tracks = board.GetTracks()
@@ -0,0 +1,163 @@
+# Copyright (c) 2018 Tommi Rintala, New Cable Corporation Ltd
+
+"""Filled copper zones as a square grid of cells.
+
+Every filled zone polygon is cut by horizontal lines `pitch` apart with
+the same scanline clip the shielding hash uses, the cell centres are the
+grid points inside the spans.  Neighbouring cells of one net and layer
+are joined by a square of copper sheet each, so the cells of a zone form
+a resistor mesh.  Cells are keyed by (net, layer, column, row), zones of
+a net overlapping on a layer share their cells and any board point is
+looked up with a binary search.
+
+Necks of copper narrower than the pitch may fall between the grid
+points and break the mesh there.  The fill is taken as it is stored in
+the zone, pcbnew must have filled the zones.
+"""
+
+from __future__ import division
+
+import numpy as np
+
+try:
+    from .hashgeom import LineFamily
+    from .spatial import expand_ranges
+except (ImportError, ValueError):
+    from hashgeom import LineFamily
+    from spatial import expand_ranges
+
+ZONE_PITCH = 500000     # nm, cell size of the zone mesh
+
+
+def chain_points(chain):
+    """(n, 2) vertex array of a SHAPE_LINE_CHAIN"""
+    return np.array([(chain.CPoint(ind).x, chain.CPoint(ind).y)
+                     for ind in range(chain.PointCount())], dtype=np.float64).reshape(-1, 2)
+
+
+def filled_polygons(zone):
+    """Outlines and holes of the fill of a zone, a list of (n, 2) vertex arrays"""
+    try:
+        polys = zone.GetFilledPolysList()
+    except TypeError:
+        # KiCad 6 and newer keep a fill per layer
+        polys = zone.GetFilledPolysList(zone.GetLayer())
+    loops = []
+    for outline in range(polys.OutlineCount()):
+        loops.append(chain_points(polys.COutline(outline)))
+        # KiCad 5 fractures the fill, the holes are cut into the outline
+        if hasattr(polys, 'HoleCount'):
+            loops.extend(chain_points(polys.CHole(outline, hole)) for hole in range(polys.HoleCount(outline)))
+    return [loop for loop in loops if len(loop) >= 3]
+
+
+def zone_polygons(zones, nets=None):
+    """(net, layer, loops) of the filled copper zones, only of `nets` when given.
+
+    Keep-out areas, zones without a net and unfilled zones are left out.
+    """
+    found = []
+    for zone in zones:
+        if zone.GetIsKeepout() or zone.GetNetCode() <= 0:
+            continue
+        if nets is not None and zone.GetNetCode() not in nets:
+            continue
+        loops = filled_polygons(zone)
+        if loops:
+            found.append((zone.GetNetCode(), zone.GetLayer(), loops))
+    return found
+
+
+class ZoneMesh(object):
+    """Grid cells of filled zone copper.
+
+    Cell centres (`x`, `y`) are integer nanometres on multiples of
+    `pitch`, every cell is a node of its `net` on `layer`.  `edge_a` and
+    `edge_b` index the pairs of neighbouring cells, each one a square of
+    copper sheet.
+    """
+
+    def __init__(self, x, y, layer, net, pitch=ZONE_PITCH):
+        self.pitch = int(pitch)
+        column = np.asarray(x, dtype=np.int64) // self.pitch
+        row = np.asarray(y, dtype=np.int64) // self.pitch
+        layer = np.asarray(layer, dtype=np.int64)
+        net = np.asarray(net, dtype=np.int64)
+
+        groups, group = np.unique((net << 32) | layer, return_inverse=True)
+        self.group_keys = groups
+        # one row of margin on every side, a neighbour key never wraps into the next column
+        if len(column):
+            self.column0, self.row0 = column.min() - 1, row.min() - 1
+            self.columns = int(column.max() - self.column0) + 2
+            self.rows = int(row.max() - self.row0) + 2
+        else:
+            self.column0 = self.row0 = 0
+            self.columns = self.rows = 1
+        keys, first = np.unique(self._key(group.ravel(), column, row), return_index=True)
+        self.keys = keys
+        self.x = column[first] * self.pitch
+        self.y = row[first] * self.pitch
+        self.layer = layer[first].astype(np.int32)
+        self.net = net[first].astype(np.int32)
+
+        right = np.searchsorted(keys, keys + self.rows)
+        below = np.searchsorted(keys, keys + 1)
+        pairs_a, pairs_b = [], []
+        for neighbour, step in ((right, self.rows), (below, 1)):
+            neighbour = np.minimum(neighbour, len(keys) - 1)
+            hit = np.flatnonzero(keys[neighbour] == keys + step)
+            pairs_a.append(hit)
+            pairs_b.append(neighbour[hit])
+        self.edge_a = np.concatenate(pairs_a)
+        self.edge_b = np.concatenate(pairs_b)
+
+    def __len__(self):
+        return len(self.x)
+
+    def _key(self, group, column, row):
+        return (group * self.columns + (column - self.column0)) * self.rows + (row - self.row0)
+
+    @property
+    def layers(self):
+        return np.unique(self.group_keys & 0xffffffff)
+
+    def find(self, x, y, layer, net):
+        """Cell index of the points on `layer` of `net`, -1 outside the copper"""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        found = np.full(x.shape, -1, dtype=np.int64)
+        if not len(self.keys):
+            return found
+        column = np.floor(x / self.pitch + 0.5).astype(np.int64)
+        row = np.floor(y / self.pitch + 0.5).astype(np.int64)
+        group_key = (np.asarray(net, dtype=np.int64) << 32) | np.asarray(layer, dtype=np.int64)
+        group = np.minimum(np.searchsorted(self.group_keys, group_key), len(self.group_keys) - 1)
+        inside = ((self.group_keys[group] == group_key)
+                  & (column > self.column0) & (column < self.column0 + self.columns - 1)
+                  & (row > self.row0) & (row < self.row0 + self.rows - 1))
+        key = self._key(group, column, row)
+        cell = np.minimum(np.searchsorted(self.keys, key), len(self.keys) - 1)
+        hit = inside & (self.keys[cell] == key)
+        found[hit] = cell[hit]
+        return found
+
+
+def mesh_zones(polygons, pitch=ZONE_PITCH):
+    """ZoneMesh of zone_polygons() output, cells `pitch` nm apart"""
+    lines = LineFamily(0.0, pitch)
+    xs, ys, layers, nets = [], [], [], []
+    for net, layer, loops in polygons:
+        # the family frame of horizontal lines is the board frame, u = x and v = y
+        line, start, end = lines.spans(loops)
+        # grid points start <= x < end, like the lines low <= y < high
+        first = np.ceil(start / pitch).astype(np.int64)
+        counts = np.maximum(np.ceil(end / pitch).astype(np.int64) - first, 0)
+        column = expand_ranges(first, counts)
+        xs.append(column * pitch)
+        ys.append(np.repeat(line, counts) * pitch)
+        layers.append(np.full(len(column), layer, dtype=np.int64))
+        nets.append(np.full(len(column), net, dtype=np.int64))
+    if not xs:
+        return ZoneMesh(np.zeros(0), np.zeros(0), np.zeros(0), np.zeros(0), pitch)
+    return ZoneMesh(np.concatenate(xs), np.concatenate(ys), np.concatenate(layers), np.concatenate(nets), pitch)